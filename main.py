@@ -10,16 +10,65 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
+import sys
+import argparse
 import glob
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import json
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict, deque
 import base64
-from io import StringIO
+from io import StringIO, BytesIO
 import zipfile
 import time
 import numpy as np
+import math
+import codecs
+import zlib
+import sqlite3
+import hashlib
+import asyncio
+import socket
+import gzip
+import ipaddress
+import shutil
+from urllib.parse import unquote
+import threading
+import gc
+import pickle
+import random
+import bisect
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+import yaml
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+try:
+    import duckdb
+except ImportError:  # SQL console falls back to SQLite
+    duckdb = None
+
+try:
+    import msgpack
+except ImportError:  # Fluentd forward listener is disabled
+    msgpack = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # partitioned Parquet archive is disabled
+    pa = None
+
+try:
+    import redis
+except ImportError:  # result cache keeps only its in-process tier
+    redis = None
+
+try:
+    import psutil
+except ImportError:  # memory governor falls back to the footprint it tracks itself
+    psutil = None
 
 # Professional Dashboard Configuration
 st.set_page_config(
@@ -29,6 +78,80 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Platform configuration (config.yaml next to this file)
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+
+# Bytes pulled from a log stream per read when decoding incrementally
+READ_BLOCK_BYTES = 1024 * 1024
+# Receiver UDP: sender datagram size and kernel receive buffer
+UDP_DATAGRAM_BYTES = 8192
+UDP_RECEIVE_BUFFER_BYTES = 8 * 1024 * 1024
+
+# Persistent stores (rollups, indexes) live here, as created by setup.py
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# HyperLogLog precision: 2**10 registers, ~3.25% standard error
+HLL_PRECISION = 10
+
+# Bumped whenever cached result shapes change, so replicas on other versions never share entries
+RESULT_CACHE_VERSION = 1
+
+# Saved analyses (Arrow IPC snapshot bundles); bump the version when the bundle layout changes
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'snapshots')
+SNAPSHOT_VERSION = 5
+
+# Weight column of StratifiedSampler samples, and the z value of their 95% confidence intervals
+SAMPLE_WEIGHT = '_sample_weight'
+CONFIDENCE_Z = 1.96
+
+# Prometheus metrics served at /metrics: name -> (type, help, histogram buckets in seconds)
+METRIC_DEFINITIONS = {
+    'skylus_lines_parsed_total': ('counter', "Log lines read by the parser", None),
+    'skylus_parse_errors_total': ('counter', "Log lines skipped because they did not match log_pattern", None),
+    'skylus_rows_ingested_total': ('counter', "Parsed rows added to datasets", None),
+    'skylus_ingest_seconds': ('histogram', "Time to parse and index one load or streamed batch",
+                              (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)),
+    'skylus_tab_render_seconds': ('histogram', "Time to render one dashboard tab",
+                                  (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'skylus_cache_requests_total': ('counter', "Cache lookups by cache and result", None),
+    'skylus_cache_hit_ratio': ('gauge', "Share of cache lookups answered from the cache", None),
+    'skylus_dataset_memory_bytes': ('gauge', "Memory held by shared datasets", None),
+    'skylus_shared_datasets': ('gauge', "Parsed datasets held in the shared registry", None),
+    'skylus_active_sessions': ('gauge', "Browser sessions attached to a shared dataset", None),
+    'skylus_receiver_lines_total': ('counter', "Lines received by the network receiver", None),
+    'skylus_receiver_dropped_total': ('counter', "Lines dropped while the receiver was behind (UDP) or by a failed sink", None),
+    'skylus_receiver_failed_batches_total': ('counter', "Receiver batches lost because ingesting them raised", None),
+    'skylus_receiver_lag_seconds': ('gauge', "Delay from first buffered line to ingestion of the last batch", None),
+    'skylus_queries_total': ('counter', "Scheduled queries by kind and outcome (executed, shared, timeout)", None),
+    'skylus_query_queue_seconds': ('histogram', "Time a scheduled query waited for a worker",
+                                   (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)),
+    'skylus_query_seconds': ('histogram', "Time a scheduled query ran on its worker",
+                             (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)),
+    'skylus_queries_running': ('gauge', "Scheduled queries running on a worker", None),
+    'skylus_queries_queued': ('gauge', "Scheduled queries waiting for a worker", None),
+    'skylus_memory_used_bytes': ('gauge', "Process memory counted against the memory budget", None),
+    'skylus_memory_budget_bytes': ('gauge', "Memory budget enforced by the memory governor", None),
+    'skylus_memory_relief_total': ('counter', "Memory governor actions by kind", None),
+    'skylus_duplicate_lines_total': ('counter', "Duplicate log lines dropped, by scope (dataset or history)", None),
+}
+
+def load_platform_config(path=CONFIG_PATH):
+    """Load the platform configuration, returning an empty dict if unavailable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError):
+        return {}
+
+def get_config_value(config, dotted_key, default=None):
+    """Look up a nested config value such as 'analytics.batch_size'"""
+    node = config
+    for part in dotted_key.split('.'):
+        if not isinstance(node, dict) or part not in node:
+            return default
+        node = node[part]
+    return node
+
 # Professional CSS Styling - Hide Streamlit Branding & Add Animations
 def load_professional_css():
     st.markdown("""
@@ -222,214 +345,3476 @@ def load_professional_css():
     """, unsafe_allow_html=True)
 
 class SkylLogReader:
-    def __init__(self):
+    def __init__(self, headless=False):
+        self.headless = headless  # no Streamlit calls when driven from the command line
         self.df = None
+        self._append_lock = threading.Lock()
         self.raw_logs = []
+        self.file_stats = {}
+        self.parse_errors = {}  # filename -> lines skipped because log_pattern did not match
+        self.sort_stats = None  # how presorted the last load was (see sorted_run_order)
+        self.duplicate_lines = {}  # filename -> lines dropped because the dataset already had them
+        self.history_duplicates = {}  # filename -> new lines the persistent history already had
+        self.fingerprint = None  # identifies the loaded sources while the dataset is unchanged
+        self.memory_bytes = 0  # deep memory_usage of the rows held, tracked per ingested frame
+        self.sample_stride = 1  # > 1 when the memory governor made a load keep every n-th row
+        self.spilled_rows = 0  # oldest streamed rows moved to the Parquet archive under memory pressure
+        self._sample_lock = threading.Lock()
+        self._sampled_at = 0
         self.services = ['AUTH', 'STORAGE', 'NETWORK', 'COMPUTE']
         self.log_pattern = re.compile(
             r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})\|([A-Z]+)\|([^|]+)\|([^|]+)\|([^|]+)\|([^|]+)\|([^|]+)\|([^|]*)\|([^|]+)\|(.*)$'
         )
+        self.response_time_pattern = re.compile(r'(\d+)ms')
+        
+        # Ingestion tuning from config.yaml
+        self.config = load_platform_config()
+        self.chunk_lines = int(get_config_value(self.config, 'analytics.batch_size', 5000))
+        self.max_workers = int(get_config_value(self.config, 'analytics.max_worker_threads', 4))
+        
+        # Per-load rollups, indexes and query engines, filled in by index_frame()
+        self.rollups = RollupStore()
+        self.search_index = MessageSearchIndex()
+        self.request_index = RequestIdIndex()
+        self.ip_index = IpIndex()
+        self.distinct = DistinctCounter(self.rollups)
+        self.heavy_hitters = HeavyHitters(self.config)
+        self.sessions = SessionStore(self.config)
+        self.anomalies = AnomalyDetector(self.config)
+        self.templates = TemplateMiner(self.config)
+        self.latency = ResponseTimeSketches(self.config)
+        self.brute_force = BruteForceDetector(self.config)
+        self.sampler = StratifiedSampler(self.config)
+        self.classifier = KeywordClassifier(self.config)
+        self.dedup = LineDeduplicator() if get_config_value(self.config, 'log_processing.duplicate_detection', True) else None
+        self.sql_engine = SqlQueryEngine(self)
         
         # Create logs folder if it doesn't exist
         if not os.path.exists('./logs'):
             os.makedirs('./logs')
-            st.info("📁 Created logs folder for you!")
+            if not headless:
+                st.info("📁 Created logs folder for you!")
+    
+    @property
+    def df(self):
+        """Parsed rows; streamed batches waiting in _pending are concatenated on first read"""
+        if self._pending:
+            with self._append_lock:
+                self._materialize()
+        return self._df
+    
+    @df.setter
+    def df(self, value):
+        self._df = value
+        self._pending = []
+        self._pending_rows = 0
+        self._next_row = int(value.index.max()) + 1 if value is not None and len(value) else 0
+    
+    def _materialize(self):
+        """Concatenate pending streamed batches in one pass (caller holds _append_lock)"""
+        if self._pending:
+            self._df = pd.concat([self._df] + self._pending)
+            self._pending = []
+            self._pending_rows = 0
+    
+    def report_error(self, message):
+        """Show an ingestion error in the dashboard, or on stderr when headless"""
+        if self.headless:
+            print(message, file=sys.stderr)
+        else:
+            st.error(message)
         
     def load_logs_from_folder(self, folder_path):
-        """Load all log files from the specified folder"""
+        """Collect all log files in the specified folder as (name, opener, size, signature) sources"""
         log_files = []
         if os.path.exists(folder_path):
             patterns = ['*.log', '*.txt', '*log*']
             for pattern in patterns:
                 log_files.extend(glob.glob(os.path.join(folder_path, pattern)))
+            # The patterns overlap (app.log matches '*.log' and '*log*'): read each file once
+            log_files = list(dict.fromkeys(log_files))
         
-        all_logs = []
-        file_stats = {}
-        
+        sources = []
         for file_path in log_files:
             try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    file_stats[os.path.basename(file_path)] = len([l for l in lines if l.strip()])
-                    all_logs.extend([(line.strip(), os.path.basename(file_path)) for line in lines if line.strip()])
-            except Exception as e:
-                st.error(f"Error reading {file_path}: {str(e)}")
+                file_stat = os.stat(file_path)
+            except OSError as e:
+                self.report_error(f"Error reading {file_path}: {str(e)}")
+                continue
+            signature = f"{os.path.abspath(file_path)}:{file_stat.st_size}:{file_stat.st_mtime_ns}"
+            sources.append((os.path.basename(file_path), lambda path=file_path: open(path, 'rb'),
+                            file_stat.st_size, signature))
         
-        return all_logs, file_stats
+        return sources
+    
+    def load_logs_from_uploads(self, uploaded_files):
+        """Wrap uploaded files as (name, opener, size, signature) sources without copying their bytes"""
+        sources = []
+        for uploaded_file in uploaded_files:
+            signature = f"upload:{uploaded_file.name}:{hashlib.blake2b(uploaded_file.getbuffer(), digest_size=16).hexdigest()}"
+            # Each opener gets its own view of the upload buffer so files can be read concurrently
+            sources.append((uploaded_file.name, lambda f=uploaded_file: BytesIO(f.getbuffer()),
+                            uploaded_file.size, signature))
+        return sources
     
-    def parse_log_line(self, line, filename):
-        """Parse a single log line with intelligent format detection"""
-        match = self.log_pattern.match(line)
-        if match:
-            timestamp_str, level, uuid, service, user, tenant_id, ip, user_agent, action, message = match.groups()
+    def fingerprint_sources(self, sources):
+        """Stable fingerprint of a set of sources, used to share parsed datasets between sessions"""
+        digest = hashlib.blake2b(digest_size=16)
+        for signature in sorted(source[3] for source in sources):
+            digest.update(signature.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def read_line_chunks(self, stream, progress=None):
+        """Incrementally decode a binary stream into chunks of non-empty stripped lines"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        pending = ''
+        chunk = []
+        
+        while True:
+            block = stream.read(READ_BLOCK_BYTES)
+            final = not block
+            text = pending + decoder.decode(block, final=final)
+            lines = text.split('\n')
+            pending = '' if final else lines.pop()
             
-            # Parse timestamp
-            try:
-                timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-            except:
-                timestamp = None
+            for line in lines:
+                line = line.strip()
+                if line:
+                    chunk.append(line)
             
+            if progress is not None:
+                progress(len(block))
+            
+            while len(chunk) >= self.chunk_lines:
+                yield chunk[:self.chunk_lines]
+                chunk = chunk[self.chunk_lines:]
+            
+            if final:
+                break
+        
+        if chunk:
+            yield chunk
+    
+    def parse_log_chunk(self, lines, filename):
+        """Parse a chunk of log lines into a DataFrame in one vectorized pass"""
+        raw = pd.Series(lines)
+        parts = raw.str.extract(self.log_pattern)
+        matched = parts[0].notna()
+        metrics = get_metrics()
+        metrics.inc('skylus_lines_parsed_total', len(lines))
+        if not matched.all():
+            metrics.inc('skylus_parse_errors_total', int((~matched).sum()))
+            raw = raw[matched]
+            parts = parts[matched]
+        if len(parts) == 0:
+            return None
+        
+        parts.columns = ['timestamp', 'level', 'uuid', 'service', 'user', 'tenant_id',
+                         'ip', 'user_agent', 'action', 'message']
+        timestamp = pd.to_datetime(parts['timestamp'], format='%Y-%m-%d %H:%M:%S,%f', errors='coerce')
+        valid_ts = timestamp.notna()
+        message = parts['message']
+        flags = self.classifier.classify(parts)
+        user_agent = parts['user_agent']
+        
+        hour = timestamp.dt.hour
+        hour = hour.astype('int64') if valid_ts.all() else hour.where(valid_ts, None)
+        
+        chunk = pd.DataFrame({
+            'timestamp': timestamp,
+            'date': timestamp.dt.date.where(valid_ts, None),
+            'time': timestamp.dt.time.where(valid_ts, None),
+            'hour': hour,
+            'day_of_week': timestamp.dt.day_name().where(valid_ts, None),
+            'level': parts['level'],
+            'uuid': parts['uuid'],
+            'service': parts['service'],
+            'user': parts['user'],
+            'tenant_id': parts['tenant_id'],
+            'ip': parts['ip'],
+            'ip_num': ipv4_to_uint32(parts['ip']),  # packed IPv4, 0 when not IPv4
+            'user_agent': user_agent,
+            'action': parts['action'],
+            'message': message,
+            'filename': filename,
+            'raw_line': raw,
+            'success': flags['success'],
+            'error': flags['error'],
+            'browser': self.extract_browser_column(user_agent),
+            'os': self.extract_os_column(user_agent),
+            'response_time': pd.to_numeric(message.str.extract(self.response_time_pattern, expand=False)),
+            'session_id': parts['uuid'].str[:8],  # Short session identifier
+        })
+        return chunk.reset_index(drop=True)
+    
+    def parse_source(self, name, opener, progress=None):
+        """Stream one source through the chunked parser.
+        
+        Returns (frames, line_count, parsed_count, memory_bytes); runs on worker threads, so the
+        caller adds memory_bytes to the reader.
+        """
+        frames = []
+        line_count = 0
+        parsed_count = 0
+        memory_bytes = 0
+        governor = get_memory_governor()
+        with opener() as stream:
+            for lines in self.read_line_chunks(stream, progress):
+                line_count += len(lines)
+                chunk = self.parse_log_chunk(lines, name)
+                if chunk is not None:
+                    parsed_count += len(chunk)
+                    if self.sample_stride > 1:
+                        chunk = chunk.iloc[::self.sample_stride]
+                    frames.append(chunk)
+                    memory_bytes += int(chunk.memory_usage(deep=True).sum())
+                    if governor.over_hard_limit():
+                        self._sample_more(governor)
+        return frames, line_count, parsed_count, memory_bytes
+    
+    def _sample_more(self, governor):
+        """Keep fewer of the remaining rows of this load once memory passes the governor's hard limit"""
+        with self._sample_lock:
+            # Only tighten again once usage has kept growing since the last step
+            usage = governor.usage()
+            if self.sample_stride > 1 and usage < self._sampled_at + governor.budget * 0.05:
+                return
+            governor.relieve()
+            if governor.over_hard_limit():
+                self.sample_stride = min(self.sample_stride * 2, 1024)
+                self._sampled_at = governor.usage()
+    
+    def extract_browser_column(self, user_agents):
+        """Browser family of each user agent in a Series"""
+        has_chrome = user_agents.str.contains('Chrome', regex=False)
+        return pd.Series(np.select(
+            [has_chrome,
+             user_agents.str.contains('Firefox', regex=False),
+             user_agents.str.contains('Safari', regex=False) & ~has_chrome,
+             user_agents.str.contains('Edge', regex=False),
+             user_agents.str.contains('python-requests', regex=False)],
+            ['Chrome', 'Firefox', 'Safari', 'Edge', 'API Client'],
+            default='Other'
+        ), index=user_agents.index)
+    
+    def extract_os_column(self, user_agents):
+        """Operating system of each user agent in a Series"""
+        return pd.Series(np.select(
+            [user_agents.str.contains('Windows NT', regex=False),
+             user_agents.str.contains('X11; Linux', regex=False),
+             user_agents.str.contains('X11; Ubuntu', regex=False),
+             user_agents.str.contains('Macintosh', regex=False),
+             user_agents.str.contains('python-requests', regex=False)],
+            ['Windows', 'Linux', 'Ubuntu', 'macOS', 'API'],
+            default='Other'
+        ), index=user_agents.index)
+    
+    def process_logs(self, sources):
+        """Parse all (name, opener, size, signature) sources concurrently and create DataFrame"""
+        with get_metrics().timer('skylus_ingest_seconds', path='load'):
+            return self._process_logs(sources)
+    
+    def _process_logs(self, sources):
+        frames_by_source = [None] * len(sources)
+        parsed_counts = {}
+        self.memory_bytes = 0
+        self.sample_stride = 1
+        file_stats = {}
+        total_bytes = max(1, sum(source[2] for source in sources))
+        bytes_read = [0]
+        bytes_lock = threading.Lock()
+        
+        def track_progress(n):
+            with bytes_lock:
+                bytes_read[0] += n
+        
+        if not self.headless:
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(sources)))) as executor:
+            pending = {
+                executor.submit(self.parse_source, name, opener, track_progress): i
+                for i, (name, opener, _, _) in enumerate(sources)
+            }
+            while pending:
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    name = sources[i][0]
+                    try:
+                        frames_by_source[i], file_stats[name], parsed_counts[name], memory_bytes = future.result()
+                        self.memory_bytes += memory_bytes
+                    except Exception as e:
+                        self.report_error(f"Error reading {name}: {str(e)}")
+                if not self.headless:
+                    progress = min(1.0, bytes_read[0] / total_bytes)
+                    progress_bar.progress(progress)
+                    status_text.text(f'Processing logs... {len(sources) - len(pending)}/{len(sources)} files')
+        
+        if not self.headless:
+            progress_bar.progress(1.0)
+            status_text.text('Processing complete!')
+            time.sleep(0.5)
+            progress_bar.empty()
+            status_text.empty()
+        
+        self.file_stats = file_stats
+        # Lines that did not match log_pattern, per file, so skipped input is visible rather than silent
+        self.parse_errors = {name: file_stats[name] - parsed_counts[name] for name in file_stats}
+        frames = [frame for source_frames in frames_by_source if source_frames for frame in source_frames]
+        self.duplicate_lines = {}
+        hashes = None
+        if frames and self.dedup is not None:
+            frames, hashes = self.drop_duplicate_lines(frames)
+        if frames:
+            # A sampled load must not share cached results with a complete load of the same sources
+            self.fingerprint = self.fingerprint_sources(sources) if self.sample_stride == 1 else None
+            self.df = pd.concat(frames, ignore_index=True)
+            get_metrics().inc('skylus_rows_ingested_total', len(self.df), path='load')
+            # Log files are almost always in time order: merge the per-chunk runs instead of sorting everything
+            order, self.sort_stats = sorted_run_order(self.df['timestamp'], [len(frame) for frame in frames])
+            if order is not None:
+                self.df = self.df.take(order)
+                hashes = hashes[order] if hashes is not None else None
+            self.df['template_id'] = self.templates.assign(self.df['message'])
+            self.index_frame(self.df)
+            # The whole load has been seen, so its last anomaly window can be scored now
+            self.anomalies.flush()
+            self.persist_history(sources, hashes)
+            return True
+        return False
+    
+    def drop_duplicate_lines(self, frames):
+        """Drop rows whose raw line this dataset already has, counting them per file.
+        
+        Returns the remaining non-empty frames and the line hashes of their rows.
+        """
+        hashes = line_hashes(pd.concat([frame['raw_line'] for frame in frames], ignore_index=True))
+        fresh = self.dedup.first_seen(hashes)
+        if fresh.all():
+            return frames, hashes
+        kept = []
+        start = 0
+        for frame in frames:
+            mask = fresh[start:start + len(frame)]
+            start += len(frame)
+            count_by_file(self.duplicate_lines, frame['filename'][~mask])
+            if mask.any():
+                kept.append(frame[mask])
+        get_metrics().inc('skylus_duplicate_lines_total', int((~fresh).sum()), scope='dataset')
+        return kept, hashes[fresh]
+    
+    def append_lines(self, lines, filename='network', persist=True):
+        """Parse streamed lines with the bulk parser and append them to the live dataset; returns rows added"""
+        with get_metrics().timer('skylus_ingest_seconds', path='stream'):
+            return self._append_lines(lines, filename, persist)
+    
+    def _append_lines(self, lines, filename, persist):
+        frame = self.parse_log_chunk(lines, filename)
+        skipped = len(lines) - (0 if frame is None else len(frame))
+        if skipped:
+            self.parse_errors[filename] = self.parse_errors.get(filename, 0) + skipped
+        if frame is None:
+            return 0
+        hashes = None
+        if self.dedup is not None:
+            # Forwarders re-send batches they did not see acknowledged
+            frames, hashes = self.drop_duplicate_lines([frame])
+            if not frames:
+                return 0
+            frame = frames[0]
+        get_metrics().inc('skylus_rows_ingested_total', len(frame), path='stream')
+        with self._append_lock:
+            self.fingerprint = None
+            self.memory_bytes += int(frame.memory_usage(deep=True).sum())
+            frame.index = pd.RangeIndex(self._next_row, self._next_row + len(frame))
+            self._next_row += len(frame)
+            frame['template_id'] = self.templates.assign(frame['message'])
+            # Publish the rows before indexing them so index hits always resolve. Batches are
+            # concatenated once pending rows match the held ones (or on the next read), not per batch
+            if self._df is None:
+                self._df = frame
+            else:
+                self._pending.append(frame)
+                self._pending_rows += len(frame)
+                if self._pending_rows >= len(self._df):
+                    self._materialize()
+            self.file_stats[filename] = self.file_stats.get(filename, 0) + len(frame)
+            self.index_frame(frame)
+            if persist:
+                line_filter = get_line_filter() if hashes is not None else None
+                if line_filter is not None:
+                    fresh = line_filter.add(hashes)
+                    count_by_file(self.history_duplicates, frame['filename'][~fresh])
+                    get_metrics().inc('skylus_duplicate_lines_total', int((~fresh).sum()), scope='history')
+                    line_filter.save(max_age=60)
+                    frame = frame[fresh]
+                get_rollup_store().ingest(frame)
+        return len(frame)
+    
+    def spill_oldest(self, fraction):
+        """Move the oldest fraction of a streamed dataset to the Parquet archive; returns rows spilled.
+        
+        Rollups, sketches and indexes keep their history; index hits on spilled rows no longer resolve.
+        """
+        archive = get_partitioned_archive()
+        with self._append_lock:
+            self._materialize()
+            if archive is None or self._df is None or len(self._df) < 2:
+                return 0
+            count = int(len(self._df) * fraction)
+            cold, self.df = self._df.iloc[:count], self._df.iloc[count:]
+            self.fingerprint = None
+            self.memory_bytes = int(self._df.memory_usage(deep=True).sum())
+            self.spilled_rows += count
+        archive.write(cold, f"spill-{time.time_ns()}")
+        return count
+    
+    def index_frame(self, frame):
+        """Update this load's rollups and indexes with newly ingested rows"""
+        self.rollups.ingest(frame)
+        self.search_index.add(frame)
+        self.request_index.add(frame)
+        self.ip_index.add(frame)
+        self.heavy_hitters.update(frame)
+        self.sessions.update(frame)
+        self.anomalies.update(frame)
+        self.latency.update(frame)
+        self.brute_force.update(frame)
+        self.sampler.update(frame)
+    
+    def persist_history(self, sources, hashes=None):
+        """Merge rows from sources not seen before into the persistent rollup store and Parquet archive.
+        
+        With line hashes, lines the history already holds (rotated copies, re-uploads under another
+        name) are left out and counted per file in history_duplicates.
+        """
+        store = get_rollup_store()
+        self.history_duplicates = {}
+        selected = []
+        
+        def rows_for(new_signatures):
+            new_names = {source[0] for source in sources if source[3] in new_signatures}
+            is_new = self.df['filename'].isin(new_names).to_numpy()
+            new_rows = self.df[is_new]
+            line_filter = get_line_filter() if hashes is not None else None
+            if line_filter is not None:
+                fresh = line_filter.add(hashes[is_new])
+                count_by_file(self.history_duplicates, new_rows['filename'][~fresh])
+                get_metrics().inc('skylus_duplicate_lines_total', int((~fresh).sum()), scope='history')
+                line_filter.save()
+                new_rows = new_rows[fresh]
+            selected.append(new_rows)
+            return new_rows
+        
+        # Sources are only recorded as rolled up together with their rows
+        new_signatures = store.ingest_sources([source[3] for source in sources], rows_for)
+        if selected:
+            new_rows = selected[0]
+            raw_retention_days = get_config_value(self.config, 'analytics.raw_logs_retention_days', 90)
+            store.enforce_retention(
+                raw_retention_days,
+                get_config_value(self.config, 'analytics.aggregated_data_retention_days', 365))
+            archive = get_partitioned_archive()
+            if archive is not None:
+                archive.write(new_rows, hashlib.blake2b(''.join(sorted(new_signatures)).encode('utf-8'), digest_size=8).hexdigest())
+                archive.enforce_retention(raw_retention_days)
+    
+    def trace(self, request_id):
+        """Every line of a request (full uuid) or session (8-char uuid prefix), in time order"""
+        request_id = request_id.strip().lower()
+        field = 'session_id' if len(request_id) <= 8 else 'uuid'
+        # Labels of rows spilled under memory pressure are no longer in the frame
+        rows = self.df.loc[self.df.index.intersection(self.request_index.lookup(field, request_id))]
+        rows = rows[rows[field].str.lower() == request_id]
+        return rows.sort_values(['timestamp', 'filename'], kind='stable')
+    
+    def count_distinct(self, field, exact=False):
+        """Distinct values of field over the whole dataset, from HLL sketches unless exact"""
+        if exact:
+            return self.df[field].nunique()
+        return self.distinct.estimate(field)
+    
+    def top_table(self, stream, k=10, exact=False, start=None, end=None):
+        """Top-k of a heavy-hitter stream as item, count, error - Space-Saving unless exact"""
+        if not exact:
+            return self.heavy_hitters.top(stream, k, start, end)
+        field, errors_only = HeavyHitters.STREAMS[stream]
+        rows = self.df[self.df['error']] if errors_only else self.df
+        if start is not None:
+            rows = rows[rows['timestamp'] >= start]
+        if end is not None:
+            rows = rows[rows['timestamp'] <= end]
+        counts = rows[field].value_counts().head(k)
+        return pd.DataFrame({'item': counts.index, 'count': counts.to_numpy(), 'error': 0})
+    
+    def top_values(self, stream, k=10, exact=False):
+        """Top-k {value: count} of a heavy-hitter stream over the whole dataset"""
+        top = self.top_table(stream, k, exact)
+        return dict(zip(top['item'], top['count']))
+    
+    def get_advanced_stats(self, exact_distinct=False, exact_topk=False, sample_rate=None):
+        """Generate comprehensive advanced statistics (row aggregates estimated from a sample if sample_rate)"""
+        if self.df is None or len(self.df) == 0:
+            return {}
+        data = self.df if sample_rate is None else self.sampler.sample(self.df, sample_rate)
+        
+        # Basic stats
+        total_logs = len(self.df)
+        date_range = {
+            'start': self.df['timestamp'].min(),
+            'end': self.df['timestamp'].max()
+        }
+        
+        sessions = self.sessions.table()
+        
+        # Advanced analytics
+        stats = {
+            'total_logs': total_logs,
+            'date_range': date_range,
+            'duration_days': (date_range['end'] - date_range['start']).days if date_range['start'] else 0,
+            'exact_distinct': exact_distinct,
+            'exact_topk': exact_topk,
+            
+            # User Analytics
+            'users': {
+                'total': self.count_distinct('user', exact_distinct),
+                'unique_list': list(data['user'].unique()),
+                'most_active': self.top_values('user', 10, exact_topk),
+                'activity_distribution': group_counts(data, 'user').describe().to_dict()
+            },
+            
+            # Service Analytics
+            'services': {
+                'distribution': group_counts(data, 'service').sort_values(ascending=False, kind='stable').to_dict(),
+                'success_rates': self._means(data, 'success', 'service'),
+                'error_rates': self._means(data, 'error', 'service'),
+                'activity_trends': group_counts(data, ['service', 'date']).unstack(fill_value=0).to_dict()
+            },
+            
+            # Time Analytics
+            'temporal': {
+                'hourly_pattern': group_counts(data, 'hour').to_dict(),
+                'daily_pattern': group_counts(data, 'day_of_week').to_dict(),
+                'peak_hour': group_counts(data, 'hour').idxmax(),
+                'peak_day': group_counts(data, 'day_of_week').idxmax(),
+                'activity_by_date': group_counts(data, 'date').to_dict()
+            },
+            
+            # Technical Analytics
+            'technical': {
+                'browsers': group_counts(data, 'browser').sort_values(ascending=False, kind='stable').to_dict(),
+                'operating_systems': group_counts(data, 'os').sort_values(ascending=False, kind='stable').to_dict(),
+                'ip_addresses': self.count_distinct('ip', exact_distinct),
+                'unique_sessions': len(sessions),
+                'avg_session_length': sessions['actions'].mean(),
+                'avg_session_minutes': sessions['duration_minutes'].mean()
+            },
+            
+            # Performance Analytics
+            'performance': {
+                'overall_success_rate': self._means(data, 'success') * 100,
+                'overall_error_rate': self._means(data, 'error') * 100,
+                'response_time_percentiles': self.latency.quantiles(self.latency.sketch()),
+                'actions_distribution': self.top_values('action', 20, exact_topk),
+                'error_messages': {self.templates.template(template_id): count for template_id, count
+                                   in self.top_values('error_template', 10, exact_topk).items()},
+                'tenant_activity': group_counts(data, 'tenant_id').sort_values(ascending=False, kind='stable').to_dict()
+            },
+            
+            # Security Analytics
+            'security': {
+                'failed_logins': self.brute_force.failed_logins,
+                'brute_force_incidents': self.brute_force.incident_count,
+                'suspicious_ips': self.top_values('error_ip', 5, exact_topk),
+                'unusual_activity': self.top_values('ip', 10, exact_topk)
+            },
+            
+            # Sampling error of the estimated aggregates (None for exact answers)
+            'approximate': None if sample_rate is None else {
+                'sample_rate': sample_rate,
+                'sample_rows': len(data),
+                'success_rate_margin': estimate_mean(data, 'success')[1] * 100,
+                'error_rate_margin': estimate_mean(data, 'error')[1] * 100,
+                'service_margins': estimate_counts(data, 'service')[1].to_dict(),
+                'hourly_margins': estimate_counts(data, 'hour')[1].to_dict(),
+            }
+        }
+        
+        return stats
+    
+    @staticmethod
+    def _means(data, column, by=None):
+        """Mean of column overall or per group; weighted when data is a sample"""
+        if SAMPLE_WEIGHT in data.columns:
+            means = estimate_mean(data, column, by)[0]
+            return means.to_dict() if by is not None else float(means)
+        return data.groupby(by)[column].mean().to_dict() if by is not None else data[column].mean()
+
+def line_hashes(lines):
+    """64-bit hashes of raw log lines, computed in one vectorized pass"""
+    return pd.util.hash_pandas_object(lines, index=False).to_numpy(dtype=np.uint64)
+
+def count_by_file(counts, filenames):
+    """Add the rows per file in filenames to a filename -> count dict"""
+    for name, count in filenames.value_counts().items():
+        counts[name] = counts.get(name, 0) + int(count)
+
+def sorted_run_order(timestamps, part_lengths):
+    """Stable ascending order of timestamps (NaT last) from k-way merging presorted parts.
+    
+    part_lengths split timestamps into consecutive parts (one per parsed chunk). Parts already in
+    order are taken as they are and only the others are sorted; adjacent parts that continue each
+    other form one run, and the runs are k-way merged, so in-order files cost linear work.
+    Returns (order, stats), where order is None when nothing needs to move.
+    """
+    keys = timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    keys = np.where(timestamps.isna().to_numpy(), np.iinfo(np.int64).max, keys)
+    groups = []  # [[(sorted keys, positions) of parts that continue each other]] in input order
+    sorted_parts = unsorted_rows = 0
+    start = 0
+    for length in part_lengths:
+        part = keys[start:start + length]
+        if (part[1:] >= part[:-1]).all():
+            sorted_parts += 1
+            run = (part, np.arange(start, start + length))
+        else:
+            unsorted_rows += length
+            order = np.argsort(part, kind='stable')
+            run = (part[order], start + order)
+        if length and groups and groups[-1][-1][0][-1] <= run[0][0]:
+            groups[-1].append(run)
+        elif length:
+            groups.append([run])
+        start += length
+    stats = {'rows': len(keys), 'parts': len(part_lengths), 'sorted_parts': sorted_parts,
+             'runs': len(groups), 'unsorted_rows': unsorted_rows,
+             'in_order_ratio': float((keys[1:] >= keys[:-1]).mean()) if len(keys) > 1 else 1.0}
+    if len(groups) <= 1 and unsorted_rows == 0:
+        return None, stats
+    runs = [run for group in groups for run in group]
+    if len(groups) == 1:
+        return np.concatenate([run[1] for run in runs]), stats
+    # NumPy's stable sort is a timsort: on concatenated runs it finds their boundaries and merges
+    # them k-way in linear passes instead of sorting from scratch
+    merged = np.argsort(np.concatenate([run[0] for run in runs]), kind='stable')
+    return np.concatenate([run[1] for run in runs])[merged], stats
+
+def ipv4_to_uint32(ips):
+    """Pack dotted IPv4 strings into uint32 (0 for IPv6 or unparsable addresses)"""
+    octets = ips.str.extract(r'^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$').astype(np.float64)
+    valid = octets.notna().all(axis=1) & (octets <= 255).all(axis=1)
+    packed = octets[0] * 16777216 + octets[1] * 65536 + octets[2] * 256 + octets[3]
+    return packed.where(valid, 0).to_numpy(dtype=np.uint32)
+
+def uint32_to_ipv4(values):
+    """Dotted IPv4 strings for packed uint32 addresses"""
+    values = np.asarray(values, dtype=np.uint32)
+    octets = [pd.Series((values >> np.uint32(shift)) & np.uint32(255)).astype(str) for shift in (24, 16, 8, 0)]
+    return pd.Index(octets[0] + '.' + octets[1] + '.' + octets[2] + '.' + octets[3])
+
+def parse_networks(text):
+    """ip_network blocks from comma/space separated CIDRs or addresses (ValueError on bad input)"""
+    return [ipaddress.ip_network(part, strict=False) for part in re.split(r'[,\s]+', text.strip()) if part]
+
+def ip_in_networks(ip, networks):
+    """Whether an address string falls in any of the networks"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+def subnet_prefix_mask(prefix):
+    """uint32 netmask for a prefix length"""
+    return np.uint32((0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF)
+
+def ipv4_subnet_counts(ip_num, prefix):
+    """Rows per IPv4 subnet (a.b.c.d/prefix) for an array of packed addresses, ignoring non-IPv4"""
+    ip_num = np.asarray(ip_num, dtype=np.uint32)
+    counts = pd.Series(ip_num[ip_num != 0] & subnet_prefix_mask(prefix)).value_counts()
+    counts.index = uint32_to_ipv4(counts.index) + f'/{prefix}'
+    return counts
+
+def network_mask(frame, networks):
+    """Boolean mask of frame rows whose IP falls in any network, from uint32 range compares"""
+    ip_num = frame['ip_num'].to_numpy(dtype=np.uint32)
+    mask = np.zeros(len(frame), dtype=bool)
+    for network in networks:
+        if network.version == 4:
+            mask |= (ip_num >= int(network.network_address)) & (ip_num <= int(network.broadcast_address))
+    # Non-IPv4 rows (ip_num 0) are matched on the address string
+    if (ip_num == 0).any():
+        other = frame['ip'][ip_num == 0]
+        inside = {ip for ip in other.unique() if ip_in_networks(ip, networks)}
+        mask[ip_num == 0] = other.isin(inside).to_numpy()
+    return mask
+
+def hll_registers(values, precision=HLL_PRECISION):
+    """Vectorized HyperLogLog register updates (register index, rank) for a Series of values"""
+    hashes = pd.util.hash_pandas_object(values.fillna(''), index=False).to_numpy(dtype=np.uint64)
+    reg = (hashes >> np.uint64(64 - precision)).astype(np.int32)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    # rank = position of the leftmost 1-bit in the remaining 64 - precision bits
+    bit_length = np.where(rest > 0, np.frexp(rest.astype(np.float64))[1], 0)
+    rank = (64 - precision - bit_length + 1).astype(np.int8)
+    return reg, rank
+
+def hll_encode(registers):
+    """Blob of a dense HLL register array, stored sparse while few registers are set"""
+    nonzero = np.flatnonzero(registers)
+    if len(nonzero) * 3 < len(registers):
+        return hll_encode_sparse(nonzero, registers[nonzero])
+    return zlib.compress(registers.astype(np.uint8).tobytes(), 1)
+
+def hll_encode_sparse(indexes, ranks):
+    """Sparse blob: b's', the uint16 indexes, then the uint8 ranks of the set registers (3 bytes each).
+    
+    Dense blobs are zlib streams, which never start with b's'.
+    """
+    return b's' + indexes.astype('<u2').tobytes() + ranks.astype(np.uint8).tobytes()
+
+def hll_decode(blob, precision=HLL_PRECISION):
+    """Dense register array from a blob written by hll_encode"""
+    if blob[:1] != b's':
+        return np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+    count = (len(blob) - 1) // 3
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    registers[np.frombuffer(blob, dtype='<u2', count=count, offset=1)] = np.frombuffer(blob, dtype=np.uint8, offset=1 + 2 * count)
+    return registers
+
+def hll_estimate(registers):
+    """Estimate distinct counts from dense HLL registers, one estimate per row of a 2D array"""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    zeros = (registers == 0).sum(axis=1)
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=1)
+    # Linear counting for small cardinalities
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.round(np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw))
+
+class RollupStore:
+    """Minute/hour/day rollups of counts, success/error sums and HLL distinct-count sketches.
+    
+    Rollups are kept per dimension (overall, service, user, tenant and action) in SQLite and merged
+    on write, so new batches can be added incrementally. Counts exist at every resolution; distinct
+    sketches are kept at hour and day resolution, which also answer minute-aligned ranges to within
+    an hour. Most cells (one user in one hour) see a handful of values, so sketches are built and
+    stored sparse (see hll_encode) and only go dense once that is smaller. Use ':memory:' for a
+    per-load store.
+    """
+    
+    RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+    SKETCH_RESOLUTIONS = ['hour', 'day']
+    DIMENSIONS = ['all', 'service', 'user', 'tenant_id', 'action']
+    DISTINCT_FIELDS = ['user', 'ip', 'session_id']
+    
+    def __init__(self, path=':memory:'):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rollup_counts (
+                resolution TEXT, dimension TEXT, key TEXT, bucket INTEGER,
+                events INTEGER, success INTEGER, errors INTEGER,
+                PRIMARY KEY (resolution, dimension, key, bucket)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS rollup_sketches (
+                resolution TEXT, dimension TEXT, field TEXT, key TEXT, bucket INTEGER,
+                registers BLOB,
+                PRIMARY KEY (resolution, dimension, field, key, bucket)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS rollup_sources (
+                signature TEXT PRIMARY KEY, ingested_at REAL
+            );
+        """)
+    
+    def ingest_sources(self, signatures, rows_for):
+        """Roll up the rows of sources not already in the store and record them, in one transaction.
+        
+        rows_for(new_signatures) returns the rows to merge; if it or the merge fails nothing is
+        recorded, so the next load of those sources tries again. Returns the new signatures.
+        """
+        with self._lock, self._conn:
+            known = {row[0] for row in self._conn.execute('SELECT signature FROM rollup_sources')}
+            new = set(signatures) - known
+            if new:
+                self._write(*self._cells(rows_for(new)))
+                self._conn.executemany('INSERT INTO rollup_sources VALUES (?, ?)',
+                                       [(signature, time.time()) for signature in new])
+        return new
+    
+    def ingest(self, frame):
+        """Merge a batch of parsed rows into every resolution and dimension"""
+        count_rows, sketch_cells = self._cells(frame)
+        with self._lock, self._conn:
+            self._write(count_rows, sketch_cells)
+    
+    def _cells(self, frame):
+        """Count rows and sketch cells of a batch for every resolution and dimension"""
+        frame = frame[frame['timestamp'].notna()]
+        if len(frame) == 0:
+            return [], []
+        epoch = ((frame['timestamp'] - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy()
+        outcomes = pd.DataFrame({'success': frame['success'].to_numpy(dtype=np.int64),
+                                 'errors': frame['error'].to_numpy(dtype=np.int64)})
+        sketches = {field: hll_registers(frame[field]) for field in self.DISTINCT_FIELDS}
+        
+        count_rows = []
+        sketch_cells = []
+        for dimension in self.DIMENSIONS:
+            keys = np.full(len(frame), '*', dtype=object) if dimension == 'all' else frame[dimension].fillna('').to_numpy(dtype=object)
+            
+            # Counts roll up minute -> hour -> day from the (much smaller) finer cells
+            cells = outcomes.assign(bucket=epoch // 60 * 60, key=keys).groupby(['bucket', 'key']).agg(
+                events=('success', 'size'), success=('success', 'sum'), errors=('errors', 'sum')).reset_index()
+            for resolution, seconds in self.RESOLUTIONS.items():
+                if seconds != 60:
+                    cells = cells.assign(bucket=cells['bucket'] // seconds * seconds).groupby(
+                        ['bucket', 'key'], as_index=False)[['events', 'success', 'errors']].sum()
+                count_rows.extend(zip([resolution] * len(cells), [dimension] * len(cells), cells['key'],
+                                      cells['bucket'].tolist(), cells['events'].tolist(),
+                                      cells['success'].tolist(), cells['errors'].tolist()))
+            
+            for field, (reg, rank) in sketches.items():
+                if field == dimension:
+                    continue
+                for resolution in self.SKETCH_RESOLUTIONS:
+                    seconds = self.RESOLUTIONS[resolution]
+                    sketch_cells.append((resolution, dimension, field,
+                                         self._sparse_registers(epoch // seconds * seconds, keys, reg, rank)))
+        return count_rows, sketch_cells
+    
+    def _write(self, count_rows, sketch_cells):
+        """Merge count rows and sketch cells into the tables (caller holds lock and transaction)"""
+        if count_rows:
+            self._conn.executemany("""
+                INSERT INTO rollup_counts VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (resolution, dimension, key, bucket) DO UPDATE SET
+                    events = events + excluded.events,
+                    success = success + excluded.success,
+                    errors = errors + excluded.errors
+            """, count_rows)
+        for resolution, dimension, field, cells in sketch_cells:
+            self._merge_sketches(resolution, dimension, field, *cells)
+    
+    @staticmethod
+    def _sparse_registers(buckets, keys, reg, rank):
+        """Collapse per-row register updates into the set registers of each (key, bucket) cell.
+        
+        Returns the cell keys and buckets, the register indexes and max ranks sorted by cell, and
+        each cell's offsets into them.
+        """
+        cells = pd.DataFrame({'bucket': buckets, 'key': keys})
+        codes = cells.groupby(['key', 'bucket'], sort=False).ngroup().to_numpy()
+        firsts = pd.Series(np.arange(len(codes))).groupby(codes).first().to_numpy()
+        updates = pd.Series(rank.astype(np.uint8)).groupby(codes.astype(np.int64) << HLL_PRECISION | reg).max()
+        slots = updates.index.to_numpy()
+        offsets = np.searchsorted(slots >> HLL_PRECISION, np.arange(len(firsts) + 1))
+        return (cells['key'].to_numpy()[firsts], cells['bucket'].to_numpy()[firsts],
+                (slots & ((1 << HLL_PRECISION) - 1)).astype(np.intp), updates.to_numpy(), offsets)
+    
+    def _merge_sketches(self, resolution, dimension, field, keys, buckets, indexes, ranks, offsets):
+        """Max-merge new register updates with the stored sketches of the same cells (caller holds lock)"""
+        existing = {
+            (key, bucket): blob for key, bucket, blob in self._conn.execute(
+                'SELECT key, bucket, registers FROM rollup_sketches '
+                'WHERE resolution = ? AND dimension = ? AND field = ? AND bucket BETWEEN ? AND ?',
+                (resolution, dimension, field, int(buckets.min()), int(buckets.max())))
+        }
+        rows = []
+        for key, bucket, start, end in zip(keys, buckets.tolist(), offsets[:-1], offsets[1:]):
+            blob = existing.get((key, bucket))
+            cell_indexes, cell_ranks = indexes[start:end], ranks[start:end]
+            if blob is None and (end - start) * 3 < 1 << HLL_PRECISION:
+                # New sparse cell: its indexes are already unique and sorted
+                encoded = hll_encode_sparse(cell_indexes, cell_ranks)
+            else:
+                cell = np.zeros(1 << HLL_PRECISION, dtype=np.uint8) if blob is None else hll_decode(blob).copy()
+                cell[cell_indexes] = np.maximum(cell[cell_indexes], cell_ranks)
+                encoded = hll_encode(cell)
+            rows.append((resolution, dimension, field, key, bucket, encoded))
+        self._conn.executemany('INSERT OR REPLACE INTO rollup_sketches VALUES (?, ?, ?, ?, ?, ?)', rows)
+    
+    def dump(self, path):
+        """Copy the rollups into a SQLite file"""
+        with self._lock:
+            copy_sqlite(self._conn, path)
+    
+    def load(self, path):
+        """Replace the rollups with ones written by dump()"""
+        with self._lock:
+            copy_sqlite(path, self._conn)
+    
+    def enforce_retention(self, raw_days, aggregated_days):
+        """Drop minute/hour rollups older than raw_days and day rollups older than aggregated_days.
+        
+        Ages are measured back from the newest bucket in the store, so replaying historical
+        logs does not purge them on arrival.
+        """
+        with self._lock, self._conn:
+            newest = self._conn.execute('SELECT MAX(bucket) FROM rollup_counts').fetchone()[0]
+            if newest is None:
+                return
+            for table in ('rollup_counts', 'rollup_sketches'):
+                self._conn.execute(f"DELETE FROM {table} WHERE resolution IN ('minute', 'hour') AND bucket < ?",
+                                   (newest - int(raw_days) * 86400,))
+                self._conn.execute(f"DELETE FROM {table} WHERE resolution = 'day' AND bucket < ?",
+                                   (newest - int(aggregated_days) * 86400,))
+    
+    def _where(self, resolution, dimension, keys, start, end):
+        clauses = ['resolution = ?', 'dimension = ?']
+        params = [resolution, dimension]
+        if keys is not None:
+            keys = list(keys)
+            clauses.append(f"key IN ({', '.join('?' * len(keys))})")
+            params.extend(keys)
+        if start is not None:
+            clauses.append('bucket >= ?')
+            params.append(int(pd.Timestamp(start).timestamp()))
+        if end is not None:
+            clauses.append('bucket <= ?')
+            params.append(int(pd.Timestamp(end).timestamp()))
+        return ' AND '.join(clauses), params
+    
+    def timeline(self, resolution, dimension='all', keys=None, start=None, end=None):
+        """Events/success/errors per bucket (and key) for one resolution and dimension"""
+        where, params = self._where(resolution, dimension, keys, start, end)
+        with self._lock:
+            result = pd.read_sql_query(
+                f'SELECT bucket, key, events, success, errors FROM rollup_counts WHERE {where} ORDER BY bucket',
+                self._conn, params=params)
+        result['bucket'] = pd.to_datetime(result['bucket'], unit='s')
+        return result
+    
+    def distinct_registers(self, field, resolution='day', dimension='all', keys=None, start=None, end=None):
+        """Merged HLL registers per key for a field over a bucket range, as {key: registers}"""
+        where, params = self._where(resolution, dimension, keys, start, end)
+        merged = {}
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT key, registers FROM rollup_sketches WHERE {where} AND field = ?', params + [field]).fetchall()
+        for key, blob in rows:
+            cell = hll_decode(blob)
+            merged[key] = np.maximum(merged[key], cell) if key in merged else cell
+        return merged
+
+def copy_sqlite(source, target):
+    """Copy a whole SQLite database between connections or file paths with the online backup API"""
+    opened = []
+    if isinstance(source, str):
+        source = sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+        opened.append(source)
+    if isinstance(target, str):
+        target = sqlite3.connect(target)
+        opened.append(target)
+    try:
+        source.backup(target)
+    finally:
+        for conn in opened:
+            conn.close()
+
+@st.cache_resource
+def get_rollup_store():
+    """Persistent rollup store shared by every session of this server"""
+    return RollupStore(os.path.join(CACHE_DIR, 'rollups.db'))
+
+class PartitionedArchive:
+    """On-disk Parquet copy of ingested rows, hive-partitioned as date=YYYY-MM-DD/tenant_id=<tenant>/.
+    
+    Reads pick partition directories by name before opening anything, so a date range for one tenant
+    only touches that tenant's files for those days; service filters are pushed down into the scan.
+    """
+    
+    PARTITIONING = pa.schema([('date', pa.string()), ('tenant_id', pa.string())]) if pa is not None else None
+    
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+    
+    def write(self, frame, token):
+        """Append rows as new files in their date/tenant partitions"""
+        # Template ids are only meaningful within one load
+        rows = frame.drop(columns=['date', 'template_id'], errors='ignore')
+        rows.insert(0, 'date', frame['timestamp'].dt.strftime('%Y-%m-%d').fillna('unknown'))
+        rows['tenant_id'] = rows['tenant_id'].fillna('unknown')
+        with self._lock:
+            ds.write_dataset(pa.Table.from_pandas(rows, preserve_index=False), self.root, format='parquet',
+                             partitioning=ds.partitioning(self.PARTITIONING, flavor='hive'),
+                             basename_template=f'part-{token}-{{i}}.parquet',
+                             existing_data_behavior='overwrite_or_ignore')
+    
+    def _partitions(self, start=None, end=None, tenants=None):
+        """Partition directories matching a date range and tenants, chosen from directory names alone"""
+        if not os.path.isdir(self.root):
+            return []
+        start = str(start) if start is not None else None
+        end = str(end) if end is not None else None
+        tenants = set(tenants) if tenants else None
+        partitions = []
+        for date_dir in sorted(os.listdir(self.root)):
+            day = date_dir[len('date='):]
+            if not date_dir.startswith('date=') or (start and day < start) or (end and day > end):
+                continue
+            for tenant_dir in sorted(os.listdir(os.path.join(self.root, date_dir))):
+                if tenants is None or unquote(tenant_dir[len('tenant_id='):]) in tenants:
+                    partitions.append(os.path.join(self.root, date_dir, tenant_dir))
+        return partitions
+    
+    def tenants(self):
+        """Every tenant with a partition in the archive, from directory names alone"""
+        return sorted({unquote(os.path.basename(partition)[len('tenant_id='):]) for partition in self._partitions()})
+    
+    def read(self, start=None, end=None, tenants=None, services=None):
+        """Rows for a date range, tenants and services, plus the number of partitions and files read"""
+        partitions = self._partitions(start, end, tenants)
+        files = [os.path.join(partition, name) for partition in partitions
+                 for name in os.listdir(partition) if name.endswith('.parquet')]
+        if not files:
+            return None, {'partitions': 0, 'files': 0}
+        dataset = ds.dataset(files, format='parquet', partition_base_dir=self.root,
+                             partitioning=ds.partitioning(self.PARTITIONING, flavor='hive'))
+        table = dataset.to_table(filter=ds.field('service').isin(services) if services else None)
+        rows = table.to_pandas()
+        rows.insert(1, 'date', pd.to_datetime(rows.pop('date'), errors='coerce').dt.date)
+        rows.insert(rows.columns.get_loc('user') + 1, 'tenant_id', rows.pop('tenant_id'))
+        rows = rows.sort_values('timestamp', kind='stable', ignore_index=True)
+        return rows, {'partitions': len(partitions), 'files': len(files)}
+    
+    def enforce_retention(self, retention_days):
+        """Drop date partitions older than retention_days before the newest one"""
+        dates = [name[len('date='):] for name in os.listdir(self.root) if name.startswith('date=')] \
+            if os.path.isdir(self.root) else []
+        dates = [date for date in dates if date != 'unknown']
+        if not dates:
+            return
+        cutoff = (pd.Timestamp(max(dates)) - pd.Timedelta(days=int(retention_days))).strftime('%Y-%m-%d')
+        with self._lock:
+            for date in dates:
+                if date < cutoff:
+                    shutil.rmtree(os.path.join(self.root, f'date={date}'), ignore_errors=True)
+
+@st.cache_resource
+def get_partitioned_archive():
+    """Parquet archive shared by every session of this server (None without pyarrow)"""
+    return PartitionedArchive(os.path.join(CACHE_DIR, 'parquet')) if pa is not None else None
+
+class ScalableBloomFilter:
+    """Persistent scalable Bloom filter of raw-line hashes, so history skips lines it already holds.
+    
+    Each stage is a bit array sized for its capacity at its false-positive rate; when one fills up a
+    stage twice as large at half the rate is added, keeping the overall rate under error_rate however
+    many lines arrive. A false positive only keeps a genuinely new line out of the history.
+    """
+    
+    GROWTH = 2
+    TIGHTENING = 0.5
+    BLOCK = 1 << 18  # hashes probed per vectorized step
+    
+    def __init__(self, path, capacity=1_000_000, error_rate=0.001):
+        self.path = path
+        self.capacity = int(capacity)
+        self.error_rate = float(error_rate)
+        self._lock = threading.Lock()
+        self._stages = []  # [{'bits': uint8 array, 'hashes': probes per line, 'capacity', 'count'}]
+        self._dirty = False
+        self._saved_at = time.time()
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                meta = json.loads(bytes(saved['meta']).decode('utf-8'))
+                self._stages = [dict(stage, bits=saved[f'bits{i}']) for i, stage in enumerate(meta)]
+    
+    def _new_stage(self):
+        index = len(self._stages)
+        capacity = self.capacity * self.GROWTH ** index
+        rate = self.error_rate * (1 - self.TIGHTENING) * self.TIGHTENING ** index
+        bits = int(np.ceil(-capacity * np.log(rate) / np.log(2) ** 2))
+        self._stages.append({'bits': np.zeros((bits + 7) // 8, dtype=np.uint8),
+                             'hashes': max(1, int(np.ceil(-np.log2(rate)))), 'capacity': capacity, 'count': 0})
+    
+    @staticmethod
+    def _positions(stage, hashes):
+        # Double hashing: probe i of a line is h1 + i * h2 modulo the stage size
+        size = np.uint64(len(stage['bits']) * 8)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        return (h1[:, None] + np.arange(stage['hashes'], dtype=np.uint64)[None, :] * h2[:, None]) % size
+    
+    def _contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for stage in self._stages:
+            for start in range(0, len(hashes), self.BLOCK):
+                positions = self._positions(stage, hashes[start:start + self.BLOCK])
+                bits = (stage['bits'][positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+                found[start:start + self.BLOCK] |= bits.all(axis=1)
+        return found
+    
+    def add(self, hashes):
+        """Add line hashes; returns the mask of those not (probably) added before"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        with self._lock:
+            fresh = ~self._contains(hashes) & ~pd.Series(hashes).duplicated().to_numpy()
+            pending = hashes[fresh]
+            while len(pending):
+                if not self._stages or self._stages[-1]['count'] >= self._stages[-1]['capacity']:
+                    self._new_stage()
+                stage = self._stages[-1]
+                batch, pending = np.split(pending, [stage['capacity'] - stage['count']])
+                for start in range(0, len(batch), self.BLOCK):
+                    positions = self._positions(stage, batch[start:start + self.BLOCK]).ravel()
+                    np.bitwise_or.at(stage['bits'], positions >> np.uint64(3),
+                                     np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+                stage['count'] += len(batch)
+                self._dirty = True
+        return fresh
+    
+    def save(self, max_age=None):
+        """Write the filter to disk if it changed (and, with max_age, if the last write is that old)"""
+        with self._lock:
+            if not self._dirty or (max_age is not None and time.time() - self._saved_at < max_age):
+                return
+            meta = [{key: value for key, value in stage.items() if key != 'bits'} for stage in self._stages]
+            arrays = {f'bits{i}': stage['bits'] for i, stage in enumerate(self._stages)}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            staging = f"{self.path}.{os.getpid()}.tmp.npz"
+            np.savez(staging, meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8), **arrays)
+            os.replace(staging, self.path)
+            self._dirty = False
+            self._saved_at = time.time()
+    
+    def stats(self):
+        """Lines added, stages and bytes of bit arrays"""
+        with self._lock:
+            return {'lines': sum(stage['count'] for stage in self._stages), 'stages': len(self._stages),
+                    'bytes': sum(len(stage['bits']) for stage in self._stages)}
+
+@st.cache_resource
+def get_line_filter():
+    """Persistent duplicate-line filter for the rollup history (None when duplicate_detection is off)"""
+    config = load_platform_config()
+    if not get_config_value(config, 'log_processing.duplicate_detection', True):
+        return None
+    return ScalableBloomFilter(
+        os.path.join(CACHE_DIR, 'dedup', 'lines.npz'),
+        capacity=int(get_config_value(config, 'log_processing.duplicate_filter.initial_capacity', 1_000_000)),
+        error_rate=float(get_config_value(config, 'log_processing.duplicate_filter.error_rate', 0.001)))
+
+# Reader engines saved in snapshots; each rebuilds itself from get_state() data in set_state()
+SNAPSHOT_ENGINES = ['request_index', 'ip_index', 'heavy_hitters', 'sessions', 'anomalies',
+                    'templates', 'latency', 'brute_force', 'sampler']
+
+def encode_state(value, arrays):
+    """JSON-ready form of plain snapshot data, moving NumPy arrays into `arrays` (name -> array).
+    
+    Only data types are accepted: containers, scalars, timestamps, dates and non-object arrays.
+    Anything that is not plain data is tagged with a one-key object, so decoding never has to
+    construct arbitrary objects; unsupported values raise TypeError while the snapshot is written.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, np.generic) and not isinstance(value, (np.datetime64, np.timedelta64)):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            raise TypeError("Object arrays cannot be stored in a snapshot")
+        name = f'a{len(arrays)}'
+        arrays[name] = value
+        return {'array': name}
+    if value is pd.NaT:
+        return {'timestamp': None}
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        value = pd.Timestamp(value)
+        return {'timestamp': [value.isoformat(), value.unit]}
+    if isinstance(value, (pd.Timedelta, np.timedelta64)):
+        value = pd.Timedelta(value)
+        return {'timedelta': [value.value, value.unit]}
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, list):
+        return [encode_state(item, arrays) for item in value]
+    if isinstance(value, tuple):
+        return {'tuple': [encode_state(item, arrays) for item in value]}
+    if isinstance(value, dict):
+        return {'dict': [[encode_state(key, arrays), encode_state(item, arrays)] for key, item in value.items()]}
+    raise TypeError(f"{type(value).__name__} values cannot be stored in a snapshot")
+
+def decode_state(value, arrays):
+    """Inverse of encode_state, reading arrays from the snapshot's array archive"""
+    if isinstance(value, list):
+        return [decode_state(item, arrays) for item in value]
+    if not isinstance(value, dict):
+        return value
+    (tag, data), = value.items()
+    if tag == 'array':
+        return arrays[data]
+    if tag == 'timestamp':
+        return pd.NaT if data is None else pd.Timestamp(data[0]).as_unit(data[1])
+    if tag == 'timedelta':
+        return pd.Timedelta(data[0], unit='ns').as_unit(data[1])
+    if tag == 'datetime':
+        return datetime.fromisoformat(data)
+    if tag == 'date':
+        return date.fromisoformat(data)
+    if tag == 'tuple':
+        return tuple(decode_state(item, arrays) for item in data)
+    if tag == 'dict':
+        return {decode_state(key, arrays): decode_state(item, arrays) for key, item in data}
+    raise ValueError(f"Unknown value tag {tag!r} in snapshot state")
+
+def write_snapshot(reader, path, stats=None, compression='none'):
+    """Save an analyzed dataset as a snapshot bundle directory and return its manifest.
+    
+    The rows go to logs.arrow (Arrow IPC file) and the SQLite rollups and search index are copied as
+    database files. Every other engine and the precomputed stats are written as plain data: their
+    NumPy arrays to state.npz and everything else to state.json, so restoring a bundle never
+    unpickles anything. With compression 'none' rows are memory-mapped back without copying;
+    'lz4'/'zstd' shrink logs.arrow (and deflate state.npz) at the cost of decompressing on restore.
+    The bundle is written next to path and moved into place, so a snapshot that is being replaced
+    stays readable by sessions that mapped it.
+    """
+    codec = None if compression in (None, 'none') else compression
+    staging = f"{path}.tmp-{os.urandom(4).hex()}"
+    os.makedirs(staging)
+    try:
+        table = pa.Table.from_pandas(reader.df, preserve_index=True)
+        with pa.OSFile(os.path.join(staging, 'logs.arrow'), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=codec)) as writer:
+                writer.write_table(table, max_chunksize=1 << 20)
+        reader.rollups.dump(os.path.join(staging, 'rollups.sqlite'))
+        reader.search_index.dump(os.path.join(staging, 'search.sqlite'))
+        
+        arrays = {}
+        state = {'engines': {}, 'stats': encode_state(stats, arrays)}
+        for name in SNAPSHOT_ENGINES:
+            engine = getattr(reader, name)
+            # Encoded under the engine's lock so live ingestion cannot change it midway
+            with engine._lock:
+                state['engines'][name] = encode_state(engine.get_state(), arrays)
+        (np.savez_compressed if codec else np.savez)(os.path.join(staging, 'state.npz'), **arrays)
+        with open(os.path.join(staging, 'state.json'), 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'rows': len(reader.df),
+            'fingerprint': reader.fingerprint,
+            'file_stats': reader.file_stats,
+            'parse_errors': reader.parse_errors,
+            'duplicate_lines': reader.duplicate_lines,
+            'compression': codec or 'none',
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        
+        previous = None
+        if os.path.exists(path):
+            previous = f"{path}.old-{os.urandom(4).hex()}"
+            os.replace(path, previous)
+        os.replace(staging, path)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+        return manifest
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+def read_snapshot(path, headless=False):
+    """Restore a snapshot bundle into a new reader without parsing; returns (reader, manifest, stats)"""
+    with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {manifest.get('version')} is not supported (expected {SNAPSHOT_VERSION})")
+    
+    reader = SkylLogReader(headless=headless)
+    # Uncompressed buffers stay in the page cache; columns reference them instead of being copied.
+    # Times stay Arrow-backed: converting them to datetime.time objects would dominate the restore.
+    table = pa.ipc.open_file(pa.memory_map(os.path.join(path, 'logs.arrow'))).read_all()
+    reader.df = table.to_pandas(split_blocks=True, types_mapper={pa.time64('us'): pd.ArrowDtype(pa.time64('us'))}.get)
+    reader.file_stats = manifest['file_stats']
+    reader.parse_errors = manifest['parse_errors']
+    reader.duplicate_lines = manifest.get('duplicate_lines', {})
+    reader.fingerprint = manifest['fingerprint']
+    reader.rollups.load(os.path.join(path, 'rollups.sqlite'))
+    reader.search_index.load(os.path.join(path, 'search.sqlite'), background=True)
+    
+    with open(os.path.join(path, 'state.json'), encoding='utf-8') as f:
+        state = json.load(f)
+    # Object arrays are refused, so loading the archive cannot run code either
+    with np.load(os.path.join(path, 'state.npz'), allow_pickle=False) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    for name in SNAPSHOT_ENGINES:
+        engine = getattr(reader, name)
+        with engine._lock:
+            engine.set_state(decode_state(state['engines'][name], arrays))
+    return reader, manifest, decode_state(state['stats'], arrays)
+
+def list_snapshots(root=SNAPSHOT_DIR):
+    """Manifests of the snapshot bundles under root, newest first, as [(name, manifest)]"""
+    snapshots = []
+    for manifest_path in glob.glob(os.path.join(root, '*', 'manifest.json')):
+        name = os.path.basename(os.path.dirname(manifest_path))
+        if '.tmp-' in name or '.old-' in name:
+            continue
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                snapshots.append((name, json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return sorted(snapshots, key=lambda item: item[1].get('created', ''), reverse=True)
+
+class DistinctCounter:
+    """Approximate distinct counts of users, IPs and sessions from mergeable HLL sketches.
+    
+    Sketches come from a RollupStore (day/hour cells per service and tenant), so any time range and
+    service-or-tenant filter is answered by merging registers instead of scanning rows. The relative
+    standard error is 1.04 / sqrt(2**HLL_PRECISION), about 3.25%; ~95% of estimates are within
+    twice that.
+    """
+    
+    RELATIVE_ERROR = 1.04 / np.sqrt(1 << HLL_PRECISION)
+    
+    def __init__(self, rollups):
+        self.rollups = rollups
+    
+    def estimate(self, field, start=None, end=None, services=None, tenants=None):
+        """Estimated distinct count of field, or None when the filter combination has no sketch"""
+        if services and tenants:
+            return None
+        if services:
+            dimension, keys = 'service', services
+        elif tenants:
+            dimension, keys = 'tenant_id', tenants
+        else:
+            dimension, keys = 'all', None
+        # Whole days merge day cells; timestamp bounds need hour cells
+        resolution = 'hour' if isinstance(start, datetime) or isinstance(end, datetime) else 'day'
+        registers = self.rollups.distinct_registers(field, resolution, dimension, keys, start, end)
+        if not registers:
+            return 0
+        return int(hll_estimate(np.max(np.stack(list(registers.values())), axis=0))[0])
+    
+    def error_bound(self, estimate):
+        """Absolute ~95% error bound for an estimate"""
+        return 2 * self.RELATIVE_ERROR * estimate
+
+class SpaceSaving:
+    """Mergeable Space-Saving summary: at most `capacity` monitored items with over-estimated counts.
+    
+    Each monitored item has count >= true count >= count - error, and any unmonitored item occurred
+    at most `floor` times, so every item with true frequency above floor is guaranteed to be kept.
+    Batches are merged as whole summaries (Agarwal et al.), so updates are vectorized.
+    """
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.errors = pd.Series(dtype=np.int64)
+        self.floor = 0
+        self.total = 0
+    
+    def update(self, counts):
+        """Add exact counts of a batch (a value_counts Series)"""
+        self._merge(counts.astype(np.int64), pd.Series(0, index=counts.index, dtype=np.int64), 0, int(counts.sum()))
+    
+    def merge(self, other):
+        """Fold another summary into this one"""
+        self._merge(other.counts, other.errors, other.floor, other.total)
+    
+    def _merge(self, counts, errors, floor, total):
+        # Items missing from one side may have occurred up to that side's floor times there
+        items = self.counts.index.union(counts.index)
+        merged = self.counts.reindex(items, fill_value=self.floor) + counts.reindex(items, fill_value=floor)
+        merged_errors = self.errors.reindex(items, fill_value=self.floor) + errors.reindex(items, fill_value=floor)
+        self.floor += floor
+        if len(merged) > self.capacity:
+            merged = merged.sort_values(ascending=False, kind='stable')
+            self.floor = max(self.floor, int(merged.iloc[self.capacity]))
+            merged = merged.iloc[:self.capacity]
+        self.counts = merged
+        self.errors = merged_errors.reindex(merged.index)
+        self.total += total
+    
+    def top(self, k):
+        """Top-k items as a DataFrame of item, count and error, highest count first"""
+        counts = self.counts.sort_values(ascending=False, kind='stable').head(k)
+        return pd.DataFrame({'item': counts.index, 'count': counts.to_numpy(),
+                             'error': self.errors.reindex(counts.index).to_numpy()})
+
+class HeavyHitters:
+    """Fixed-memory top-K users, IPs, actions and messages, overall and per tumbling time window.
+    
+    Every stream keeps one SpaceSaving summary for the whole load plus one per window of
+    analytics.heavy_hitter_window_minutes; only the newest analytics.heavy_hitter_windows windows are
+    kept, and window summaries merge to answer any time range.
+    """
+    
+    STREAMS = {
+        'user': ('user', False),
+        'ip': ('ip', False),
+        'action': ('action', False),
+        'message': ('message', False),
+        'error_user': ('user', True),
+        'error_ip': ('ip', True),
+        'error_message': ('message', True),
+        'error_template': ('template_id', True),
+    }
+    
+    def __init__(self, config):
+        self.capacity = int(get_config_value(config, 'analytics.heavy_hitter_capacity', 500))
+        self.window = pd.Timedelta(minutes=int(get_config_value(config, 'analytics.heavy_hitter_window_minutes', 60)))
+        self.max_windows = int(get_config_value(config, 'analytics.heavy_hitter_windows', 168))
+        self._lock = threading.Lock()
+        self.overall = {stream: SpaceSaving(self.capacity) for stream in self.STREAMS}
+        self.windows = OrderedDict()
+    
+    def update(self, frame):
+        """Fold a batch of parsed rows into the overall and window summaries"""
+        timed = frame[frame['timestamp'].notna()]
+        buckets = timed['timestamp'].dt.floor(self.window)
+        with self._lock:
+            newest = max([buckets.max()] + list(self.windows)[-1:]) if len(timed) else None
+            cutoff = newest - self.window * (self.max_windows - 1) if newest is not None else None
+            for stream, (field, errors_only) in self.STREAMS.items():
+                rows = frame[frame['error']] if errors_only else frame
+                self.overall[stream].update(rows[field].value_counts())
+                if cutoff is None:
+                    continue
+                rows = rows[rows['timestamp'].notna()]
+                window_rows = rows[buckets.reindex(rows.index) >= cutoff]
+                grouped = window_rows.groupby([buckets.reindex(window_rows.index), field]).size()
+                for bucket, counts in grouped.groupby(level=0):
+                    summary = self.windows.setdefault(bucket, {}).setdefault(stream, SpaceSaving(self.capacity))
+                    summary.update(counts.droplevel(0))
+            if cutoff is not None:
+                self.windows = OrderedDict((bucket, self.windows[bucket])
+                                           for bucket in sorted(self.windows) if bucket >= cutoff)
+    
+    def top(self, stream, k=10, start=None, end=None):
+        """Top-k of a stream (item, count, error), over the whole load or windows in [start, end]"""
+        with self._lock:
+            if start is None and end is None:
+                return self.overall[stream].top(k)
+            merged = SpaceSaving(self.capacity)
+            for bucket, summaries in self.windows.items():
+                if (start is None or bucket + self.window > pd.Timestamp(start)) and \
+                        (end is None or bucket <= pd.Timestamp(end)) and stream in summaries:
+                    merged.merge(summaries[stream])
+            return merged.top(k)
+    
+    def get_state(self):
+        """Overall and window summaries as plain data for snapshots (caller holds _lock)"""
+        # Summaries are flattened stream by stream, so a long window history is a few arrays per stream
+        streams = {}
+        for stream in self.STREAMS:
+            summaries = [self.overall[stream]] + [window[stream] for window in self.windows.values() if stream in window]
+            streams[stream] = {
+                'windows': [bucket for bucket, window in self.windows.items() if stream in window],
+                'items': [item for summary in summaries for item in summary.counts.index.tolist()],
+                'counts': np.concatenate([summary.counts.to_numpy(dtype=np.int64) for summary in summaries]),
+                'errors': np.concatenate([summary.errors.to_numpy(dtype=np.int64) for summary in summaries]),
+                'lengths': np.array([len(summary.counts) for summary in summaries], dtype=np.int64),
+                'floors': np.array([summary.floor for summary in summaries], dtype=np.int64),
+                'totals': np.array([summary.total for summary in summaries], dtype=np.int64),
+            }
+        return {'capacity': self.capacity, 'window': self.window, 'max_windows': self.max_windows,
+                'windows': list(self.windows), 'streams': streams}
+    
+    def set_state(self, state):
+        """Replace the summaries with get_state() data (caller holds _lock)"""
+        self.capacity, self.window, self.max_windows = state['capacity'], state['window'], state['max_windows']
+        self.windows = OrderedDict((bucket, {}) for bucket in state['windows'])
+        for stream, data in state['streams'].items():
+            items = pd.Index(data['items'])
+            ends = np.cumsum(data['lengths'])
+            summaries = []
+            for start, end, floor, total in zip((ends - data['lengths']).tolist(), ends.tolist(),
+                                                data['floors'].tolist(), data['totals'].tolist()):
+                summary = SpaceSaving(self.capacity)
+                summary.counts = pd.Series(data['counts'][start:end], index=items[start:end])
+                summary.errors = pd.Series(data['errors'][start:end], index=items[start:end])
+                summary.floor, summary.total = floor, total
+                summaries.append(summary)
+            self.overall[stream] = summaries[0]
+            for bucket, summary in zip(data['windows'], summaries[1:]):
+                self.windows[bucket][stream] = summary
+
+class SessionStore:
+    """Inactivity-gap sessions per (user, ip), kept as a compact table and extended as rows arrive.
+    
+    Rows are sorted by (user, ip, timestamp) once per batch and a new session starts whenever the key
+    changes or the gap since the previous event exceeds analytics.session_inactivity_minutes. Batches
+    are assumed to be no older than the sessions already held; a batch's first session per key is
+    folded into that key's latest session when it starts within the gap.
+    """
+    
+    COLUMNS = {'user': 'str', 'ip': 'str', 'start': 'datetime64[ns]', 'end': 'datetime64[ns]',
+               'actions': 'int64', 'errors': 'int64', 'service_mask': 'int64'}
+    # service_mask is an int64: the first 62 services get their own bit, any later ones share "other"
+    OTHER_SERVICES_BIT = 1 << 62
+    
+    def __init__(self, config):
+        self.gap = pd.Timedelta(minutes=float(get_config_value(config, 'analytics.session_inactivity_minutes', 30)))
+        self._lock = threading.Lock()
+        self._services = {}  # service -> bit in service_mask
+        self.sessions = pd.DataFrame(columns=list(self.COLUMNS)).astype(self.COLUMNS)
+    
+    def update(self, frame):
+        """Sessionize a batch of parsed rows and merge it into the sessions table"""
+        rows = frame.loc[frame['timestamp'].notna(), ['user', 'ip', 'timestamp', 'service', 'error']]
+        if len(rows) == 0:
+            return
+        rows = rows.sort_values(['user', 'ip', 'timestamp'], kind='stable')
+        same_key = (rows['user'].eq(rows['user'].shift()) & rows['ip'].eq(rows['ip'].shift())).to_numpy()
+        within_gap = (rows['timestamp'].diff() <= self.gap).to_numpy()
+        session = np.cumsum(~(same_key & within_gap))
+        
+        with self._lock:
+            for service in rows['service'].unique():
+                if service not in self._services:
+                    self._services[service] = min(1 << len(self._services), self.OTHER_SERVICES_BIT)
+            bits = rows['service'].map(self._services).astype(np.int64)
+            # Summing each service bit once per session gives the OR of the bits
+            mask = pd.DataFrame({'session': session, 'bit': bits.to_numpy()}).drop_duplicates().groupby('session')['bit'].sum()
+            grouped = rows.groupby(session)
+            batch = pd.DataFrame({
+                'user': grouped['user'].first(),
+                'ip': grouped['ip'].first(),
+                'start': grouped['timestamp'].min(),
+                'end': grouped['timestamp'].max(),
+                'actions': grouped.size(),
+                'errors': grouped['error'].sum().astype(np.int64),
+                'service_mask': mask,
+            }).reset_index(drop=True)
+            self.sessions = self._merge(self.sessions, batch)
+    
+    def _merge(self, sessions, batch):
+        """Fold each key's first batch session into its latest held session when within the gap"""
+        if len(sessions) == 0:
+            return batch
+        latest = sessions.reset_index().sort_values('end').drop_duplicates(['user', 'ip'], keep='last')
+        first = batch.reset_index().sort_values('start').drop_duplicates(['user', 'ip'], keep='first')
+        pairs = first.merge(latest, on=['user', 'ip'], suffixes=('', '_held'))
+        pairs = pairs[pairs['start'] - pairs['end_held'] <= self.gap]
+        if len(pairs):
+            held = pairs['index_held'].to_numpy()
+            sessions = sessions.copy()
+            sessions.loc[held, 'start'] = np.minimum(pairs['start'].to_numpy(), pairs['start_held'].to_numpy())
+            sessions.loc[held, 'end'] = np.maximum(pairs['end'].to_numpy(), pairs['end_held'].to_numpy())
+            sessions.loc[held, 'actions'] = (pairs['actions'] + pairs['actions_held']).to_numpy()
+            sessions.loc[held, 'errors'] = (pairs['errors'] + pairs['errors_held']).to_numpy()
+            sessions.loc[held, 'service_mask'] = (pairs['service_mask'] | pairs['service_mask_held']).to_numpy()
+            batch = batch.drop(index=pairs['index'].to_numpy())
+        return pd.concat([sessions, batch], ignore_index=True)
+    
+    def table(self):
+        """Sessions with duration and the services touched, one row per session"""
+        with self._lock:
+            sessions = self.sessions.copy()
+            names = {bit: service for service, bit in self._services.items() if bit != self.OTHER_SERVICES_BIT}
+        names[self.OTHER_SERVICES_BIT] = 'other'
+        sessions['duration_minutes'] = (sessions['end'] - sessions['start']).dt.total_seconds() / 60
+        labels = {mask: ', '.join(sorted(service for bit, service in names.items() if mask & bit))
+                  for mask in sessions['service_mask'].unique()}
+        sessions['services'] = sessions['service_mask'].map(labels)
+        sessions['service_count'] = sessions['services'].str.count(',') + 1
+        return sessions.drop(columns='service_mask')
+    
+    def get_state(self):
+        """Sessions table and service bits as plain data for snapshots (caller holds _lock)"""
+        columns = {column: self.sessions[column].tolist() if dtype == 'str' else self.sessions[column].to_numpy()
+                   for column, dtype in self.COLUMNS.items()}
+        return {'gap': self.gap, 'services': dict(self._services), 'sessions': columns}
+    
+    def set_state(self, state):
+        """Replace the sessions with get_state() data (caller holds _lock)"""
+        self.gap, self._services = state['gap'], state['services']
+        # Time columns keep the resolution they were saved with
+        self.sessions = pd.DataFrame(state['sessions'], columns=list(self.COLUMNS)).astype(
+            {column: dtype for column, dtype in self.COLUMNS.items() if dtype == 'str'})
+
+class AnomalyDetector:
+    """Online spike detection on per-service volume, error rate and response time per time bucket.
+    
+    Each service x metric series keeps O(1) state: an EWMA level and variance plus one EWMA slot per
+    hour of the week. A bucket is scored when a later bucket arrives (or on flush) against its
+    hour-of-week baseline once that slot is warm, falling back to the level baseline before then.
+    Time-to-detect is the event-time gap between a bucket's start and the event that closed it.
+    Rows for a bucket that is already scored arrive too late to change it and are only counted in
+    late_rows, so out-of-order batches never re-score a bucket or update its baselines twice.
+    """
+    
+    METRICS = ['volume', 'error_rate', 'response_time']
+    MIN_STD = {'volume': 1.0, 'error_rate': 0.01, 'response_time': 1.0}
+    SLOTS = 7 * 24
+    
+    def __init__(self, config):
+        self.enabled = bool(get_config_value(config, 'log_processing.enable_anomaly_detection', True))
+        self.alpha = float(get_config_value(config, 'log_processing.anomaly_ewma_alpha', 0.2))
+        self.threshold = float(get_config_value(config, 'log_processing.anomaly_z_threshold', 3.5))
+        self.warmup = int(get_config_value(config, 'log_processing.anomaly_warmup_buckets', 6))
+        self.bucket = pd.Timedelta(minutes=int(get_config_value(config, 'log_processing.anomaly_bucket_minutes', 60)))
+        self._lock = threading.Lock()
+        self._series = {}   # (service, metric) -> baseline state
+        self._open = None   # aggregates of the newest, still filling bucket
+        self._closed = None  # start of the newest scored bucket
+        self.late_rows = 0
+        self.anomalies = []
+    
+    def update(self, frame):
+        """Aggregate a batch into buckets per service and score every bucket it closes"""
+        if not self.enabled:
+            return
+        rows = frame[frame['timestamp'].notna()]
+        if len(rows) == 0:
+            return
+        bucket_start = rows['timestamp'].dt.floor(self.bucket)
+        grouped = rows.groupby([bucket_start, 'service'])
+        buckets = pd.DataFrame({
+            'volume': grouped.size(),
+            'errors': grouped['error'].sum(),
+            'rt_sum': grouped['response_time'].sum(),
+            'rt_count': grouped['response_time'].count(),
+        })
+        first_event = rows['timestamp'].groupby(bucket_start).min()
+        with self._lock:
+            if self._closed is not None:
+                late = buckets.index.get_level_values(0) <= self._closed
+                self.late_rows += int(buckets.loc[late, 'volume'].sum())
+                buckets = buckets[~late]
+                if len(buckets) == 0:
+                    return
+            if self._open is not None:
+                buckets = buckets.add(self._open, fill_value=0)
+            times = buckets.index.get_level_values(0).unique().sort_values()
+            for closed, closing in zip(times[:-1], times[1:]):
+                self._score(closed, buckets.loc[closed], first_event.get(closing, closing))
+                self._closed = closed
+            self._open = buckets.loc[[times[-1]]]
+    
+    def flush(self):
+        """Score the still-open bucket (end of a replay or a file load)"""
+        with self._lock:
+            if self._open is not None:
+                bucket = self._open.index.get_level_values(0)[0]
+                self._score(bucket, self._open.loc[bucket], bucket + self.bucket)
+                self._closed = bucket
+                self._open = None
+    
+    def _score(self, bucket, services, detected_at):
+        slot = bucket.dayofweek * 24 + bucket.hour
+        for service, row in services.iterrows():
+            values = {
+                'volume': row['volume'],
+                'error_rate': row['errors'] / row['volume'] if row['volume'] else 0.0,
+                'response_time': row['rt_sum'] / row['rt_count'] if row['rt_count'] else None,
+            }
+            for metric, value in values.items():
+                if value is None:
+                    continue
+                state = self._series.setdefault((service, metric), {
+                    'level': 0.0, 'level_var': 0.0, 'level_n': 0,
+                    'slot': np.zeros(self.SLOTS), 'slot_var': np.zeros(self.SLOTS),
+                    'slot_n': np.zeros(self.SLOTS, dtype=np.int32)})
+                if state['slot_n'][slot] >= self.warmup:
+                    mean, var = state['slot'][slot], state['slot_var'][slot]
+                elif state['level_n'] >= self.warmup:
+                    mean, var = state['level'], state['level_var']
+                else:
+                    mean = None
+                if mean is not None:
+                    std = max(np.sqrt(var), self.MIN_STD[metric], 0.05 * abs(mean))
+                    z = (value - mean) / std
+                    if z >= self.threshold:
+                        self.anomalies.append({
+                            'bucket': bucket, 'service': service, 'metric': metric,
+                            'value': float(value), 'baseline': float(mean), 'z_score': float(z),
+                            'detected_at': detected_at, 'time_to_detect': detected_at - bucket})
+                state['level'], state['level_var'] = self._ewma(state['level'], state['level_var'], state['level_n'], value)
+                state['level_n'] += 1
+                state['slot'][slot], state['slot_var'][slot] = self._ewma(
+                    state['slot'][slot], state['slot_var'][slot], state['slot_n'][slot], value)
+                state['slot_n'][slot] += 1
+    
+    def _ewma(self, mean, var, n, value):
+        """EWMA mean/variance step; the first observation seeds the mean"""
+        if n == 0:
+            return value, 0.0
+        delta = value - mean
+        return mean + self.alpha * delta, (1 - self.alpha) * (var + self.alpha * delta * delta)
+    
+    def table(self):
+        """Flagged anomalies, newest first"""
+        with self._lock:
+            anomalies = pd.DataFrame(self.anomalies, columns=[
+                'bucket', 'service', 'metric', 'value', 'baseline', 'z_score', 'detected_at', 'time_to_detect'])
+        return anomalies.sort_values('bucket', ascending=False, kind='stable').reset_index(drop=True)
+    
+    def get_state(self):
+        """Settings, baselines, the open bucket and flagged anomalies as plain data (caller holds _lock)"""
+        keys = list(self._series)
+        series = [self._series[key] for key in keys]
+        state = {
+            'enabled': self.enabled, 'alpha': self.alpha, 'threshold': self.threshold, 'warmup': self.warmup,
+            'bucket': self.bucket, 'series': keys, 'open': None, 'closed': self._closed, 'late_rows': self.late_rows,
+            'anomalies': [dict(anomaly) for anomaly in self.anomalies],
+        }
+        # One row per service x metric series; stacking also copies the arrays scoring updates in place
+        for field, dtype in [('level', np.float64), ('level_var', np.float64), ('level_n', np.int64)]:
+            state[field] = np.array([values[field] for values in series], dtype=dtype)
+        for field, dtype in [('slot', np.float64), ('slot_var', np.float64), ('slot_n', np.int32)]:
+            state[field] = np.array([values[field] for values in series], dtype=dtype).reshape(len(series), self.SLOTS)
+        if self._open is not None:
+            state['open'] = {'bucket': self._open.index.get_level_values(0).to_numpy(),
+                             'service': self._open.index.get_level_values(1).tolist(),
+                             **{column: self._open[column].to_numpy() for column in self._open.columns}}
+        return state
+    
+    def set_state(self, state):
+        """Replace the detector state with get_state() data (caller holds _lock)"""
+        self.enabled, self.alpha, self.threshold = state['enabled'], state['alpha'], state['threshold']
+        self.warmup, self.bucket = state['warmup'], state['bucket']
+        self._series = {
+            tuple(key): {'level': float(state['level'][row]), 'level_var': float(state['level_var'][row]),
+                         'level_n': int(state['level_n'][row]), 'slot': state['slot'][row],
+                         'slot_var': state['slot_var'][row], 'slot_n': state['slot_n'][row]}
+            for row, key in enumerate(state['series'])}
+        self._open = None
+        if state['open'] is not None:
+            open_bucket = dict(state['open'])
+            index = pd.MultiIndex.from_arrays([pd.DatetimeIndex(open_bucket.pop('bucket')), open_bucket.pop('service')],
+                                              names=['timestamp', 'service'])
+            self._open = pd.DataFrame(open_bucket, index=index)
+        self._closed, self.late_rows = state['closed'], state['late_rows']
+        self.anomalies = state['anomalies']
+
+class KeywordClassifier:
+    """Ordered rules deciding the success and error flags of parsed rows.
+    
+    log_processing.classification.rules lists, per flag, rules matching level and action (exact
+    values) and message (keywords found in the lowercased message); a row takes the value of the
+    first rule it matches, or False when none does. service_overrides rules for a service are
+    checked ahead of the global ones. A rule's lowercased keywords compile into one combined regex
+    of plain literals, so each rule costs a single vectorized pass over the lowercased messages (RE2
+    for Arrow-backed strings) however many keywords it lists.
+    """
+    
+    FLAGS = ['success', 'error']
+    DEFAULT_RULES = {
+        'success': [{'message': ['succeeded', 'success']}],
+        'error': [{'level': ['ERROR']}, {'message': ['error', 'failed', 'quota exceeded']}],
+    }
+    
+    def __init__(self, config):
+        settings = get_config_value(config, 'log_processing.classification', {}) or {}
+        rules = settings.get('rules') or {}
+        overrides = settings.get('service_overrides') or {}
+        self.rules = {}
+        for flag in self.FLAGS:
+            compiled = [self._compile(rule, [service]) for service, service_rules in overrides.items()
+                        for rule in (service_rules or {}).get(flag, [])]
+            compiled += [self._compile(rule) for rule in rules.get(flag, self.DEFAULT_RULES[flag])]
+            self.rules[flag] = compiled
+    
+    @staticmethod
+    def _compile(rule, services=None):
+        keywords = sorted((str(keyword).lower() for keyword in rule.get('message', [])), key=len, reverse=True)
+        services = services or rule.get('services')
+        return {
+            'services': set(services) if services else None,
+            'level': set(rule['level']) if rule.get('level') else None,
+            'action': set(rule['action']) if rule.get('action') else None,
+            'pattern': re.compile('|'.join(map(re.escape, keywords))) if keywords else None,
+            'value': bool(rule.get('value', True)),
+        }
+    
+    def classify(self, rows):
+        """Flag name -> boolean Series for rows with level, action, service and message columns"""
+        flags = {}
+        lowered = None
+        for flag, rules in self.rules.items():
+            value = np.zeros(len(rows), dtype=bool)
+            decided = np.zeros(len(rows), dtype=bool)
+            for rule in rules:
+                matched = ~decided
+                for field in ('services', 'level', 'action'):
+                    if rule[field] is not None:
+                        column = 'service' if field == 'services' else field
+                        matched &= rows[column].isin(rule[field]).to_numpy(dtype=bool)
+                if rule['pattern'] is not None:
+                    if lowered is None:
+                        lowered = rows['message'].str.lower()
+                    # Only scan the messages no earlier rule decided when they are a minority
+                    candidates = np.flatnonzero(matched)
+                    messages = lowered.iloc[candidates] if len(candidates) < len(rows) // 2 else lowered
+                    hits = messages.str.contains(rule['pattern'].pattern, regex=True, na=False)
+                    if len(messages) < len(rows):
+                        matched[candidates] = hits.to_numpy(dtype=bool)
+                    else:
+                        matched &= hits.to_numpy(dtype=bool)
+                value[matched] = rule['value']
+                decided |= matched
+            flags[flag] = pd.Series(value, index=rows.index)
+        return flags
+
+class TemplateMiner:
+    """Incremental Drain-style template miner mapping each message to a stable integer template id.
+    
+    Messages are routed through a fixed-depth prefix tree (token count, then the first tokens, with
+    tokens containing digits treated as wildcards) to a short list of templates; the most similar one
+    absorbs the message, turning differing positions into <*>, or a new template is created. Recently
+    seen messages are kept in a bounded LRU cache so repeats skip the tree walk. Once
+    log_processing.template_max_templates exist, messages that match none of them share one
+    overflow template instead, since ids already assigned to rows must stay valid.
+    """
+    
+    WILDCARD = '<*>'
+    OVERFLOW = '<other>'
+    
+    def __init__(self, config):
+        self.depth = max(3, int(get_config_value(config, 'log_processing.template_tree_depth', 4)))
+        self.similarity = float(get_config_value(config, 'log_processing.template_similarity', 0.5))
+        self.max_children = int(get_config_value(config, 'log_processing.template_max_children', 100))
+        self.cache_size = int(get_config_value(config, 'log_processing.template_cache_size', 50000))
+        self.max_templates = max(2, int(get_config_value(config, 'log_processing.template_max_templates', 20000)))
+        self._lock = threading.Lock()
+        self._root = {}              # token count -> prefix tokens -> {None: [template ids]}
+        self._templates = []         # template id -> token list
+        self._overflow_id = None     # id of the shared template once max_templates is reached
+        self._cache = OrderedDict()  # message -> template id, least recently used first
+    
+    def assign(self, messages):
+        """Template id for every message of a Series, as an int32 Series on the same index"""
+        codes, uniques = pd.factorize(messages.fillna(''))
+        with self._lock:
+            hits = sum(message in self._cache for message in uniques)
+            ids = np.fromiter((self._match(message) for message in uniques), dtype=np.int32, count=len(uniques))
+        metrics = get_metrics()
+        metrics.inc('skylus_cache_requests_total', hits, cache='template', result='hit')
+        metrics.inc('skylus_cache_requests_total', len(uniques) - hits, cache='template', result='miss')
+        return pd.Series(ids[codes], index=messages.index, dtype=np.int32)
+    
+    def _match(self, message):
+        template_id = self._cache.get(message)
+        if template_id is not None:
+            self._cache.move_to_end(message)
+            return template_id
+        
+        tokens = [self.WILDCARD if any(c.isdigit() for c in token) else token for token in message.split()]
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth - 2]:
+            if token not in node and len(node) >= self.max_children:
+                token = self.WILDCARD
+            node = node.setdefault(token, {})
+        candidates = node.setdefault(None, [])
+        
+        best_id, best_similarity = None, -1.0
+        for candidate in candidates:
+            template = self._templates[candidate]
+            similarity = sum(a == b for a, b in zip(template, tokens)) / len(tokens) if tokens else 1.0
+            if similarity > best_similarity:
+                best_id, best_similarity = candidate, similarity
+        if best_id is not None and best_similarity >= self.similarity:
+            template = self._templates[best_id]
+            self._templates[best_id] = [a if a == b else self.WILDCARD for a, b in zip(template, tokens)]
+            template_id = best_id
+        elif len(self._templates) + 1 >= self.max_templates:
+            if self._overflow_id is None:
+                self._overflow_id = len(self._templates)
+                self._templates.append([self.OVERFLOW])
+            template_id = self._overflow_id
+        else:
+            template_id = len(self._templates)
+            self._templates.append(tokens)
+            candidates.append(template_id)
+        
+        self._cache[message] = template_id
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return template_id
+    
+    def template(self, template_id):
+        """Template text for an id"""
+        with self._lock:
+            return ' '.join(self._templates[template_id])
+    
+    def templates(self):
+        """All templates as a Series of text indexed by template id"""
+        with self._lock:
+            return pd.Series([' '.join(tokens) for tokens in self._templates], dtype=str)
+    
+    def get_state(self):
+        """Settings, prefix tree, templates and message cache as plain data (caller holds _lock)"""
+        return {
+            'depth': self.depth, 'similarity': self.similarity, 'max_children': self.max_children,
+            'cache_size': self.cache_size, 'max_templates': self.max_templates, 'root': self._root,
+            'templates': self._templates, 'overflow_id': self._overflow_id, 'cache': dict(self._cache),
+        }
+    
+    def set_state(self, state):
+        """Replace the miner state with get_state() data (caller holds _lock)"""
+        self.depth, self.similarity, self.max_children = state['depth'], state['similarity'], state['max_children']
+        self.cache_size, self.max_templates = state['cache_size'], state['max_templates']
+        self._root, self._templates, self._overflow_id = state['root'], state['templates'], state['overflow_id']
+        self._cache = OrderedDict(state['cache'])
+
+class ResponseTimeSketches:
+    """Mergeable DDSketch response-time histograms per service x action, by hour and by day.
+    
+    A value in ms lands in log-spaced bin ceil(log_gamma(ms)), so every quantile is within
+    performance.latency_sketch_accuracy of the true value, and sketches merge by adding bin counts.
+    Cells are sparse (occupied bins and their counts), and hour cells older than
+    analytics.raw_logs_retention_days before the newest hour are dropped, since day cells already cover
+    them; range edges before that cutoff round out to whole days. Day cells are also kept as per-series
+    prefix sums over the occupied bin span, so the whole-day part of any range costs two lookups and
+    partial days at either end add at most 48 hour cells, however long the range is.
+    """
+    
+    QUANTILES = [0.5, 0.95, 0.99]
+    MAX_MS = 1e7  # slower values share the last bin
+    
+    def __init__(self, config):
+        accuracy = float(get_config_value(config, 'performance.latency_sketch_accuracy', 0.01))
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.bins = int(np.ceil(np.log(self.MAX_MS) / np.log(self.gamma))) + 1
+        self.bin_values = 2 * self.gamma ** np.arange(self.bins) / (self.gamma + 1)
+        self.sla_ms = float(get_config_value(config, 'monitoring.thresholds.response_time_ms', 5000))
+        self.hour_retention = pd.Timedelta(days=float(get_config_value(config, 'analytics.raw_logs_retention_days', 90)))
+        self._lock = threading.Lock()
+        self._hours = {}   # (service, action) -> {hour: (bins, counts)}
+        self._days = {}    # (service, action) -> {day: (bins, counts)}
+        self._prefix = {}  # (series) -> (sorted days, first bin, cumulative day counts), rebuilt lazily
+        self._newest_hour = None
+        self._hours_from = None  # hour cells before this day have been dropped
+    
+    def bin_index(self, values):
+        """Sketch bin of each response time in ms (values below 1 ms share the first bin)"""
+        bins = np.ceil(np.log(np.maximum(values, 1.0)) / np.log(self.gamma))
+        return np.minimum(bins, self.bins - 1).astype(np.int32)
+    
+    def update(self, frame):
+        """Add the response times of a batch of parsed rows to the hour and day cells"""
+        rows = frame[frame['response_time'].notna() & frame['timestamp'].notna()]
+        if len(rows) == 0:
+            return
+        cells = pd.DataFrame({
+            'hour': rows['timestamp'].dt.floor('h'),
+            'service': rows['service'],
+            'action': rows['action'],
+            'bin': self.bin_index(rows['response_time'].to_numpy(dtype=np.float64)),
+        }).value_counts()
+        with self._lock:
+            for (hour, service, action), cell in cells.groupby(level=[0, 1, 2]):
+                series = (service, action)
+                bins = cell.index.get_level_values('bin').to_numpy(dtype=np.int16)
+                counts = cell.to_numpy(dtype=np.int64)
+                if self._hours_from is None or hour >= self._hours_from:
+                    self._add(self._hours.setdefault(series, {}), hour, bins, counts)
+                self._add(self._days.setdefault(series, {}), hour.floor('D'), bins, counts)
+                self._prefix.pop(series, None)
+            self._drop_old_hours(cells.index.get_level_values('hour').max())
+    
+    @staticmethod
+    def _add(series_cells, bucket, bins, counts):
+        if bucket in series_cells:
+            held_bins, held_counts = series_cells[bucket]
+            bins, inverse = np.unique(np.concatenate([held_bins, bins]), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate([held_counts, counts])).astype(np.int64)
+        series_cells[bucket] = (bins, counts)
+    
+    def _drop_old_hours(self, newest_hour):
+        if self._newest_hour is None or newest_hour > self._newest_hour:
+            self._newest_hour = newest_hour
+        cutoff = (self._newest_hour - self.hour_retention).floor('D')
+        if self._hours_from is not None and cutoff <= self._hours_from:
+            return
+        self._hours_from = cutoff
+        for series_cells in self._hours.values():
+            for hour in [hour for hour in series_cells if hour < cutoff]:
+                del series_cells[hour]
+    
+    def _dense(self, cells):
+        counts = np.zeros(self.bins, dtype=np.int64)
+        for bins, cell_counts in cells:
+            counts[bins] += cell_counts
+        return counts
+    
+    def _prefix_sums(self, series):
+        if series not in self._prefix:
+            day_cells = self._days[series]
+            days = sorted(day_cells)
+            first = min(int(bins.min()) for bins, _ in day_cells.values())
+            last = max(int(bins.max()) for bins, _ in day_cells.values())
+            prefix = np.zeros((len(days) + 1, last - first + 1), dtype=np.int64)
+            for row, day in enumerate(days, start=1):
+                bins, counts = day_cells[day]
+                prefix[row, bins - first] = counts
+            np.cumsum(prefix, axis=0, out=prefix)
+            self._prefix[series] = (pd.DatetimeIndex(days), first, prefix)
+        return self._prefix[series]
+    
+    def _hour_range(self, series, start, end):
+        hours = self._hours.get(series, {})
+        return self._dense(hours[hour] for hour in pd.date_range(start, end - pd.Timedelta(hours=1), freq='h')
+                           if hour in hours)
+    
+    def _range(self, series, start, end):
+        days, first, prefix = self._prefix_sums(series)
+        start_hour = pd.Timestamp(start).floor('h') if start is not None else None
+        end_hour = pd.Timestamp(end).floor('h') + pd.Timedelta(hours=1) if end is not None else None
+        if self._hours_from is not None:
+            if start_hour is not None and start_hour < self._hours_from:
+                start_hour = start_hour.floor('D')
+            if end_hour is not None and end_hour < self._hours_from:
+                end_hour = end_hour.ceil('D')
+        first_day = start_hour.ceil('D') if start_hour is not None else None
+        last_day = end_hour.floor('D') if end_hour is not None else None
+        if first_day is not None and last_day is not None and last_day <= first_day:
+            return self._hour_range(series, start_hour, end_hour)
+        lo = days.searchsorted(first_day) if first_day is not None else 0
+        hi = days.searchsorted(last_day) if last_day is not None else len(days)
+        counts = np.zeros(self.bins, dtype=np.int64)
+        counts[first:first + prefix.shape[1]] = prefix[hi] - prefix[lo]
+        if start_hour is not None:
+            counts += self._hour_range(series, start_hour, first_day)
+        if end_hour is not None:
+            counts += self._hour_range(series, last_day, end_hour)
+        return counts
+    
+    def sketch(self, start=None, end=None, services=None, actions=None):
+        """Merged bin counts for the given services/actions between two timestamps"""
+        counts = np.zeros(self.bins, dtype=np.int64)
+        with self._lock:
+            for series in self._days:
+                if (services and series[0] not in services) or (actions and series[1] not in actions):
+                    continue
+                counts += self._range(series, start, end)
+        return counts
+    
+    def quantiles(self, counts, quantiles=QUANTILES):
+        """Quantile estimates in ms from merged bin counts (NaN when empty)"""
+        total = counts.sum()
+        if total == 0:
+            return {q: np.nan for q in quantiles}
+        ranks = np.maximum(1, np.ceil(np.asarray(quantiles) * total))
+        return dict(zip(quantiles, self.bin_values[np.searchsorted(np.cumsum(counts), ranks)]))
+    
+    def sla_breach_rate(self, counts):
+        """Share of requests slower than monitoring.thresholds.response_time_ms"""
+        total = counts.sum()
+        return counts[self.bin_values > self.sla_ms].sum() / total if total else 0.0
+    
+    def summary(self, by='service', start=None, end=None, services=None):
+        """p50/p95/p99, request count and SLA breach rate per service or per action"""
+        with self._lock:
+            keys = sorted({series[0] if by == 'service' else series[1] for series in self._days
+                           if not services or series[0] in services})
+        rows = []
+        for key in keys:
+            counts = self.sketch(start, end, services=[key] if by == 'service' else services,
+                                 actions=[key] if by == 'action' else None)
+            quantiles = self.quantiles(counts)
+            rows.append({by: key, 'requests': int(counts.sum()), 'p50_ms': quantiles[0.5], 'p95_ms': quantiles[0.95],
+                         'p99_ms': quantiles[0.99], 'sla_breach_pct': self.sla_breach_rate(counts) * 100})
+        return pd.DataFrame(rows, columns=[by, 'requests', 'p50_ms', 'p95_ms', 'p99_ms', 'sla_breach_pct'])
+    
+    def timeline(self, resolution='day', services=None, actions=None):
+        """p50/p95/p99 per hour or day bucket"""
+        buckets = defaultdict(lambda: np.zeros(self.bins, dtype=np.int64))
+        with self._lock:
+            cells_by_series = self._days if resolution == 'day' else self._hours
+            for series, cells in cells_by_series.items():
+                if (services and series[0] not in services) or (actions and series[1] not in actions):
+                    continue
+                for bucket, (bins, counts) in cells.items():
+                    buckets[bucket][bins] += counts
+        rows = []
+        for bucket in sorted(buckets):
+            quantiles = self.quantiles(buckets[bucket])
+            rows.append({'bucket': bucket, 'p50_ms': quantiles[0.5], 'p95_ms': quantiles[0.95], 'p99_ms': quantiles[0.99]})
+        return pd.DataFrame(rows, columns=['bucket', 'p50_ms', 'p95_ms', 'p99_ms'])
+    
+    def get_state(self):
+        """Bins, hour and day cells as plain data for snapshots (caller holds _lock)"""
+        return {
+            'gamma': self.gamma, 'bins': self.bins, 'bin_values': self.bin_values, 'sla_ms': self.sla_ms,
+            'hour_retention': self.hour_retention, 'newest_hour': self._newest_hour, 'hours_from': self._hours_from,
+            'hours': self._cells_state(self._hours), 'days': self._cells_state(self._days),
+        }
+    
+    def set_state(self, state):
+        """Replace the sketches with get_state() data (caller holds _lock)"""
+        self.gamma, self.bins, self.bin_values = state['gamma'], state['bins'], state['bin_values']
+        self.sla_ms, self.hour_retention = state['sla_ms'], state['hour_retention']
+        self._newest_hour, self._hours_from = state['newest_hour'], state['hours_from']
+        self._hours, self._days = self._cells_from_state(state['hours']), self._cells_from_state(state['days'])
+        self._prefix = {}
+    
+    @staticmethod
+    def _cells_state(cells_by_series):
+        # Sparse cells flattened into a few arrays, so a long history is not thousands of tiny ones
+        series = list(cells_by_series)
+        cells = [(index, bucket, bins, counts) for index, key in enumerate(series)
+                 for bucket, (bins, counts) in cells_by_series[key].items()]
+        return {
+            'series': series,
+            'series_index': np.array([cell[0] for cell in cells], dtype=np.int64),
+            'buckets': np.array([cell[1].to_datetime64() for cell in cells] or [], dtype=None if cells else 'datetime64[ns]'),
+            'lengths': np.array([len(cell[2]) for cell in cells], dtype=np.int64),
+            'bins': np.concatenate([cell[2] for cell in cells]) if cells else np.array([], dtype=np.int16),
+            'counts': np.concatenate([cell[3] for cell in cells]) if cells else np.array([], dtype=np.int64),
+        }
+    
+    @staticmethod
+    def _cells_from_state(state):
+        series = [tuple(key) for key in state['series']]
+        cells_by_series = {key: {} for key in series}
+        ends = np.cumsum(state['lengths'])
+        for index, bucket, start, end in zip(state['series_index'].tolist(), pd.DatetimeIndex(state['buckets']),
+                                             (ends - state['lengths']).tolist(), ends.tolist()):
+            cells_by_series[series[index]][bucket] = (state['bins'][start:end], state['counts'][start:end])
+        return cells_by_series
+
+class BruteForceDetector:
+    """Failed-login burst detection per IP and per user over a sliding time window.
+    
+    Every key keeps the times of its last security.brute_force_max_failures failure timestamps;
+    a burst is flagged when the buffer spans at most security.brute_force_window_seconds, and later
+    failures within the window extend the same incident. Keys live in LRU maps capped at
+    security.brute_force_max_tracked_keys, so idle IPs and users are evicted first, and only the
+    latest security.brute_force_max_incidents incidents are kept (incident_count has them all).
+    """
+    
+    KEYS = ['ip', 'user']
+    _NO_FAILURES = np.array([], dtype=np.int64)
+    
+    def __init__(self, config):
+        self.max_failures = max(2, int(get_config_value(config, 'security.brute_force_max_failures', 5)))
+        self.window = pd.Timedelta(seconds=float(get_config_value(config, 'security.brute_force_window_seconds', 300)))
+        self.max_keys = int(get_config_value(config, 'security.brute_force_max_tracked_keys', 100000))
+        self._lock = threading.Lock()
+        self._tracked = {kind: OrderedDict() for kind in self.KEYS}  # key -> [last failure times, open incident]
+        self.failed_logins = 0
+        self.evicted_keys = 0
+        self.incidents = deque(maxlen=int(get_config_value(config, 'security.brute_force_max_incidents', 10000)))
+        self.incident_count = 0
+    
+    def update(self, frame):
+        """Feed the failed logins of a batch through the per-IP and per-user windows"""
+        failures = frame[frame['error'] & frame['action'].str.contains('LOGIN', na=False) & frame['timestamp'].notna()]
+        failures = failures.sort_values('timestamp', kind='stable')
+        with self._lock:
+            self.failed_logins += len(failures)
+            for kind in self.KEYS:
+                self._observe(kind, failures[kind].to_numpy(dtype=object), failures['timestamp'].to_numpy())
+    
+    def _observe(self, kind, keys, timestamps):
+        """Run a batch of failures (in time order) through the windows of one key kind at once.
+        
+        Each key's buffered failures are put in front of its new ones. A failure is in an incident
+        if it completes a burst, or follows a failure in one within the window, so incident
+        membership is a running max of the burst flags between gaps longer than the window.
+        """
+        if len(keys) == 0:
+            return
+        tracked = self._tracked[kind]
+        window = self.window.value
+        codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+        states = [tracked.get(key) for key in uniques]
+        # Buffers hold each key's last max_failures failure times as int64 nanoseconds
+        buffers = [self._NO_FAILURES if state is None else state[0] for state in states]
+        lengths = np.fromiter(map(len, buffers), dtype=np.int64, count=len(buffers))
+        all_codes = np.concatenate([np.repeat(np.arange(len(uniques)), lengths), codes])
+        all_times = np.concatenate(buffers + [timestamps.astype('datetime64[ns]').view(np.int64)])
+        is_new = np.r_[np.zeros(lengths.sum(), dtype=bool), np.ones(len(codes), dtype=bool)]
+        # Per key: buffered failures in arrival order, then the batch in time order
+        order = np.lexsort((is_new, all_codes))
+        code, times, is_new = all_codes[order], all_times[order], is_new[order]
+        key_starts = np.searchsorted(code, np.arange(len(uniques)))
+        key_ends = np.r_[key_starts[1:], len(code)]
+        
+        span_start = np.arange(len(code)) - (self.max_failures - 1)
+        burst = np.zeros(len(code), dtype=bool)
+        full = span_start >= np.repeat(key_starts, key_ends - key_starts)
+        burst[full] = times[full] - times[span_start[full]] <= window
+        burst &= is_new
+        # A key's open incident continues from its last buffered failure
+        burst[[key_starts[index] + lengths[index] - 1 for index, state in enumerate(states)
+               if state is not None and state[1] is not None]] = True
+        within = np.r_[False, (code[1:] == code[:-1]) & (times[1:] - times[:-1] <= window)]
+        in_incident = pd.Series(burst).groupby(np.cumsum(~within)).cummax().to_numpy()
+        starts = in_incident & ~(np.r_[False, in_incident[:-1]] & within)
+        incident_of = np.cumsum(starts) - 1
+        members = np.flatnonzero(in_incident)
+        is_last = np.ones(len(members), dtype=bool)
+        is_last[:-1] = incident_of[members][1:] != incident_of[members][:-1]
+        last_failures = times[members[is_last]].tolist()
+        new_members = np.bincount(incident_of[in_incident & is_new], minlength=len(last_failures)).tolist()
+        
+        incidents = []
+        for number, start in enumerate(np.flatnonzero(starts).tolist()):
+            if is_new[start]:
+                incident = {'kind': kind, 'key': uniques[code[start]],
+                            'first_failure': pd.Timestamp(int(times[span_start[start]])),
+                            'last_failure': pd.Timestamp(last_failures[number]),
+                            'failures': self.max_failures + new_members[number] - 1}
+                self.incidents.append(incident)
+                self.incident_count += 1
+            else:
+                incident = states[code[start]][1]
+                if new_members[number]:
+                    incident['failures'] += new_members[number]
+                    incident['last_failure'] = pd.Timestamp(last_failures[number])
+            incidents.append(incident)
+        
+        # Keys move to the recent end of the LRU map in order of their latest failure
+        open_incident = np.where(in_incident[key_ends - 1], incident_of[key_ends - 1], -1).tolist()
+        buffer_starts = np.maximum(key_starts, key_ends - self.max_failures).tolist()
+        key_ends = key_ends.tolist()
+        latest = pd.Series(timestamps).groupby(codes).max().to_numpy()
+        for index in np.argsort(latest, kind='stable').tolist():
+            key = uniques[index]
+            tracked.pop(key, None)
+            tracked[key] = [times[buffer_starts[index]:key_ends[index]].copy(),
+                            incidents[open_incident[index]] if open_incident[index] >= 0 else None]
+        while len(tracked) > self.max_keys:
+            tracked.popitem(last=False)
+            self.evicted_keys += 1
+    
+    def table(self):
+        """Flagged bursts, largest first"""
+        with self._lock:
+            incidents = pd.DataFrame([dict(incident) for incident in self.incidents],
+                                     columns=['kind', 'key', 'first_failure', 'last_failure', 'failures'])
+        incidents = incidents.astype({'first_failure': 'datetime64[us]', 'last_failure': 'datetime64[us]', 'failures': 'int64'})
+        incidents['duration_seconds'] = (incidents['last_failure'] - incidents['first_failure']).dt.total_seconds()
+        return incidents.sort_values('failures', ascending=False, kind='stable').reset_index(drop=True)
+    
+    def get_state(self):
+        """Settings, incidents and per-key failure buffers as plain data (caller holds _lock)"""
+        incidents = list(self.incidents)
+        positions = {id(incident): position for position, incident in enumerate(incidents)}
+        tracked = {}
+        for kind, keys in self._tracked.items():
+            buffers, open_incidents = [], []
+            for times, incident in keys.values():
+                buffers.append(times)
+                if incident is not None and id(incident) not in positions:
+                    # An open incident that fell out of the kept list still absorbs later failures
+                    positions[id(incident)] = len(incidents)
+                    incidents.append(incident)
+                open_incidents.append(-1 if incident is None else positions[id(incident)])
+            tracked[kind] = {
+                'keys': list(keys),
+                'lengths': np.array([len(times) for times in buffers], dtype=np.int64),
+                'times': np.concatenate(buffers) if buffers else self._NO_FAILURES,
+                'incidents': np.array(open_incidents, dtype=np.int64),
+            }
+        return {
+            'max_failures': self.max_failures, 'window': self.window, 'max_keys': self.max_keys,
+            'max_incidents': self.incidents.maxlen, 'failed_logins': self.failed_logins,
+            'evicted_keys': self.evicted_keys, 'incident_count': self.incident_count,
+            'kept_incidents': len(self.incidents), 'incidents': [dict(incident) for incident in incidents],
+            'tracked': tracked,
+        }
+    
+    def set_state(self, state):
+        """Replace the detector state with get_state() data (caller holds _lock)"""
+        self.max_failures, self.window, self.max_keys = state['max_failures'], state['window'], state['max_keys']
+        self.failed_logins, self.evicted_keys = state['failed_logins'], state['evicted_keys']
+        self.incident_count = state['incident_count']
+        incidents = state['incidents']
+        self.incidents = deque(incidents[:state['kept_incidents']], maxlen=state['max_incidents'])
+        self._tracked = {}
+        for kind, tracked in state['tracked'].items():
+            ends = np.cumsum(tracked['lengths'])
+            self._tracked[kind] = OrderedDict(
+                (key, [tracked['times'][start:end], incidents[incident] if incident >= 0 else None])
+                for key, start, end, incident in zip(tracked['keys'], (ends - tracked['lengths']).tolist(),
+                                                     ends.tolist(), tracked['incidents'].tolist()))
+
+class StratifiedSampler:
+    """Stratified Poisson samples of a load at several rates, kept up to date during ingestion.
+    
+    Rows are stratified by service, level and date. The i-th row of a stratum is kept at rate r with
+    probability max(r, min_rows / i), decided by a hash of its row label, so the first
+    analytics.approximate.min_rows_per_stratum rows of every stratum are always kept and rare
+    strata are answered exactly. Kept rows carry the Horvitz-Thompson weight 1 / probability, so
+    weighted sums are unbiased estimates of the full-data aggregates (see group_counts).
+    """
+    
+    STRATA = ['service', 'level', 'date']
+    
+    def __init__(self, config):
+        self.rates = sorted(float(rate) for rate in
+                            get_config_value(config, 'analytics.approximate.sample_rates', [0.01, 0.1]))
+        self.min_rows = max(1, int(get_config_value(config, 'analytics.approximate.min_rows_per_stratum', 30)))
+        self._lock = threading.Lock()
+        self._stratum_rows = {}  # stratum -> rows ingested so far
+        self._chunks = {rate: [] for rate in self.rates}  # rate -> [(labels, probabilities, hash draws)]
+    
+    def update(self, frame):
+        """Draw the rows of a batch into the sample of every rate"""
+        if len(frame) == 0:
+            return
+        labels = frame.index.to_numpy(dtype=np.int64)
+        draws = (pd.util.hash_array(labels) >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+        grouped = frame.groupby(self.STRATA, sort=False, dropna=False)
+        codes = grouped.ngroup().to_numpy()
+        sizes = grouped.size()
+        with self._lock:
+            offsets = np.array([self._stratum_rows.get(key, 0) for key in sizes.index], dtype=np.int64)
+            for key, size in zip(sizes.index, sizes.to_numpy()):
+                self._stratum_rows[key] = self._stratum_rows.get(key, 0) + int(size)
+            position = grouped.cumcount().to_numpy() + offsets[codes] + 1
+            for rate in self.rates:
+                probability = np.maximum(rate, np.minimum(1.0, self.min_rows / position))
+                kept = draws < probability
+                self._chunks[rate].append((labels[kept], probability[kept], draws[kept]))
+    
+    def _arrays(self, rate):
+        with self._lock:
+            return self._compacted(rate)
+    
+    def _compacted(self, rate):
+        chunks = self._chunks[rate]
+        if len(chunks) > 1:
+            chunks[:] = [tuple(np.concatenate(parts) for parts in zip(*chunks))]
+        return chunks[0] if chunks else (np.array([], dtype=np.int64), np.array([]), np.array([]))
+    
+    def sample(self, df, rate):
+        """Sampled rows of df at rate with their SAMPLE_WEIGHT column (rows no longer in df are skipped)"""
+        labels, probability, _ = self._arrays(rate)
+        positions = df.index.get_indexer(labels)
+        present = positions >= 0
+        rows = df.take(positions[present])
+        rows[SAMPLE_WEIGHT] = 1.0 / probability[present]
+        return rows
+    
+    def preview(self, df, count):
+        """Up to count rows of df drawn uniformly at random, the same ones on every call"""
+        labels, _, draws = self._arrays(self.rates[0])
+        labels = labels[np.argsort(draws, kind='stable')]
+        positions = df.index.get_indexer(labels)
+        return df.take(positions[positions >= 0][:count])
+    
+    def get_state(self):
+        """Settings, stratum sizes and sampled rows as plain data (caller holds _lock)"""
+        return {'rates': self.rates, 'min_rows': self.min_rows, 'stratum_rows': dict(self._stratum_rows),
+                'chunks': {rate: list(self._compacted(rate)) for rate in self.rates}}
+    
+    def set_state(self, state):
+        """Replace the samples with get_state() data (caller holds _lock)"""
+        self.rates, self.min_rows, self._stratum_rows = state['rates'], state['min_rows'], state['stratum_rows']
+        self._chunks = {rate: [tuple(arrays)] for rate, arrays in state['chunks'].items()}
+
+class SortedRuns:
+    """Sorted (key, row label) runs searched by binary search, merged size-tiered.
+    
+    Each batch adds a run; while the run before the newest is at most TIER times its size the two
+    are merged, so sizes at least double from newest to oldest. That keeps O(log n) runs and merges
+    every key O(log n) times, where merging everything into one run per batch would be quadratic.
+    """
+    
+    TIER = 2
+    
+    def __init__(self):
+        self.runs = []  # [(sorted keys, row labels)], oldest and largest first
+    
+    def add(self, keys, labels):
+        """Add a batch of keys and their row labels as a new sorted run"""
+        order = np.argsort(keys, kind='stable')
+        self.runs.append((keys[order], labels[order]))
+        while len(self.runs) > 1 and len(self.runs[-2][0]) <= self.TIER * len(self.runs[-1][0]):
+            self.runs[-2:] = [self._merge(self.runs[-2:])]
+    
+    def compact(self):
+        """Merge all runs into one"""
+        if len(self.runs) > 1:
+            self.runs = [self._merge(self.runs)]
+    
+    @staticmethod
+    def _merge(runs):
+        # The stable sort finds the presorted runs, so this is a linear merge
+        keys = np.concatenate([run[0] for run in runs])
+        labels = np.concatenate([run[1] for run in runs])
+        order = np.argsort(keys, kind='stable')
+        return keys[order], labels[order]
+    
+    def range(self, low, high):
+        """Row labels whose key lies in [low, high]"""
+        matches = [labels[keys.searchsorted(low, 'left'):keys.searchsorted(high, 'right')] for keys, labels in self.runs]
+        return np.concatenate(matches) if matches else np.array([], dtype=np.int64)
+    
+    def get_state(self):
+        """Runs as [keys, labels] array pairs for snapshots"""
+        return [[keys, labels] for keys, labels in self.runs]
+    
+    def set_state(self, runs):
+        """Replace the runs with get_state() data"""
+        self.runs = [(keys, labels) for keys, labels in runs]
+
+class LineDeduplicator:
+    """Exact set of the raw-line hashes a dataset holds, as sorted runs searched by binary search.
+    
+    Every batch adds one run of its new hashes, merged size-tiered like SortedRuns: while the run
+    before the newest is at most TIER times its size the two are merged, which NumPy's stable sort
+    does in a linear pass since both are already sorted.
+    """
+    
+    TIER = 2
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = []  # sorted uint64 arrays
+    
+    def first_seen(self, hashes):
+        """Mask of hashes seen neither earlier in the batch nor in earlier batches, which are then remembered"""
+        fresh = ~pd.Series(hashes).duplicated().to_numpy()
+        with self._lock:
+            for run in self._runs:
+                slots = np.minimum(run.searchsorted(hashes), len(run) - 1)
+                fresh &= run[slots] != hashes
+            if fresh.any():
+                self._runs.append(np.sort(hashes[fresh]))
+            while len(self._runs) > 1 and len(self._runs[-2]) <= self.TIER * len(self._runs[-1]):
+                self._runs[-2:] = [np.sort(np.concatenate(self._runs[-2:]), kind='stable')]
+        return fresh
+
+class RequestIdIndex:
+    """Hash index from request uuid and its session_id prefix to row labels.
+    
+    Each ingested batch adds a sorted run of 64-bit value hashes per field; a lookup binary-searches
+    every run and confirms hits against the actual column, so its cost grows with log(rows) rather
+    than rows.
+    """
+    
+    FIELDS = ['uuid', 'session_id']
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {field: SortedRuns() for field in self.FIELDS}
+    
+    @staticmethod
+    def _hash(values):
+        return pd.util.hash_pandas_object(values.fillna('').str.lower(), index=False).to_numpy(dtype=np.uint64)
+    
+    def add(self, frame):
+        """Index a batch of parsed rows"""
+        labels = frame.index.to_numpy(dtype=np.int64)
+        with self._lock:
+            for field in self.FIELDS:
+                self._runs[field].add(self._hash(frame[field]), labels)
+    
+    def lookup(self, field, value):
+        """Row labels whose field hashes like value (callers confirm against the column)"""
+        target = self._hash(pd.Series([value]))[0]
+        with self._lock:
+            return self._runs[field].range(target, target)
+    
+    def get_state(self):
+        """Runs per field as plain data for snapshots (caller holds _lock)"""
+        return {field: runs.get_state() for field, runs in self._runs.items()}
+    
+    def set_state(self, state):
+        """Replace the runs with get_state() data (caller holds _lock)"""
+        for field in self.FIELDS:
+            self._runs[field] = SortedRuns()
+            self._runs[field].set_state(state[field])
+
+class IpIndex:
+    """Sorted index of packed IPv4 addresses (ip_num) for CIDR lookups and subnet aggregation.
+    
+    A CIDR block is a contiguous uint32 range, so matching rows are found by bisecting sorted runs.
+    Rows whose address is not IPv4 (ip_num 0) are kept aside and matched with the ipaddress module.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = SortedRuns()
+        self._other = []  # row labels of IPv6 / unparsable addresses
+    
+    def add(self, frame):
+        """Index a batch of parsed rows"""
+        ip_num = frame['ip_num'].to_numpy(dtype=np.uint32)
+        labels = frame.index.to_numpy(dtype=np.int64)
+        with self._lock:
+            self._runs.add(ip_num[ip_num != 0], labels[ip_num != 0])
+            self._other.append(labels[ip_num == 0])
+    
+    def lookup(self, networks, df):
+        """Row labels whose IP falls in any of the given ip_network blocks"""
+        matches = []
+        with self._lock:
+            for network in networks:
+                if network.version == 4:
+                    matches.append(self._runs.range(np.uint32(int(network.network_address)),
+                                                    np.uint32(int(network.broadcast_address))))
+            other = np.concatenate(self._other) if self._other else np.array([], dtype=np.int64)
+        other = other[np.isin(other, df.index.to_numpy())]
+        if len(other):
+            matches.append(other[network_mask(df.loc[other], networks)])
+        return np.unique(np.concatenate(matches)) if matches else np.array([], dtype=np.int64)
+    
+    def subnet_counts(self, prefix):
+        """Events per IPv4 subnet of the given prefix length, from the sorted keys without re-sorting"""
+        with self._lock:
+            self._runs.compact()
+            keys = self._runs.runs[0][0] if self._runs.runs else np.array([], dtype=np.uint32)
+        if len(keys) == 0:
+            return pd.Series(dtype=np.int64)
+        subnets = keys & subnet_prefix_mask(prefix)
+        starts = np.flatnonzero(np.r_[True, subnets[1:] != subnets[:-1]])
+        counts = np.diff(np.r_[starts, len(subnets)])
+        return pd.Series(counts, index=uint32_to_ipv4(subnets[starts]) + f'/{prefix}')
+    
+    def get_state(self):
+        """IPv4 runs and the labels of other addresses as plain data (caller holds _lock)"""
+        other = np.concatenate(self._other) if self._other else np.array([], dtype=np.int64)
+        return {'runs': self._runs.get_state(), 'other': other}
+    
+    def set_state(self, state):
+        """Replace the index with get_state() data (caller holds _lock)"""
+        self._runs = SortedRuns()
+        self._runs.set_state(state['runs'])
+        self._other = [state['other']]
+
+class MessageSearchIndex:
+    """Embedded SQLite FTS5 full-text index over message, action and raw_line, keyed by row label"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        # Contentless: rows live in the DataFrame, the index only maps terms to row labels
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE log_search USING fts5(
+                message, action, raw_line, content='', tokenize="unicode61 tokenchars '_'"
+            )
+        """)
+    
+    def add(self, frame):
+        """Index a batch of parsed rows"""
+        rows = zip(frame.index.tolist(), frame['message'].tolist(),
+                   frame['action'].tolist(), frame['raw_line'].tolist())
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT INTO log_search (rowid, message, action, raw_line) VALUES (?, ?, ?, ?)', rows)
+    
+    def dump(self, path):
+        """Copy the index into a SQLite file"""
+        with self._lock:
+            copy_sqlite(self._conn, path)
+    
+    def load(self, path, background=False):
+        """Replace the index with one written by dump(); in the background, searches wait until it is in"""
+        if not background:
+            with self._lock:
+                copy_sqlite(path, self._conn)
+            return
+        self._lock.acquire()
+        
+        def copy():
+            try:
+                copy_sqlite(path, self._conn)
+            finally:
+                self._lock.release()
+        
+        threading.Thread(target=copy, name='skylus-search-restore', daemon=True).start()
+    
+    def search(self, query):
+        """Row labels matching a query: words, "exact phrases", prefix*, AND/OR/NOT, column:term"""
+        try:
+            return self._match(query)
+        except sqlite3.OperationalError:
+            # Plain text with punctuation (IPs, paths, ids) is not valid FTS syntax - search it as phrases
+            terms = [term for term in query.split() if term.strip('"*')]
+            quoted = ' '.join('"{}"{}'.format(term.strip('"*').replace('"', '""'), '*' if term.endswith('*') else '')
+                              for term in terms)
+            return self._match(quoted) if quoted else np.array([], dtype=np.int64)
+    
+    def _match(self, query):
+        with self._lock:
+            rows = self._conn.execute('SELECT rowid FROM log_search WHERE log_search MATCH ?', (query,)).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+class SqlQueryEngine:
+    """Ad-hoc read-only SQL over the parsed logs (table `logs`) through an embedded engine.
+    
+    DuckDB scans the DataFrame in place with projection and filter pushdown; without DuckDB the
+    dataset is copied once into an in-memory SQLite table. Queries are bounded by
+    performance.query_timeout_seconds and analytics.max_records_per_query.
+    """
+    
+    def __init__(self, reader):
+        self.reader = reader
+        self.timeout_seconds = float(get_config_value(reader.config, 'performance.query_timeout_seconds', 300))
+        self.max_records = int(get_config_value(reader.config, 'analytics.max_records_per_query', 100000))
+        self.engine_name = 'DuckDB' if duckdb is not None else 'SQLite'
+        self._lock = threading.Lock()
+        self._conn = None
+        self._database = None
+        self._registered_df = None
+    
+    def _connection(self):
+        """Fresh per-query connection with the current dataset visible as `logs`
+        
+        Nothing a query does on its own cursor can reach the shared connection or other sessions.
+        """
+        with self._lock:
+            df = self.reader.df
+            if duckdb is not None:
+                if self._conn is None:
+                    self._conn = duckdb.connect(config={'enable_external_access': False})
+                cursor = self._conn.cursor()
+            else:
+                if self._registered_df is not df:
+                    # A new shared-cache database per dataset version; running queries keep the old one alive
+                    self._database = f'file:skylus_logs_{id(self)}_{time.time_ns()}?mode=memory&cache=shared'
+                    self._conn = sqlite3.connect(self._database, uri=True, check_same_thread=False)
+                    df.assign(date=df['date'].astype(str), time=df['time'].astype(str)).to_sql(
+                        'logs', self._conn, index=True, index_label='row_id')
+                    self._registered_df = df
+                cursor = sqlite3.connect(self._database, uri=True, check_same_thread=False)
+                cursor.execute('PRAGMA query_only = ON')
+        if duckdb is not None:
+            # Registration is zero-copy and local to the cursor
+            cursor.register('logs', df)
+        return cursor
+    
+    @staticmethod
+    def _single_select(query):
+        """Return query if it is exactly one SELECT statement, else raise ValueError"""
+        query = query.strip().rstrip(';').strip()
+        if duckdb is not None:
+            statements = duckdb.extract_statements(query)
+            if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+                raise ValueError("Only a single SELECT statement is allowed")
+        elif not re.match(r'(SELECT|WITH)\b', query, re.IGNORECASE):
+            # sqlite3 itself refuses to execute more than one statement per call
+            raise ValueError("Only a single SELECT statement is allowed")
+        return query
+    
+    def run_page(self, query, page=0, page_size=100):
+        """Run a query and return one page of its result, capped at max_records rows overall"""
+        query = self._single_select(query)
+        offset = page * page_size
+        limit = max(0, min(page_size, self.max_records - offset))
+        # Newlines keep a trailing line comment from swallowing the wrapper; LIMIT/OFFSET push down
+        wrapped = f'SELECT * FROM (\n{query}\n) AS q LIMIT {limit} OFFSET {offset}'
+        conn = self._connection()
+        
+        if duckdb is not None:
+            timer = threading.Timer(self.timeout_seconds, conn.interrupt)
+            timer.start()
+            try:
+                return conn.execute(wrapped).df()
+            except duckdb.InterruptException as e:
+                raise TimeoutError(f"Query exceeded {self.timeout_seconds:g}s timeout") from e
+            finally:
+                timer.cancel()
+                conn.close()
+        
+        deadline = time.time() + self.timeout_seconds
+        conn.set_progress_handler(lambda: int(time.time() > deadline), 10000)
+        try:
+            return pd.read_sql_query(wrapped, conn)
+        except (sqlite3.OperationalError, pd.errors.DatabaseError) as e:
+            if time.time() > deadline:
+                raise TimeoutError(f"Query exceeded {self.timeout_seconds:g}s timeout") from e
+            raise
+        finally:
+            conn.close()
+
+class SharedDatasetRegistry:
+    """Process-wide, read-only registry of parsed datasets shared across Streamlit sessions"""
+    
+    def __init__(self, session_timeout_seconds):
+        self.session_timeout_seconds = session_timeout_seconds
+        self._lock = threading.Lock()
+        self._entries = {}        # fingerprint -> {'reader', 'sessions', 'loaded_at', 'memory_bytes'}
+        self._sessions = {}       # session_id -> {'fingerprint', 'last_seen'}
+        self._load_locks = {}     # fingerprint -> lock so each dataset is parsed only once
+    
+    def attach(self, session_id, fingerprint, loader):
+        """Attach a session to the dataset for fingerprint, running loader only if nobody has it yet.
+        
+        Returns (reader, reused); reader is None when loading produced no data. A load the memory
+        governor sampled is handed back unshared, so no session attaches to it as the full dataset.
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(fingerprint, threading.Lock())
+        
+        reused = True
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(fingerprint)
+            if entry is None:
+                reused = False
+                reader = loader()
+                if reader is None or reader.sample_stride > 1:
+                    with self._lock:
+                        self._load_locks.pop(fingerprint, None)
+                        if reader is not None:
+                            self._detach_locked(session_id)
+                    return reader, False
+                entry = {
+                    'reader': reader,
+                    'sessions': set(),
+                    'loaded_at': time.time(),
+                    'memory_bytes': reader.memory_bytes or int(reader.df.memory_usage(deep=True).sum()),
+                }
+                with self._lock:
+                    self._entries[fingerprint] = entry
+        get_metrics().inc('skylus_cache_requests_total', cache='dataset', result='hit' if reused else 'miss')
+        
+        with self._lock:
+            previous = self._sessions.get(session_id)
+            if previous is not None and previous['fingerprint'] != fingerprint:
+                self._detach_locked(session_id)
+            entry['sessions'].add(session_id)
+            self._entries.setdefault(fingerprint, entry)
+            self._sessions[session_id] = {'fingerprint': fingerprint, 'last_seen': time.time()}
+        return entry['reader'], reused
+    
+    def touch(self, session_id):
+        """Mark a session as active, evict idle ones and return its reader (None if released)"""
+        with self._lock:
+            self._sweep_locked()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session['last_seen'] = time.time()
+            return self._entries[session['fingerprint']]['reader']
+    
+    def detach(self, session_id):
+        """Release a session's reference to its dataset"""
+        with self._lock:
+            self._detach_locked(session_id)
+    
+    def stats(self):
+        """Summary of shared datasets and attached sessions"""
+        with self._lock:
+            return {
+                'datasets': len(self._entries),
+                'sessions': len(self._sessions),
+                'memory_bytes': sum(entry['memory_bytes'] for entry in self._entries.values()),
+            }
+    
+    def evict_least_recent(self, keep=None):
+        """Drop the dataset whose sessions were seen longest ago (never keep); returns its bytes or 0"""
+        with self._lock:
+            last_seen = {}
+            for session in self._sessions.values():
+                fingerprint = session['fingerprint']
+                last_seen[fingerprint] = max(last_seen.get(fingerprint, 0), session['last_seen'])
+            candidates = [fingerprint for fingerprint in self._entries if fingerprint != keep]
+            if not candidates:
+                return 0
+            victim = min(candidates, key=lambda fingerprint: last_seen.get(fingerprint, 0))
+            entry = self._entries[victim]
+            # Its sessions find themselves released on their next rerun
+            for session_id in list(entry['sessions']):
+                self._detach_locked(session_id)
+            self._entries.pop(victim, None)
+            self._load_locks.pop(victim, None)
+            return entry['memory_bytes']
+    
+    def _detach_locked(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        entry = self._entries.get(session['fingerprint'])
+        if entry is not None:
+            entry['sessions'].discard(session_id)
+            # Evict when the last session detaches
+            if not entry['sessions']:
+                del self._entries[session['fingerprint']]
+                self._load_locks.pop(session['fingerprint'], None)
+    
+    def _sweep_locked(self):
+        cutoff = time.time() - self.session_timeout_seconds
+        for session_id in [sid for sid, session in self._sessions.items() if session['last_seen'] < cutoff]:
+            self._detach_locked(session_id)
+
+@st.cache_resource
+def get_dataset_registry():
+    """Shared dataset registry for this server process"""
+    timeout_minutes = get_config_value(load_platform_config(), 'server.session_timeout_minutes', 480)
+    return SharedDatasetRegistry(session_timeout_seconds=float(timeout_minutes) * 60)
+
+def current_session_id():
+    """Identifier of the browser session running this script"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format.
+    
+    Counters, gauges and histograms are declared in METRIC_DEFINITIONS and keyed by their label
+    values. Sizes that are cheap to read on demand (dataset memory, sessions, receiver state) come
+    from collector callbacks evaluated at scrape time instead of being tracked on every change.
+    """
+    
+    def __init__(self, definitions=METRIC_DEFINITIONS):
+        self.definitions = definitions
+        self._lock = threading.Lock()
+        self._values = {name: {} for name in definitions}  # name -> label tuple -> value or [buckets, sum, count]
+        self._collectors = []
+    
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + amount
+    
+    def set(self, name, value, **labels):
+        """Set a gauge"""
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+    
+    def observe(self, name, value, **labels):
+        """Record one histogram observation"""
+        buckets = self.definitions[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values[name].setdefault(key, [[0] * len(buckets), 0.0, 0])
+            slot = bisect.bisect_left(buckets, value)
+            if slot < len(buckets):
+                state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+    
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall time of a block in a histogram"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+    
+    def add_collector(self, collector):
+        """Register a callable returning {metric name: {label tuple: value}}, evaluated at scrape time"""
+        with self._lock:
+            self._collectors.append(collector)
+    
+    def snapshot(self):
+        """Current values of every metric, collectors included"""
+        with self._lock:
+            values = {name: {key: (list(v[0]), v[1], v[2]) if isinstance(v, list) else v
+                             for key, v in entries.items()} for name, entries in self._values.items()}
+            collectors = list(self._collectors)
+        for collector in collectors:
+            for name, entries in collector().items():
+                values[name].update(entries)
+        
+        # Hit ratios are derived from the lookup counters so they never drift apart
+        lookups = defaultdict(lambda: [0, 0])
+        for key, count in values['skylus_cache_requests_total'].items():
+            labels = dict(key)
+            lookups[labels['cache']][labels['result'] == 'hit'] += count
+        for cache, (misses, hits) in lookups.items():
+            values['skylus_cache_hit_ratio'][(('cache', cache),)] = hits / max(1, hits + misses)
+        return values
+    
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        lines = []
+        for name, entries in self.snapshot().items():
+            kind, help_text, buckets = self.definitions[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(entries.items()):
+                labels = [f'{label}="{self._escape(v)}"' for label, v in key]
+                if kind != 'histogram':
+                    sample = self._format(value)
+                    lines.append(f"{name}{{{','.join(labels)}}} {sample}" if labels else f"{name} {sample}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts + [count - sum(counts)]):
+                    cumulative += bucket_count
+                    bucket_labels = ','.join(labels + [f'le="{bound}"'])
+                    lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+                suffix = f"{{{','.join(labels)}}}" if labels else ''
+                lines.append(f"{name}_sum{suffix} {self._format(total)}")
+                lines.append(f"{name}_count{suffix} {count}")
+        return '\n'.join(lines) + '\n'
+    
+    @staticmethod
+    def _format(value):
+        """Sample value at full precision: integers verbatim, floats via repr, Prometheus spelling for NaN/Inf"""
+        if isinstance(value, (bool, int, np.integer)):
+            return str(int(value))
+        value = float(value)
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    
+    @staticmethod
+    def _escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+@st.cache_resource
+def get_metrics():
+    """Metrics registry shared by every session of this server"""
+    metrics = MetricsRegistry()
+    
+    def dataset_gauges():
+        shared = get_dataset_registry().stats()
+        return {
+            'skylus_dataset_memory_bytes': {(): shared['memory_bytes']},
+            'skylus_shared_datasets': {(): shared['datasets']},
+            'skylus_active_sessions': {(): shared['sessions']},
+        }
+    
+    metrics.add_collector(dataset_gauges)
+    return metrics
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /metrics from the handler's server.metrics registry"""
+    
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_exporter(metrics, host, port):
+    """Serve metrics over HTTP on a daemon thread; returns the server (port 0 binds any free port)"""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name='skylus-metrics', daemon=True).start()
+    return server
+
+@st.cache_resource
+def get_metrics_exporter():
+    """Prometheus exporter for this server process (None when monitoring.metrics_collection is off)"""
+    config = load_platform_config()
+    if not get_config_value(config, 'monitoring.metrics_collection', False):
+        return None
+    return start_metrics_exporter(get_metrics(), get_config_value(config, 'monitoring.metrics_host', '0.0.0.0'),
+                                  int(get_config_value(config, 'monitoring.metrics_port', 9502)))
+
+class QueryScheduler:
+    """Process-wide admission control for heavy dashboard computations.
+    
+    Requests carry a key describing what they compute. One that arrives while an identical request is
+    in flight waits for that result instead of computing it again (single-flight). Distinct requests
+    run on at most max_workers threads and queue beyond that. Callers give up after timeout_seconds,
+    counted from arrival so queue time is included; a request every caller has given up on is
+    cancelled if it has not started. Python code cannot be interrupted once running, so SQL queries
+    rely on their engine's own timeout for that.
+    """
+    
+    def __init__(self, max_workers, timeout_seconds):
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='skylus-query')
+        # Reentrant: a future that completes immediately runs its done-callback while we hold the lock
+        self._lock = threading.RLock()
+        self._inflight = {}  # (kind, key) -> {'future', 'waiters', 'started'}
+        self._running = 0
+        get_metrics().add_collector(self.metrics)
+    
+    def run(self, kind, key, fn, timeout=None):
+        """Run fn() on the pool, or join the identical in-flight request; returns (result, queue wait seconds, shared)"""
+        arrived = time.perf_counter()
+        flight_key = (kind, key)
+        with self._lock:
+            flight = self._inflight.get(flight_key)
+            shared = flight is not None
+            if flight is None:
+                flight = {'waiters': 0, 'started': None}
+                flight['future'] = self._executor.submit(self._execute, kind, arrived, flight, fn)
+                self._inflight[flight_key] = flight
+                flight['future'].add_done_callback(lambda _: self._forget(flight_key, flight))
+            flight['waiters'] += 1
+        
+        metrics = get_metrics()
+        metrics.inc('skylus_queries_total', kind=kind, outcome='shared' if shared else 'executed')
+        try:
+            result = flight['future'].result(timeout=self.timeout_seconds if timeout is None else timeout)
+        except FutureTimeoutError:
+            metrics.inc('skylus_queries_total', kind=kind, outcome='timeout')
+            with self._lock:
+                if flight['waiters'] == 1 and flight['future'].cancel():
+                    self._forget(flight_key, flight)
+            raise TimeoutError(f"{kind.replace('_', ' ').capitalize()} exceeded "
+                               f"{self.timeout_seconds if timeout is None else timeout:g}s timeout")
+        finally:
+            with self._lock:
+                flight['waiters'] -= 1
+        return result, max(0.0, (flight['started'] or arrived) - arrived), shared
+    
+    def _execute(self, kind, submitted, flight, fn):
+        flight['started'] = time.perf_counter()
+        metrics = get_metrics()
+        metrics.observe('skylus_query_queue_seconds', flight['started'] - submitted, kind=kind)
+        with self._lock:
+            self._running += 1
+        try:
+            with metrics.timer('skylus_query_seconds', kind=kind):
+                return fn()
+        finally:
+            with self._lock:
+                self._running -= 1
+    
+    def _forget(self, flight_key, flight):
+        with self._lock:
+            if self._inflight.get(flight_key) is flight:
+                del self._inflight[flight_key]
+    
+    def metrics(self):
+        """Running and queued request counts for MetricsRegistry.add_collector"""
+        with self._lock:
             return {
-                'timestamp': timestamp,
-                'date': timestamp.date() if timestamp else None,
-                'time': timestamp.time() if timestamp else None,
-                'hour': timestamp.hour if timestamp else None,
-                'day_of_week': timestamp.strftime('%A') if timestamp else None,
-                'level': level,
-                'uuid': uuid,
-                'service': service,
-                'user': user,
-                'tenant_id': tenant_id,
-                'ip': ip,
-                'user_agent': user_agent,
-                'action': action,
-                'message': message,
-                'filename': filename,
-                'raw_line': line,
-                'success': 'succeeded' in message.lower() or 'success' in message.lower(),
-                'error': level == 'ERROR' or 'error' in message.lower() or 'failed' in message.lower() or 'quota exceeded' in message.lower(),
-                'browser': self.extract_browser(user_agent),
-                'os': self.extract_os(user_agent),
-                'response_time': self.extract_response_time(message),
-                'session_id': uuid[:8],  # Short session identifier
+                'skylus_queries_running': {(): self._running},
+                'skylus_queries_queued': {(): len(self._inflight) - self._running},
             }
+
+@st.cache_resource
+def get_query_scheduler():
+    """Query scheduler shared by every session of this server"""
+    config = load_platform_config()
+    return QueryScheduler(max_workers=max(1, int(get_config_value(config, 'performance.max_concurrent_queries', 10))),
+                          timeout_seconds=float(get_config_value(config, 'performance.query_timeout_seconds', 300)))
+
+def describe_query_wait(waited, shared, source=None):
+    """Caption describing how a scheduled query was served"""
+    text = f"⏳ Queued {waited * 1000:,.0f} ms for a query worker"
+    if shared:
+        text += " · ♻️ shared with an identical request already in flight"
+    if source in ('memory', 'redis'):
+        text += f" · 💾 served from the {source} result cache"
+    return text
+
+class ResultCache:
+    """Two-tier cache of computed results: an in-process LRU in front of an optional Redis.
+    
+    Each namespace has its own TTL (cache.ttl_seconds). Values are pickled and, with
+    performance.cache_compression, zlib-compressed, so stats dicts, DataFrames and Plotly figures
+    round-trip through Redis, survive restarts and are shared between replicas; Redis must therefore
+    be the deployment's own trusted instance. Concurrent misses on a key compute once: threads of
+    this process wait on a per-key lock, other replicas see a short Redis lock and poll for the
+    winner's value. Expiry is jittered so entries written together do not expire together.
+    """
+    
+    TTL_JITTER = 0.1
+    POLL_SECONDS = 0.1
+    
+    def __init__(self, ttl_seconds, redis_client=None, max_bytes=256 * 1024 ** 2, compress=True, lock_seconds=30):
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.lock_seconds = lock_seconds
+        self.redis_errors = (OSError,) + ((redis.exceptions.RedisError,) if redis is not None else ())
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value, nbytes), least recently used first
+        self._bytes = 0
+        self._key_locks = {}
+    
+    def get_or_compute(self, namespace, key, compute):
+        """Cached value for (namespace, key), computing and storing it on a miss; returns (value, source)"""
+        cache_key = self._cache_key(namespace, key)
+        value, source = self._lookup(cache_key)
+        if source is not None:
+            return value, source
+        
+        with self._lock:
+            key_lock = self._key_locks.setdefault(cache_key, threading.Lock())
+        with key_lock:
+            try:
+                # Another thread may have filled the entry while we waited for the key lock
+                value, source = self._lookup(cache_key, record=False)
+                if source is not None:
+                    return value, source
+                token = self._acquire_remote(cache_key)
+                if token is None:
+                    value, source = self._await_remote(cache_key)
+                    if source is not None:
+                        return value, source
+                try:
+                    value = compute()
+                    self._store(namespace, cache_key, value)
+                finally:
+                    if token is not None:
+                        self._release_remote(cache_key, token)
+                return value, 'computed'
+            finally:
+                with self._lock:
+                    self._key_locks.pop(cache_key, None)
+    
+    def put(self, namespace, key, value):
+        """Store a value computed elsewhere, such as stats restored from a snapshot"""
+        self._store(namespace, self._cache_key(namespace, key), value)
+    
+    def clear_memory(self):
+        """Drop the in-process tier (Redis keeps its copies); returns the bytes released"""
+        with self._lock:
+            released = self._bytes
+            self._entries.clear()
+            self._bytes = 0
+            return released
+    
+    def stats(self):
+        """Entries and bytes held by the in-process tier"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'redis': self.redis is not None}
+    
+    @staticmethod
+    def _cache_key(namespace, key):
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+        return f"skylus:results:v{RESULT_CACHE_VERSION}:{namespace}:{digest}"
+    
+    def _ttl(self, namespace):
+        ttl = float(self.ttl_seconds.get(namespace, 300))
+        return ttl * (1 + random.uniform(-self.TTL_JITTER, self.TTL_JITTER))
+    
+    def _lookup(self, cache_key, record=True):
+        # Re-checks after waiting on a lock are not lookups of their own
+        count = get_metrics().inc if record else lambda *args, **labels: None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                count('skylus_cache_requests_total', cache='results_memory', result='hit')
+                return entry[1], 'memory'
+            if entry is not None:
+                self._drop_locked(cache_key)
+        count('skylus_cache_requests_total', cache='results_memory', result='miss')
+        
+        if self.redis is None:
+            return None, None
+        try:
+            blob = self.redis.get(cache_key)
+            ttl_ms = self.redis.pttl(cache_key) if blob is not None else None
+        except self.redis_errors:
+            count('skylus_cache_requests_total', cache='results_redis', result='error')
+            return None, None
+        if blob is None:
+            count('skylus_cache_requests_total', cache='results_redis', result='miss')
+            return None, None
+        count('skylus_cache_requests_total', cache='results_redis', result='hit')
+        value = self._decode(blob)
+        # Keep the local copy no longer than the shared one
+        self._remember(cache_key, value, len(blob), ttl_ms / 1000 if ttl_ms and ttl_ms > 0 else 1.0)
+        return value, 'redis'
+    
+    def _store(self, namespace, cache_key, value):
+        ttl = self._ttl(namespace)
+        blob = self._encode(value)
+        self._remember(cache_key, value, len(blob), ttl)
+        if self.redis is not None:
+            try:
+                self.redis.set(cache_key, blob, px=max(1, int(ttl * 1000)))
+            except self.redis_errors:
+                get_metrics().inc('skylus_cache_requests_total', cache='results_redis', result='error')
+    
+    def _remember(self, cache_key, value, nbytes, ttl):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if cache_key in self._entries:
+                self._drop_locked(cache_key)
+            self._entries[cache_key] = (time.time() + ttl, value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._drop_locked(next(iter(self._entries)))
+    
+    def _drop_locked(self, cache_key):
+        self._bytes -= self._entries.pop(cache_key)[2]
+    
+    def _encode(self, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return b'z' + zlib.compress(blob, 3) if self.compress else b'p' + blob
+    
+    @staticmethod
+    def _decode(blob):
+        return pickle.loads(zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:])
+    
+    def _acquire_remote(self, cache_key):
+        """Token of the replica-wide compute lock for a key; None when another replica holds it"""
+        token = os.urandom(8).hex()
+        if self.redis is None:
+            return token
+        try:
+            if self.redis.set(cache_key + ':lock', token, nx=True, px=int(self.lock_seconds * 1000)):
+                return token
+            return None
+        except self.redis_errors:
+            return token
+    
+    def _release_remote(self, cache_key, token):
+        if self.redis is None:
+            return
+        try:
+            held = self.redis.get(cache_key + ':lock')
+            if held is not None and (held.decode() if isinstance(held, bytes) else held) == token:
+                self.redis.delete(cache_key + ':lock')
+        except self.redis_errors:
+            pass
+    
+    def _await_remote(self, cache_key):
+        """Poll for the value another replica is computing, up to its lock lifetime"""
+        deadline = time.time() + self.lock_seconds
+        while time.time() < deadline:
+            time.sleep(self.POLL_SECONDS)
+            value, source = self._lookup(cache_key, record=False)
+            if source is not None:
+                return value, source
+            try:
+                if not self.redis.exists(cache_key + ':lock'):
+                    break
+            except self.redis_errors:
+                break
+        return None, None
+
+def connect_redis(config):
+    """Redis client for the result cache from cache.redis (or SKYLUS_REDIS_URL), or None if unreachable"""
+    if redis is None:
+        return None
+    url = os.environ.get('SKYLUS_REDIS_URL')
+    settings = get_config_value(config, 'cache.redis', {}) or {}
+    options = {'socket_connect_timeout': 1, 'socket_timeout': 2,
+               'max_connections': int(settings.get('connection_pool_size', 50))}
+    if url:
+        client = redis.Redis.from_url(url, **options)
+    else:
+        client = redis.Redis(host=settings.get('host', 'localhost'), port=int(settings.get('port', 6379)),
+                             db=int(settings.get('database', 0)), password=settings.get('password') or None,
+                             ssl=bool(settings.get('ssl', False)), **options)
+    try:
+        client.ping()
+    except (OSError, redis.exceptions.RedisError):
         return None
+    return client
+
+@st.cache_resource
+def get_result_cache():
+    """Result cache for this server process (None when cache.provider is disabled)"""
+    config = load_platform_config()
+    provider = get_config_value(config, 'cache.provider', 'memory')
+    if provider == 'disabled':
+        return None
+    return ResultCache(
+        ttl_seconds=get_config_value(config, 'cache.ttl_seconds', {}) or {},
+        redis_client=connect_redis(config) if provider == 'redis' else None,
+        max_bytes=int(float(get_config_value(config, 'cache.memory.max_megabytes', 256)) * 1024 ** 2),
+        compress=bool(get_config_value(config, 'performance.cache_compression', True)),
+        lock_seconds=float(get_config_value(config, 'cache.stampede_lock_seconds', 30)))
+
+def cached_query(kind, namespace, reader, params, compute):
+    """Run compute through the query scheduler and, when the dataset is stable, the result cache.
+    
+    Returns (result, queue wait seconds, shared, source) where source is 'memory', 'redis',
+    'computed' or None when the result cache was not used.
+    """
+    scheduler = get_query_scheduler()
+    cache = get_result_cache()
+    if cache is None or reader.fingerprint is None:
+        # Streamed data changes under the same key, so it is only coalesced, never cached
+        result, waited, shared = scheduler.run(kind, (id(reader), id(reader.df)) + params, compute)
+        return result, waited, shared, None
+    key = (kind, reader.fingerprint) + params
+    (result, source), waited, shared = scheduler.run(
+        kind, key, lambda: cache.get_or_compute(namespace, key, compute))
+    return result, waited, shared, source
+
+def seed_cached_query(kind, namespace, reader, params, value):
+    """Pre-fill the result cache entry cached_query would compute for these arguments"""
+    cache = get_result_cache()
+    if cache is not None and reader.fingerprint is not None:
+        cache.put(namespace, (kind, reader.fingerprint) + params, value)
+
+def advanced_stats_params(exact_distinct=False, exact_topk=False, sample_rate=None):
+    """Cache key parameters of get_advanced_stats, shared by the dashboard and snapshot save/restore"""
+    return (exact_distinct, exact_topk, sample_rate)
+
+def group_counts(data, by):
+    """Rows per group of data, or their Horvitz-Thompson estimates when data is a weighted sample"""
+    if SAMPLE_WEIGHT in data.columns:
+        return data.groupby(by, observed=True)[SAMPLE_WEIGHT].sum().round().astype('int64')
+    return data.groupby(by, observed=True).size()
+
+def group_sums(data, column, by):
+    """Sum of column per group of data, or its Horvitz-Thompson estimate when data is a weighted sample"""
+    if SAMPLE_WEIGHT in data.columns:
+        weighted = data[column].astype('float64') * data[SAMPLE_WEIGHT]
+        keys = [data[key] for key in ([by] if isinstance(by, str) else by)]
+        return weighted.groupby(keys, observed=True).sum().round().astype('int64')
+    return data.groupby(by, observed=True)[column].sum()
+
+def estimate_counts(sample, by):
+    """Estimated rows per group of a weighted sample and the half-width of their 95% intervals"""
+    weights = sample[SAMPLE_WEIGHT]
+    sums = pd.DataFrame({'estimate': weights, 'variance': weights * (weights - 1)}).groupby(
+        [sample[column] for column in ([by] if isinstance(by, str) else by)], observed=True).sum()
+    return sums['estimate'], CONFIDENCE_Z * np.sqrt(sums['variance'])
+
+def estimate_mean(sample, column, by=None):
+    """Weighted (ratio) estimate of column's mean, overall or per group, with its 95% half-width"""
+    weights = sample[SAMPLE_WEIGHT].to_numpy(dtype=np.float64)
+    values = sample[column].to_numpy(dtype=np.float64)
+    if by is None:
+        total = weights.sum()
+        mean = (weights * values).sum() / total
+        variance = (weights * (weights - 1) * (values - mean) ** 2).sum() / total ** 2
+        return mean, CONFIDENCE_Z * np.sqrt(variance)
+    keys = sample[by]
+    frame = pd.DataFrame({'w': weights, 'wy': weights * values})
+    sums = frame.groupby(keys.to_numpy(), observed=True).sum()
+    means = sums['wy'] / sums['w']
+    residual = values - means.reindex(keys.to_numpy()).to_numpy()
+    variance = pd.Series(weights * (weights - 1) * residual ** 2).groupby(keys.to_numpy()).sum() / sums['w'] ** 2
+    return means, CONFIDENCE_Z * np.sqrt(variance)
+
+def container_memory_limit():
+    """Memory limit of this process's cgroup in bytes, or None when unlimited or not in a container"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "unlimited" as a huge page-aligned number
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+class MemoryGovernor:
+    """Keeps the process inside performance.max_memory_usage_gb instead of letting it be OOM-killed.
+    
+    Usage is the process RSS from psutil, or the deep memory_usage of datasets and cached results
+    when psutil is missing. Above the soft limit (performance.garbage_collection_threshold of the
+    budget) relieve() escalates until enough is released: drop the in-process result cache, evict
+    the least recently used shared dataset, spill the oldest half of streamed datasets to the
+    Parquet archive, and collect garbage. Loads that pass the hard limit keep a sample of the rest.
+    """
+    
+    HARD_RATIO = 0.95
+    COOLDOWN_SECONDS = 5  # RSS lags frees, so give a relief round time to show before the next
+    
+    def __init__(self, budget_bytes, soft_ratio=0.8):
+        self.budget = budget_bytes
+        self.soft_limit = budget_bytes * soft_ratio
+        self.hard_limit = budget_bytes * self.HARD_RATIO
+        self.actions = deque(maxlen=20)  # (time, description) of recent relief actions
+        self._lock = threading.Lock()
+        self._streams = []
+        self._relieved_at = 0
+    
+    def register_stream(self, reader):
+        """Let relieve() spill the oldest rows of a continuously growing reader"""
+        with self._lock:
+            self._streams.append(reader)
+    
+    def footprint(self):
+        """Bytes held by datasets, streamed readers and cached results"""
+        cache = get_result_cache()
+        return (get_dataset_registry().stats()['memory_bytes']
+                + sum(reader.memory_bytes for reader in self._streams)
+                + (cache.stats()['bytes'] if cache is not None else 0))
     
-    def extract_browser(self, user_agent):
-        """Extract browser information from user agent"""
-        if 'Chrome' in user_agent:
-            return 'Chrome'
-        elif 'Firefox' in user_agent:
-            return 'Firefox'
-        elif 'Safari' in user_agent and 'Chrome' not in user_agent:
-            return 'Safari'
-        elif 'Edge' in user_agent:
-            return 'Edge'
-        elif 'python-requests' in user_agent:
-            return 'API Client'
-        return 'Other'
-    
-    def extract_os(self, user_agent):
-        """Extract OS information from user agent"""
-        if 'Windows NT' in user_agent:
-            return 'Windows'
-        elif 'X11; Linux' in user_agent:
-            return 'Linux'
-        elif 'X11; Ubuntu' in user_agent:
-            return 'Ubuntu'
-        elif 'Macintosh' in user_agent:
-            return 'macOS'
-        elif 'python-requests' in user_agent:
-            return 'API'
-        return 'Other'
-    
-    def extract_response_time(self, message):
-        """Extract response time from message if available"""
-        # Look for time patterns in milliseconds
-        time_match = re.search(r'(\d+)ms', message)
-        if time_match:
-            return int(time_match.group(1))
-        return None
+    def usage(self):
+        """Bytes counted against the budget"""
+        return psutil.Process().memory_info().rss if psutil is not None else self.footprint()
     
-    def process_logs(self, logs_data):
-        """Process all logs and create DataFrame"""
-        processed_logs = []
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        for i, (line, filename) in enumerate(logs_data):
-            if i % 100 == 0:
-                progress = i / len(logs_data)
-                progress_bar.progress(progress)
-                status_text.text(f'Processing logs... {i}/{len(logs_data)}')
-            
-            parsed = self.parse_log_line(line, filename)
-            if parsed:
-                processed_logs.append(parsed)
-        
-        progress_bar.progress(1.0)
-        status_text.text('Processing complete!')
-        time.sleep(0.5)
-        progress_bar.empty()
-        status_text.empty()
-        
-        if processed_logs:
-            self.df = pd.DataFrame(processed_logs)
-            self.df = self.df.sort_values('timestamp', na_position='last')
-            return True
-        return False
+    def over_soft_limit(self):
+        return self.usage() > self.soft_limit
     
-    def get_advanced_stats(self):
-        """Generate comprehensive advanced statistics"""
-        if self.df is None or len(self.df) == 0:
-            return {}
-        
-        # Basic stats
-        total_logs = len(self.df)
-        date_range = {
-            'start': self.df['timestamp'].min(),
-            'end': self.df['timestamp'].max()
-        }
+    def over_hard_limit(self):
+        return self.usage() > self.hard_limit
+    
+    def status(self):
+        """Usage, limits and recent relief actions for the UI"""
+        now = time.time()
+        return {'used': self.usage(), 'budget': self.budget, 'soft_limit': self.soft_limit,
+                'recent_actions': [action for at, action in self.actions if now - at < 300]}
+    
+    def relieve(self, protect=None):
+        """Release memory until usage is estimated to be back under the soft limit; returns actions taken.
         
-        # Advanced analytics
-        stats = {
-            'total_logs': total_logs,
-            'date_range': date_range,
-            'duration_days': (date_range['end'] - date_range['start']).days if date_range['start'] else 0,
-            
-            # User Analytics
-            'users': {
-                'total': self.df['user'].nunique(),
-                'unique_list': list(self.df['user'].unique()),
-                'most_active': self.df['user'].value_counts().head(10).to_dict(),
-                'activity_distribution': self.df.groupby('user').size().describe().to_dict()
-            },
-            
-            # Service Analytics
-            'services': {
-                'distribution': self.df['service'].value_counts().to_dict(),
-                'success_rates': self.df.groupby('service')['success'].mean().to_dict(),
-                'error_rates': self.df.groupby('service')['error'].mean().to_dict(),
-                'activity_trends': self.df.groupby(['service', 'date']).size().unstack(fill_value=0).to_dict()
-            },
+        protect is the fingerprint of a dataset that must not be evicted (the caller's own).
+        """
+        if time.time() - self._relieved_at < self.COOLDOWN_SECONDS or not self._lock.acquire(blocking=False):
+            return []
+        try:
+            excess = self.usage() - self.soft_limit
+            if excess <= 0:
+                return []
+            self._relieved_at = time.time()
+            taken = []
+            released = 0
             
-            # Time Analytics
-            'temporal': {
-                'hourly_pattern': self.df.groupby('hour').size().to_dict(),
-                'daily_pattern': self.df.groupby('day_of_week').size().to_dict(),
-                'peak_hour': self.df.groupby('hour').size().idxmax(),
-                'peak_day': self.df.groupby('day_of_week').size().idxmax(),
-                'activity_by_date': self.df.groupby('date').size().to_dict()
-            },
+            cache = get_result_cache()
+            if cache is not None:
+                freed = cache.clear_memory()
+                if freed:
+                    released += freed
+                    taken.append(('cache', f"cleared {freed / 1024 ** 2:,.0f} MB of cached results"))
             
-            # Technical Analytics
-            'technical': {
-                'browsers': self.df['browser'].value_counts().to_dict(),
-                'operating_systems': self.df['os'].value_counts().to_dict(),
-                'ip_addresses': self.df['ip'].nunique(),
-                'unique_sessions': self.df['session_id'].nunique(),
-                'avg_session_length': self.df.groupby('session_id').size().mean()
-            },
+            registry = get_dataset_registry()
+            while released < excess:
+                freed = registry.evict_least_recent(keep=protect)
+                if not freed:
+                    break
+                released += freed
+                taken.append(('dataset', f"released a shared dataset of {freed / 1024 ** 2:,.0f} MB"))
             
-            # Performance Analytics
-            'performance': {
-                'overall_success_rate': (self.df['success'].sum() / total_logs) * 100,
-                'overall_error_rate': (self.df['error'].sum() / total_logs) * 100,
-                'actions_distribution': self.df['action'].value_counts().head(20).to_dict(),
-                'error_messages': self.df[self.df['error']]['message'].value_counts().head(10).to_dict() if self.df['error'].any() else {},
-                'tenant_activity': self.df['tenant_id'].value_counts().to_dict()
-            },
+            for reader in self._streams if released < excess else []:
+                before = reader.memory_bytes
+                spilled = reader.spill_oldest(0.5)
+                if spilled:
+                    released += before - reader.memory_bytes
+                    taken.append(('spill', f"moved the oldest {spilled:,} streamed rows to the Parquet archive"))
             
-            # Security Analytics
-            'security': {
-                'failed_logins': len(self.df[(self.df['action'].str.contains('LOGIN', na=False)) & (self.df['error'])]),
-                'suspicious_ips': self.df[self.df['error']]['ip'].value_counts().head(5).to_dict(),
-                'unusual_activity': self.df.groupby('ip').size().sort_values(ascending=False).head(10).to_dict()
-            }
-        }
-        
-        return stats
+            gc.collect()
+            metrics = get_metrics()
+            for kind, description in taken:
+                metrics.inc('skylus_memory_relief_total', action=kind)
+                self.actions.append((time.time(), description))
+            return [description for _, description in taken]
+        finally:
+            self._lock.release()
+    
+    def metrics(self):
+        """Collector for the metrics registry"""
+        return {'skylus_memory_used_bytes': {(): self.usage()}, 'skylus_memory_budget_bytes': {(): self.budget}}
+
+@st.cache_resource
+def get_memory_governor():
+    """Memory governor for this server process"""
+    config = load_platform_config()
+    budget = float(get_config_value(config, 'performance.max_memory_usage_gb', 8)) * 1024 ** 3
+    container_limit = container_memory_limit()
+    governor = MemoryGovernor(
+        budget_bytes=int(min(budget, container_limit) if container_limit else budget),
+        soft_ratio=float(get_config_value(config, 'performance.garbage_collection_threshold', 0.8)))
+    get_metrics().add_collector(governor.metrics)
+    return governor
 
 def create_animated_metric_card(title, value, delta=None, delta_color="normal"):
     """Create an animated metric card"""
@@ -499,7 +3884,7 @@ def create_advanced_charts(df, chart_type, x_col, y_col, color_col=None, title="
         if color_col:
             heatmap_data = df.pivot_table(values=color_col, index=x_col, columns=y_col, fill_value=0)
         else:
-            heatmap_data = df.groupby([x_col, y_col]).size().unstack(fill_value=0)
+            heatmap_data = group_counts(df, [x_col, y_col]).unstack(fill_value=0)
         
         fig = px.imshow(heatmap_data, title=title, template="plotly_dark",
                        color_continuous_scale="Viridis")
@@ -562,6 +3947,476 @@ def create_advanced_charts(df, chart_type, x_col, y_col, color_col=None, title="
     
     return fig
 
+class LogReceiver:
+    """Asyncio network receiver: TCP/UDP line protocol and the Fluentd forward protocol.
+    
+    Incoming lines are batched (analytics.batch_size lines or log_processing.receiver.flush_interval_ms)
+    and handed to `sink(lines)` on a worker thread. At most max_pending_batches batches wait for the
+    sink; beyond that TCP and forward connections stop being read, so senders are slowed by TCP flow
+    control, while UDP datagrams that do not fit are dropped and counted.
+    """
+    
+    def __init__(self, sink, config, host=None, tcp_port=None, udp_port=None, forward_port=None):
+        receiver = get_config_value(config, 'log_processing.receiver', {}) or {}
+        self.sink = sink
+        self.host = host or receiver.get('host', '0.0.0.0')
+        self.tcp_port = receiver.get('tcp_port', 5170) if tcp_port is None else tcp_port
+        self.udp_port = receiver.get('udp_port', 5170) if udp_port is None else udp_port
+        self.forward_port = receiver.get('forward_port', 24224) if forward_port is None else forward_port
+        self.batch_lines = int(get_config_value(config, 'analytics.batch_size', 5000))
+        self.flush_interval = float(receiver.get('flush_interval_ms', 200)) / 1000
+        self.max_pending = int(receiver.get('max_pending_batches', 20))
+        self.max_coalesce = 8
+        self.stats = {'lines': 0, 'ingested': 0, 'batches': 0, 'dropped': 0, 'failed_batches': 0, 'connections': 0,
+                      'last_lag_ms': None}
+        self.ports = {}
+        self.error = None
+        self._loop = None
+        self._queue = None
+        self._batch = []
+        self._batch_started = None
+        self._ready = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Run the receiver on a daemon thread; returns once the listeners are bound"""
+        self._thread = threading.Thread(target=self._run, name='skylus-receiver', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+    
+    def stop(self):
+        """Flush what is buffered and stop the listeners"""
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._thread.join()
+    
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except Exception as e:
+            self.error = e
+            self._ready.set()
+    
+    async def _serve(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._servers = []
+        if self.tcp_port is not None:
+            server = await asyncio.start_server(self._handle_lines, self.host, self.tcp_port)
+            self._servers.append(server)
+            self.ports['tcp'] = server.sockets[0].getsockname()[1]
+        if self.forward_port is not None and msgpack is not None:
+            server = await asyncio.start_server(self._handle_forward, self.host, self.forward_port)
+            self._servers.append(server)
+            self.ports['forward'] = server.sockets[0].getsockname()[1]
+        if self.udp_port is not None:
+            self._udp, _ = await self._loop.create_datagram_endpoint(
+                lambda: _LineDatagramProtocol(self), local_addr=(self.host, self.udp_port))
+            self.ports['udp'] = self._udp.get_extra_info('sockname')[1]
+            # A larger kernel buffer absorbs bursts while the event loop is busy batching
+            self._udp.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER_BYTES)
+        self._stopping = asyncio.Event()
+        flusher = asyncio.create_task(self._flush_periodically())
+        drainer = asyncio.create_task(self._drain())
+        self._ready.set()
+        await self._stopping.wait()
+        # Hand over whatever is still buffered before the loop goes away
+        flusher.cancel()
+        if self._batch:
+            await self._queue.put(self._take_batch())
+        await self._queue.join()
+        drainer.cancel()
+    
+    async def _shutdown(self):
+        for server in self._servers:
+            server.close()
+        if 'udp' in self.ports:
+            self._udp.close()
+        self._stopping.set()
+    
+    def metrics(self):
+        """Receiver counters for MetricsRegistry.add_collector"""
+        lag = self.stats['last_lag_ms']
+        return {
+            'skylus_receiver_lines_total': {(): self.stats['lines']},
+            'skylus_receiver_dropped_total': {(): self.stats['dropped']},
+            'skylus_receiver_failed_batches_total': {(): self.stats['failed_batches']},
+            'skylus_receiver_lag_seconds': {(): 0 if lag is None else lag / 1000},
+        }
+    
+    def _take_batch(self):
+        batch, started = self._batch, self._batch_started
+        self._batch, self._batch_started = [], None
+        return batch, started
+    
+    async def _add(self, lines):
+        """Buffer lines from a stream connection, waiting while the sink is behind"""
+        self._buffer(lines)
+        if len(self._batch) >= self.batch_lines:
+            await self._queue.put(self._take_batch())
+    
+    def _add_nowait(self, lines):
+        """Buffer lines from a datagram, dropping them when the sink is behind"""
+        if self._queue.full():
+            self.stats['dropped'] += len(lines)
+            return
+        self._buffer(lines)
+        if len(self._batch) >= self.batch_lines:
+            self._queue.put_nowait(self._take_batch())
+    
+    def _buffer(self, lines):
+        if self._batch_started is None:
+            self._batch_started = time.perf_counter()
+        self._batch.extend(lines)
+        self.stats['lines'] += len(lines)
+    
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._batch and time.perf_counter() - self._batch_started >= self.flush_interval:
+                await self._queue.put(self._take_batch())
+    
+    async def _drain(self):
+        while True:
+            batch, started = await self._queue.get()
+            taken = 1
+            # When the sink falls behind, coalesce queued batches so its per-call cost is paid once
+            while not self._queue.empty() and len(batch) < self.batch_lines * self.max_coalesce:
+                more, _ = self._queue.get_nowait()
+                batch = batch + more
+                taken += 1
+            await self._deliver(batch, started)
+            for _ in range(taken):
+                self._queue.task_done()
+    
+    async def _deliver(self, batch, started):
+        try:
+            ingested = await self._loop.run_in_executor(None, self.sink, batch)
+        except Exception as e:
+            # The batch is lost: count it with the other drops and keep receiving
+            self.error = e
+            self.stats['dropped'] += len(batch)
+            self.stats['failed_batches'] += 1
+            return
+        self.stats['ingested'] += ingested or 0
+        self.stats['batches'] += 1
+        self.stats['last_lag_ms'] = (time.perf_counter() - started) * 1000
+    
+    async def _handle_lines(self, reader, writer):
+        self.stats['connections'] += 1
+        pending = b''
+        try:
+            while True:
+                data = await reader.read(READ_BLOCK_BYTES)
+                if not data:
+                    break
+                pending += data
+                lines = pending.split(b'\n')
+                pending = lines.pop()
+                await self._add([line.decode('utf-8', 'ignore').strip() for line in lines if line.strip()])
+            if pending.strip():
+                await self._add([pending.decode('utf-8', 'ignore').strip()])
+        finally:
+            writer.close()
+    
+    async def _handle_forward(self, reader, writer):
+        self.stats['connections'] += 1
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        try:
+            while True:
+                data = await reader.read(READ_BLOCK_BYTES)
+                if not data:
+                    break
+                unpacker.feed(data)
+                for message in unpacker:
+                    lines, chunk = self._forward_lines(message)
+                    await self._add(lines)
+                    if chunk is not None:
+                        writer.write(msgpack.packb({'ack': chunk}))
+                        await writer.drain()
+        finally:
+            writer.close()
+    
+    @staticmethod
+    def _forward_lines(message):
+        """Lines and ack chunk id of one forward-protocol message (Message, Forward or PackedForward mode)"""
+        if not isinstance(message, (list, tuple)) or len(message) < 2:
+            return [], None
+        entries = message[1]
+        if isinstance(entries, (list, bytes, str)):  # Forward / PackedForward: [tag, entries, option]
+            option = message[2] if len(message) > 2 else None
+        else:  # Message: [tag, time, record, option]
+            option = message[3] if len(message) > 3 else None
+            entries = [(message[1], message[2])] if len(message) > 2 else []
+        option = option if isinstance(option, dict) else {}
+        if isinstance(entries, (bytes, str)):  # PackedForward: a msgpack stream of [time, record]
+            entries = entries.encode('latin-1') if isinstance(entries, str) else entries
+            if option.get('compressed') == 'gzip':
+                entries = gzip.decompress(entries)
+            entries = list(msgpack.Unpacker(BytesIO(entries), raw=False, strict_map_key=False))
+        lines = []
+        for entry in entries:
+            record = entry[1] if isinstance(entry, (list, tuple)) and len(entry) > 1 else None
+            if isinstance(record, dict):
+                line = record.get('message', record.get('log'))
+                if isinstance(line, str) and line.strip():
+                    lines.append(line.strip())
+        return lines, option.get('chunk')
+
+class _LineDatagramProtocol(asyncio.DatagramProtocol):
+    """UDP side of LogReceiver: every datagram carries one or more newline-separated lines"""
+    
+    def __init__(self, receiver):
+        self.receiver = receiver
+    
+    def datagram_received(self, data, addr):
+        lines = [line.strip() for line in data.decode('utf-8', 'ignore').split('\n') if line.strip()]
+        if lines:
+            self.receiver._add_nowait(lines)
+
+def send_lines(lines, host='127.0.0.1', port=5170, protocol='tcp', tag='skylus.logs', batch_lines=1000):
+    """Loopback sender for LogReceiver: newline-delimited TCP/UDP, or Fluentd forward (PackedForward)"""
+    if protocol == 'udp':
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            datagram = b''
+            for line in lines:
+                encoded = line.encode('utf-8') + b'\n'
+                if datagram and len(datagram) + len(encoded) > UDP_DATAGRAM_BYTES:
+                    sock.sendto(datagram, (host, port))
+                    datagram = b''
+                datagram += encoded
+            if datagram:
+                sock.sendto(datagram, (host, port))
+        return
+    with socket.create_connection((host, port)) as sock:
+        if protocol == 'tcp':
+            for start in range(0, len(lines), batch_lines):
+                sock.sendall(('\n'.join(lines[start:start + batch_lines]) + '\n').encode('utf-8'))
+            return
+        now = int(time.time())
+        for start in range(0, len(lines), batch_lines):
+            entries = b''.join(msgpack.packb([now, {'message': line}]) for line in lines[start:start + batch_lines])
+            chunk = hashlib.blake2b(entries, digest_size=8).hexdigest()
+            sock.sendall(msgpack.packb([tag, entries, {'size': min(batch_lines, len(lines) - start), 'chunk': chunk}]))
+            ack = msgpack.Unpacker(raw=False)
+            while True:
+                ack.feed(sock.recv(4096))
+                replies = list(ack)
+                if replies:
+                    break
+
+def live_sink(reader):
+    """Receiver sink appending to reader, which the memory governor may spill when over budget"""
+    governor = get_memory_governor()
+    governor.register_stream(reader)
+    
+    def sink(lines):
+        reader.append_lines(lines, 'network')
+        if governor.over_soft_limit():
+            governor.relieve()
+    return sink
+
+@st.cache_resource
+def get_live_receiver():
+    """Live dataset fed by the network receiver, shared by every session (None when disabled)"""
+    config = load_platform_config()
+    if not get_config_value(config, 'log_processing.receiver.enabled', False):
+        return None
+    reader = SkylLogReader(headless=True)
+    receiver = LogReceiver(live_sink(reader), config).start()
+    get_metrics().add_collector(receiver.metrics)
+    return reader, receiver
+
+def synthetic_log_lines(count, start=None):
+    """Skylus-format lines for receiver tests and benchmarks"""
+    start = start or datetime.now()
+    services = ['AUTH', 'STORAGE', 'NETWORK', 'COMPUTE']
+    actions = ['LOGIN', 'UPLOAD_FILE', 'CREATE_VM', 'LIST_NETWORK']
+    return [
+        f"{(start + timedelta(milliseconds=i)).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]}|{'ERROR' if i % 10 == 0 else 'INFO'}|"
+        f"{i:08x}-0000-4000-8000-{i:012x}|{services[i % 4]}|user{i % 50}|tenant{i % 5}|10.0.{i % 16}.{i % 250}|"
+        f"Mozilla/5.0 (X11; Linux) Firefox/120|{actions[i % 4]}|{actions[i % 4]} completed in {i % 900}ms"
+        for i in range(count)
+    ]
+
+@st.fragment(run_every=1)
+def live_stream_status():
+    """Receiver throughput and the newest streamed lines, refreshed every second"""
+    live = get_live_receiver()
+    if live is None:
+        return
+    live_reader, receiver = live
+    stats = receiver.stats
+    lag = stats['last_lag_ms']
+    st.markdown("## 📡 **Live Stream**")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Rows", f"{0 if live_reader.df is None else len(live_reader.df):,}")
+    col2.metric("Lines Received", f"{stats['lines']:,}")
+    col3.metric("Batches", f"{stats['batches']:,}")
+    col4.metric("Dropped", f"{stats['dropped']:,}")
+    col5.metric("Ingest Lag", "—" if lag is None else f"{lag:,.0f} ms")
+    if receiver.error is not None:
+        st.error(f"❌ Live ingestion failed: {receiver.error}")
+    if live_reader.df is not None and len(live_reader.df):
+        st.dataframe(live_reader.df.tail(10)[['timestamp', 'level', 'service', 'user', 'action', 'message']].iloc[::-1],
+                     use_container_width=True, hide_index=True)
+
+def build_custom_chart(df, chart_type, x_column, y_column, color_column, aggregate_function, preview):
+    """Aggregate the data behind a Custom Visualization Studio chart and build it; returns (fig, plot_data).
+    
+    df may be a weighted sample, whose counts are then estimates; preview holds the rows drawn as points.
+    """
+    # Prepare data based on selections
+    if y_column == "count":
+        if aggregate_function == "count":
+            plot_data = group_counts(df, x_column).reset_index()
+            plot_data.columns = [x_column, 'count']
+        else:
+            plot_data = df.groupby(x_column).agg({
+                'level': aggregate_function
+            }).reset_index()
+            plot_data.columns = [x_column, 'count']
+    else:
+        plot_data = df.copy()
+    
+    # Create visualization based on chart type
+    if chart_type == "Bar Chart":
+        if y_column == "count":
+            fig = px.bar(plot_data, x=x_column, y='count',
+                       color=color_column if color_column != "None" else None,
+                       title=f"📊 {chart_type}: {x_column} vs {y_column}",
+                       template="plotly_dark")
+        else:
+            fig = px.bar(plot_data.head(50), x=x_column, y=y_column,
+                       color=color_column if color_column != "None" else None,
+                       title=f"📊 {chart_type}: {x_column} vs {y_column}",
+                       template="plotly_dark")
+    
+    elif chart_type == "Line Chart":
+        if y_column == "count":
+            fig = px.line(plot_data, x=x_column, y='count',
+                        color=color_column if color_column != "None" else None,
+                        title=f"📈 {chart_type}: {x_column} vs {y_column}",
+                        template="plotly_dark")
+        else:
+            time_data = group_counts(df, [x_column, 'hour']).reset_index()
+            time_data.columns = [x_column, 'hour', 'count']
+            fig = px.line(time_data, x='hour', y='count',
+                        color=x_column,
+                        title=f"📈 {chart_type}: Hourly {x_column} Activity",
+                        template="plotly_dark")
+    
+    elif chart_type == "Scatter Plot":
+        if SAMPLE_WEIGHT in df.columns:
+            weights = df[SAMPLE_WEIGHT]
+            scatter_data = df[[x_column]].assign(Success=df['success'] * weights, Errors=df['error'] * weights,
+                                                 Total=weights).groupby(x_column).sum().round().reset_index()
+        else:
+            scatter_data = df.groupby(x_column).agg({
+                'success': 'sum',
+                'error': 'sum',
+                'level': 'count'
+            }).reset_index()
+        scatter_data.columns = [x_column, 'Success', 'Errors', 'Total']
+        
+        fig = px.scatter(scatter_data, x='Success', y='Errors',
+                       size='Total', hover_data=[x_column],
+                       title=f"⚡ {chart_type}: Success vs Errors by {x_column}",
+                       template="plotly_dark")
+    
+    elif chart_type == "Pie Chart":
+        fig = px.pie(plot_data.head(10), values='count', names=x_column,
+                   title=f"🥧 {chart_type}: {x_column} Distribution",
+                   template="plotly_dark")
+    
+    elif chart_type == "Heatmap":
+        if x_column != "hour":
+            heatmap_data = group_counts(df, [x_column, 'hour']).unstack(fill_value=0)
+        else:
+            heatmap_data = group_counts(df, ['service', 'hour']).unstack(fill_value=0)
+        
+        fig = px.imshow(heatmap_data, title=f"🔥 {chart_type}: {x_column} Activity",
+                      template="plotly_dark", color_continuous_scale="Viridis")
+    
+    elif chart_type == "3D Scatter":
+        fig = px.scatter_3d(preview, x='hour', y='day_of_week', z=x_column,
+                          color=color_column if color_column != "None" else None,
+                          title=f"🌐 {chart_type}: Multi-dimensional Analysis",
+                          template="plotly_dark")
+    
+    elif chart_type == "Sunburst":
+        if color_column != "None":
+            sunburst_data = group_counts(df, [x_column, color_column]).reset_index()
+            sunburst_data.columns = [x_column, color_column, 'count']
+            fig = px.sunburst(sunburst_data, path=[x_column, color_column], values='count',
+                            title=f"☀️ {chart_type}: {x_column} Hierarchy",
+                            template="plotly_dark")
+        else:
+            fig = px.sunburst(plot_data.head(20), path=[x_column], values='count',
+                            title=f"☀️ {chart_type}: {x_column} Distribution",
+                            template="plotly_dark")
+    
+    elif chart_type == "Treemap":
+        fig = px.treemap(plot_data.head(20), path=[x_column], values='count',
+                       title=f"🌳 {chart_type}: {x_column} Hierarchy",
+                       template="plotly_dark")
+    
+    elif chart_type == "Violin Plot":
+        fig = px.violin(preview, x=x_column, y='hour',
+                      title=f"🎻 {chart_type}: {x_column} Distribution",
+                      template="plotly_dark")
+    
+    elif chart_type == "Radar Chart":
+        radar_data = plot_data.head(8)
+        fig = go.Figure()
+        fig.add_trace(go.Scatterpolar(
+            r=radar_data['count'].values,
+            theta=radar_data[x_column].values,
+            fill='toself',
+            name=f"{x_column} Activity"
+        ))
+        fig.update_layout(
+            polar=dict(radialaxis=dict(visible=True)),
+            showlegend=True,
+            title=f"🎯 {chart_type}: {x_column} Performance",
+            template="plotly_dark"
+        )
+    
+    elif chart_type == "Waterfall":
+        waterfall_data = plot_data.head(8)
+        fig = go.Figure(go.Waterfall(
+            name="Activity Flow",
+            orientation="v",
+            measure=["relative"] * len(waterfall_data),
+            x=waterfall_data[x_column].values,
+            textposition="outside",
+            text=[str(v) for v in waterfall_data['count'].values],
+            y=waterfall_data['count'].values,
+        ))
+        fig.update_layout(
+            title=f"💧 {chart_type}: {x_column} Flow",
+            template="plotly_dark"
+        )
+    
+    elif chart_type == "Funnel":
+        fig = px.funnel(plot_data.head(10), x='count', y=x_column,
+                      title=f"⏳ {chart_type}: {x_column} Conversion",
+                      template="plotly_dark")
+    
+    # Enhanced styling
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', size=12),
+        title_font_size=18,
+        showlegend=True,
+        height=600
+    )
+    return fig, plot_data
+
 def create_dashboard():
     """Create the main professional dashboard"""
     # Load professional styling
@@ -579,6 +4434,18 @@ def create_dashboard():
     if 'log_reader' not in st.session_state:
         st.session_state.log_reader = SkylLogReader()
     
+    # Keep this session's shared dataset alive; idle sessions are released by the registry
+    registry = get_dataset_registry()
+    session_id = current_session_id()
+    governor = get_memory_governor()
+    if governor.over_soft_limit():
+        governor.relieve(protect=st.session_state.get('dataset_fingerprint'))
+    if st.session_state.get('dataset_fingerprint') and registry.touch(session_id) is None:
+        st.session_state.log_reader = SkylLogReader()
+        st.session_state.dataset_fingerprint = None
+        st.warning("⏱️ Your dataset was released after the session timeout or to stay within the memory budget "
+                   "- please analyze the logs again")
+    
     # Professional Sidebar
     with st.sidebar:
         st.markdown("""
@@ -606,46 +4473,208 @@ def create_dashboard():
         # Professional Load Button
         if st.button("🚀 **ANALYZE LOGS**", type="primary"):
             with st.spinner("🔄 Initializing Analytics Engine..."):
-                logs_data = []
-                file_stats = {}
+                log_reader = st.session_state.log_reader
+                sources = []
                 
                 # Process uploaded files
                 if uploaded_files:
-                    for uploaded_file in uploaded_files:
-                        content = uploaded_file.read().decode('utf-8', errors='ignore')
-                        lines = content.split('\n')
-                        file_stats[uploaded_file.name] = len([l for l in lines if l.strip()])
-                        logs_data.extend([(line.strip(), uploaded_file.name) for line in lines if line.strip()])
+                    sources = log_reader.load_logs_from_uploads(uploaded_files)
                 
                 # Process folder path
                 elif folder_path and os.path.exists(folder_path):
-                    logs_data, file_stats = st.session_state.log_reader.load_logs_from_folder(folder_path)
+                    sources = log_reader.load_logs_from_folder(folder_path)
                 
-                if logs_data:
-                    success = st.session_state.log_reader.process_logs(logs_data)
-                    if success:
-                        st.success(f"✅ **{len(logs_data):,}** logs processed from **{len(file_stats)}** files")
+                if sources:
+                    # Sessions analyzing the same sources share one parsed, read-only dataset
+                    fingerprint = log_reader.fingerprint_sources(sources)
+                    attempt = {}
+                    
+                    def load_dataset():
+                        attempt['reader'] = SkylLogReader()
+                        return attempt['reader'] if attempt['reader'].process_logs(sources) else None
+                    
+                    shared_reader, reused = registry.attach(session_id, fingerprint, load_dataset)
+                    if shared_reader is not None:
+                        st.session_state.log_reader = shared_reader
+                        # Sampled loads are private to this session and not kept alive by the registry
+                        st.session_state.dataset_fingerprint = fingerprint if shared_reader.sample_stride == 1 else None
+                        file_stats = shared_reader.file_stats
+                        st.success(f"✅ **{sum(file_stats.values()):,}** logs processed from **{len(file_stats)}** files")
+                        if reused:
+                            st.info("♻️ Attached to an already-loaded shared dataset - no re-parsing needed")
+                        sort_stats = shared_reader.sort_stats
+                        if sort_stats:
+                            st.caption(f"🔀 {sort_stats['in_order_ratio']:.1%} of rows arrived in time order · "
+                                       f"{sort_stats['runs']} sorted run(s) merged · "
+                                       f"{sort_stats['unsorted_rows']:,} rows needed sorting")
+                        if shared_reader.sample_stride > 1:
+                            st.warning(f"🧠 Memory budget reached while loading - later rows were sampled down to "
+                                       f"1 in {shared_reader.sample_stride}, so counts are approximate")
+                        if shared_reader.duplicate_lines:
+                            st.warning(f"🧬 **{sum(shared_reader.duplicate_lines.values()):,}** duplicate lines were dropped: " +
+                                       ", ".join(f"{name} ({count:,})" for name, count in shared_reader.duplicate_lines.items()))
+                        if shared_reader.history_duplicates:
+                            st.info(f"📚 **{sum(shared_reader.history_duplicates.values()):,}** lines were already in the "
+                                    f"stored history and were not archived again: " +
+                                    ", ".join(f"{name} ({count:,})" for name, count in shared_reader.history_duplicates.items()))
+                        skipped = {name: count for name, count in shared_reader.parse_errors.items() if count}
+                        if skipped:
+                            st.warning(f"⚠️ **{sum(skipped.values()):,}** lines did not match the log format and were skipped: " +
+                                       ", ".join(f"{name} ({count:,})" for name, count in skipped.items()))
                         st.session_state.file_stats = file_stats
                         st.balloons()
+                    elif sum(attempt['reader'].file_stats.values()) == 0:
+                        st.warning("⚠️ No logs detected")
                     else:
                         st.error("❌ Processing failed")
                 else:
                     st.warning("⚠️ No logs detected")
+            
+        shared = registry.stats()
+        st.caption(f"🤝 Shared datasets: {shared['datasets']} · Sessions attached: {shared['sessions']} · "
+                   f"{shared['memory_bytes'] / (1024 ** 2):,.1f} MB")
+        try:
+            exporter = get_metrics_exporter()
+            if exporter is not None:
+                st.caption(f"📈 Prometheus metrics on port {exporter.server_address[1]} at /metrics")
+        except OSError as e:
+            st.caption(f"📈 Metrics exporter could not bind its port: {e}")
+        result_cache = get_result_cache()
+        if result_cache is not None:
+            cached = result_cache.stats()
+            st.caption(f"💾 Result cache: {'memory + Redis' if cached['redis'] else 'memory only'} · "
+                       f"{cached['entries']} entries · {cached['bytes'] / (1024 ** 2):,.1f} MB")
+        memory = governor.status()
+        st.caption(f"🧠 Memory: {memory['used'] / 1024 ** 3:,.2f} / {memory['budget'] / 1024 ** 3:,.1f} GB")
+        if memory['recent_actions']:
+            st.warning("🧠 Memory budget pressure: " + "; ".join(memory['recent_actions']))
+        
+        # Snapshots: keep or share an analyzed dataset and restore it later without parsing
+        st.markdown("### 💾 Snapshots")
+        if pa is None:
+            st.caption("Install pyarrow to save and restore analysis snapshots")
+        else:
+            current = st.session_state.log_reader
+            if current.df is not None and len(current.df) > 0:
+                snapshot_name = st.text_input("Snapshot Name", value=f"analysis_{datetime.now():%Y%m%d_%H%M}")
+                if st.button("💾 Save Snapshot"):
+                    name = re.sub(r'[^A-Za-z0-9_.-]', '_', snapshot_name).strip('.') or 'snapshot'
+                    with st.spinner("💾 Writing snapshot..."):
+                        started = time.time()
+                        snapshot_stats = cached_query('advanced_stats', 'dashboard_data', current, advanced_stats_params(),
+                                                      lambda: current.get_advanced_stats())[0]
+                        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                        manifest = write_snapshot(
+                            current, os.path.join(SNAPSHOT_DIR, name), snapshot_stats,
+                            compression=get_config_value(current.config, 'performance.snapshot_compression', 'none'))
+                    st.success(f"✅ Saved **{manifest['rows']:,}** rows as `{name}` in {time.time() - started:.1f}s")
+            
+            snapshots = list_snapshots()
+            if snapshots:
+                labels = {f"{name} · {manifest['rows']:,} rows · {manifest['created']}": (name, manifest)
+                          for name, manifest in snapshots}
+                chosen = st.selectbox("Saved Snapshots", list(labels))
+                if st.button("📂 Restore Snapshot"):
+                    name, manifest = labels[chosen]
+                    started = time.time()
+                    restored = {}
+                    
+                    def load_snapshot():
+                        reader, _, restored['stats'] = read_snapshot(os.path.join(SNAPSHOT_DIR, name))
+                        return reader
+                    
+                    # Snapshots of loaded sources share the registry entry of those sources
+                    fingerprint = manifest.get('fingerprint') or f"snapshot:{name}:{manifest['created']}"
+                    try:
+                        snapshot_reader, reused = registry.attach(session_id, fingerprint, load_snapshot)
+                    except (OSError, ValueError, pa.ArrowException) as e:
+                        st.error(f"❌ Could not restore snapshot: {e}")
+                    else:
+                        if restored.get('stats') is not None:
+                            seed_cached_query('advanced_stats', 'dashboard_data', snapshot_reader, advanced_stats_params(),
+                                              restored['stats'])
+                        st.session_state.log_reader = snapshot_reader
+                        st.session_state.dataset_fingerprint = fingerprint
+                        st.session_state.file_stats = snapshot_reader.file_stats
+                        st.session_state.live_attached = False
+                        st.success(f"✅ Restored **{len(snapshot_reader.df):,}** rows in "
+                                   f"{(time.time() - started) * 1000:,.0f} ms" +
+                                   (" (already loaded)" if reused else ""))
+        
+        # Live network stream (log_processing.receiver)
+        st.markdown("### 📡 Live Stream")
+        try:
+            live = get_live_receiver()
+        except OSError as e:
+            live = None
+            st.error(f"❌ Receiver could not bind its ports: {e}")
+        if live is None:
+            st.caption("Enable log_processing.receiver in config.yaml to stream logs over TCP/UDP or Fluentd forward")
+        else:
+            live_reader, receiver = live
+            st.caption("Listening on " + " · ".join(f"{name.upper()} {port}" for name, port in receiver.ports.items()))
+            if st.button("📡 Attach Live Stream"):
+                registry.detach(session_id)
+                st.session_state.log_reader = live_reader
+                st.session_state.dataset_fingerprint = None
+                st.session_state.live_attached = True
+                st.rerun()
         
         # Advanced Configuration
         with st.expander("⚙️ Advanced Settings"):
             st.selectbox("Theme", ["Dark Pro", "Light Pro", "Neon"])
             st.slider("Animation Speed", 0.1, 2.0, 1.0)
             st.checkbox("Enable 3D Graphics", value=True)
-            st.checkbox("Real-time Updates", value=False)
+            st.checkbox("Real-time Updates", value=False, key='realtime_updates',
+                        help="Refresh the dashboard while attached to the live stream")
+            st.checkbox("🎯 Exact Distinct Counts", value=False, key='exact_distinct',
+                        help=f"Count users/IPs/sessions by scanning rows instead of merging HyperLogLog "
+                             f"sketches (±{2 * DistinctCounter.RELATIVE_ERROR * 100:.1f}% at 95%)")
+            st.checkbox("🏆 Exact Top-K Rankings", value=False, key='exact_topk',
+                        help="Rank users/IPs/actions/messages by counting every row instead of the "
+                             "fixed-memory Space-Saving summaries maintained during ingestion")
+            st.selectbox("⚡ Query Mode", [None] + st.session_state.log_reader.sampler.rates, key='sample_rate',
+                         format_func=lambda rate: "🎯 Exact" if rate is None else f"⚡ Approximate ({rate:.0%} sample)",
+                         help="Answer dashboard aggregates from a stratified sample (by service, level and "
+                              "date) kept during ingestion, with 95% confidence intervals")
+    
+    if st.session_state.get('live_attached'):
+        live_stream_status()
     
     # Main Dashboard Content
     if st.session_state.log_reader.df is not None and len(st.session_state.log_reader.df) > 0:
         df = st.session_state.log_reader.df
-        stats = st.session_state.log_reader.get_advanced_stats()
+        exact_distinct = st.session_state.get('exact_distinct', False)
+        exact_topk = st.session_state.get('exact_topk', False)
+        reader = st.session_state.log_reader
+        sample_rate = st.session_state.get('sample_rate')
+        if sample_rate not in reader.sampler.rates:
+            sample_rate = None
+        # Aggregates below read the weighted sample instead of every row in approximate mode
+        view = df if sample_rate is None else reader.sampler.sample(df, sample_rate)
+        try:
+            stats, stats_wait, stats_shared, stats_source = cached_query(
+                'advanced_stats', 'dashboard_data', reader, advanced_stats_params(exact_distinct, exact_topk, sample_rate),
+                lambda: reader.get_advanced_stats(exact_distinct=exact_distinct, exact_topk=exact_topk,
+                                                  sample_rate=sample_rate))
+        except TimeoutError as e:
+            st.error(f"⏱️ {str(e)} - the server is busy, please retry")
+            st.stop()
+        distinct_prefix = "" if exact_distinct else "≈"
+        approximate = stats['approximate']
+        approx_prefix = "≈" if approximate else ""
+        estimated = " (estimated)" if approximate else ""
         
         # Executive Summary Cards
         st.markdown("## 📊 **Executive Dashboard**")
+        if stats_shared or stats_wait >= 0.05 or stats_source in ('memory', 'redis'):
+            st.caption(describe_query_wait(stats_wait, stats_shared, stats_source))
+        if approximate:
+            col_note, col_exact = st.columns([4, 1])
+            col_note.info(f"⚡ **Approximate answers** from a {approximate['sample_rate']:.0%} stratified sample "
+                          f"({approximate['sample_rows']:,} of {len(df):,} rows) · ± shows 95% confidence intervals")
+            col_exact.button("🎯 Upgrade to Exact", on_click=st.session_state.update, kwargs={'sample_rate': None},
+                             help="Recompute every aggregate from all rows")
         
         col1, col2, col3, col4, col5, col6 = st.columns(6)
         
@@ -653,51 +4682,55 @@ def create_dashboard():
             create_animated_metric_card("Total Events", f"{stats['total_logs']:,}")
         
         with col2:
-            create_animated_metric_card("Active Users", f"{stats['users']['total']}")
+            create_animated_metric_card("Active Users", f"{distinct_prefix}{stats['users']['total']:,}")
         
         with col3:
             success_rate = stats['performance']['overall_success_rate']
-            create_animated_metric_card("Success Rate", f"{success_rate:.1f}%")
+            create_animated_metric_card("Success Rate", f"{success_rate:.1f}%" +
+                                        (f" ±{approximate['success_rate_margin']:.1f}" if approximate else ""))
         
         with col4:
             error_rate = stats['performance']['overall_error_rate']
-            create_animated_metric_card("Error Rate", f"{error_rate:.1f}%", 
+            create_animated_metric_card("Error Rate", f"{error_rate:.1f}%" +
+                                        (f" ±{approximate['error_rate_margin']:.1f}" if approximate else ""),
                                       delta_color="inverse" if error_rate > 5 else "normal")
         
         with col5:
             create_animated_metric_card("Services", f"{len(stats['services']['distribution'])}")
         
         with col6:
-            create_animated_metric_card("Peak Hour", f"{stats['temporal']['peak_hour']}:00")
+            create_animated_metric_card("Peak Hour", f"{approx_prefix}{stats['temporal']['peak_hour']}:00")
         
         # Timeline Info
         if stats['date_range']['start']:
             st.info(f"📅 **Analytics Period:** {stats['date_range']['start'].strftime('%Y-%m-%d %H:%M')} → {stats['date_range']['end'].strftime('%Y-%m-%d %H:%M')} ({stats['duration_days']} days)")
         
-        # Professional Tabs
-        tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
+        # Professional Tabs (each one's render time is exported as skylus_tab_render_seconds)
+        metrics_registry = get_metrics()
+        tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
             "🎯 **Executive Overview**",
             "📈 **Advanced Analytics**", 
             "👥 **User Intelligence**",
             "⚠️ **Security & Errors**",
             "🔧 **Service Performance**",
             "🔍 **Data Explorer**",
-            "📊 **Custom Visualizations**"
+            "📊 **Custom Visualizations**",
+            "🧮 **SQL Console**"
         ])
         
-        with tab1:
+        with tab1, metrics_registry.timer('skylus_tab_render_seconds', tab='executive_overview'):
             st.markdown("### 🎯 **Strategic Overview**")
             
             col1, col2 = st.columns(2)
             
             with col1:
-                # Animated Activity Timeline
+                # Animated Activity Timeline (served from day rollups)
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                daily_data = df.groupby('date').agg({
-                    'level': 'count',
-                    'success': 'sum',
-                    'error': 'sum'
-                }).reset_index()
+                include_history = st.checkbox("📚 Include stored history",
+                                              help="Read the persistent day rollups of every dataset analyzed so far")
+                rollups = get_rollup_store() if include_history else st.session_state.log_reader.rollups
+                daily_data = rollups.timeline('day')[['bucket', 'events', 'success', 'errors']]
+                daily_data['bucket'] = daily_data['bucket'].dt.date
                 daily_data.columns = ['Date', 'Total', 'Success', 'Errors']
                 
                 fig_timeline = px.line(daily_data, x='Date', y=['Total', 'Success', 'Errors'],
@@ -715,7 +4748,7 @@ def create_dashboard():
             with col2:
                 # 3D Service Distribution
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                service_data = df['service'].value_counts().reset_index()
+                service_data = group_counts(view, 'service').sort_values(ascending=False, kind='stable').reset_index()
                 service_data.columns = ['Service', 'Count']
                 
                 fig_3d = px.pie(service_data, values='Count', names='Service',
@@ -732,10 +4765,10 @@ def create_dashboard():
             
             # Hourly Heatmap
             st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-            hourly_service = df.groupby(['hour', 'service']).size().unstack(fill_value=0)
+            hourly_service = group_counts(view, ['hour', 'service']).unstack(fill_value=0)
             
             fig_heatmap = px.imshow(hourly_service.T, 
-                                   title="🕐 24/7 Service Activity Heatmap",
+                                   title=f"🕐 24/7 Service Activity Heatmap{estimated}",
                                    template="plotly_dark",
                                    color_continuous_scale="Viridis",
                                    aspect="auto")
@@ -746,7 +4779,7 @@ def create_dashboard():
             st.plotly_chart(fig_heatmap, use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
-        with tab2:
+        with tab2, metrics_registry.timer('skylus_tab_render_seconds', tab='advanced_analytics'):
             st.markdown("### 📈 **Advanced Analytics Dashboard**")
             
             # Multi-dimensional Analysis
@@ -755,7 +4788,7 @@ def create_dashboard():
             with col1:
                 # 3D Scatter Plot
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                sample_df = df.sample(min(1000, len(df)))  # Sample for performance
+                sample_df = reader.sampler.preview(df, 1000)  # Sample for performance
                 
                 fig_3d_scatter = px.scatter_3d(sample_df, 
                                               x='hour', y='day_of_week', z='user',
@@ -769,18 +4802,18 @@ def create_dashboard():
             with col2:
                 # Parallel Coordinates
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                user_stats = df.groupby('user').agg({
-                    'level': 'count',
-                    'success': 'sum',
-                    'error': 'sum',
-                    'hour': 'mean'
-                }).reset_index()
-                user_stats.columns = ['User', 'Total_Actions', 'Success_Count', 'Error_Count', 'Avg_Hour']
+                user_stats = pd.DataFrame({
+                    'Total_Actions': group_counts(view, 'user'),
+                    'Success_Count': group_sums(view, 'success', 'user'),
+                    'Error_Count': group_sums(view, 'error', 'user'),
+                })
+                user_stats['Avg_Hour'] = group_sums(view, 'hour', 'user') / user_stats['Total_Actions'].clip(lower=1)
+                user_stats = user_stats.rename_axis('User').reset_index()
                 
                 fig_parallel = px.parallel_coordinates(
                     user_stats.head(20),
                     dimensions=['Total_Actions', 'Success_Count', 'Error_Count', 'Avg_Hour'],
-                    title="👥 User Behavior Patterns",
+                    title=f"👥 User Behavior Patterns{estimated}",
                     template="plotly_dark"
                 )
                 st.plotly_chart(fig_parallel, use_container_width=True)
@@ -790,14 +4823,27 @@ def create_dashboard():
             st.markdown('<div class="chart-container">', unsafe_allow_html=True)
             
             # Create hourly breakdown with success/error rates
-            hourly_analysis = df.groupby('hour').agg({
-                'level': 'count',
-                'success': ['sum', 'mean'],
-                'error': ['sum', 'mean']
-            }).round(3)
+            if approximate:
+                # Estimated from the sample, with 95% confidence intervals drawn as error bars
+                totals, total_margins = estimate_counts(view, 'hour')
+                success_rates, success_margins = estimate_mean(view, 'success', 'hour')
+                error_rates, error_margins = estimate_mean(view, 'error', 'hour')
+                hourly_analysis = pd.DataFrame({
+                    'Total': totals, 'Success_Rate': success_rates, 'Error_Rate': error_rates,
+                    'Total_Margin': total_margins, 'Success_Margin': success_margins, 'Error_Margin': error_margins,
+                }).round(3).rename_axis('hour').reset_index()
+            else:
+                hourly_analysis = df.groupby('hour').agg({
+                    'level': 'count',
+                    'success': ['sum', 'mean'],
+                    'error': ['sum', 'mean']
+                }).round(3)
+                
+                hourly_analysis.columns = ['Total', 'Success_Count', 'Success_Rate', 'Error_Count', 'Error_Rate']
+                hourly_analysis = hourly_analysis.reset_index()
             
-            hourly_analysis.columns = ['Total', 'Success_Count', 'Success_Rate', 'Error_Count', 'Error_Rate']
-            hourly_analysis = hourly_analysis.reset_index()
+            def error_bars(column):
+                return dict(type='data', array=hourly_analysis[column]) if approximate else None
             
             # Create subplot with secondary y-axis
             fig_advanced = make_subplots(
@@ -808,7 +4854,7 @@ def create_dashboard():
             
             # Volume chart
             fig_advanced.add_trace(
-                go.Bar(x=hourly_analysis['hour'], y=hourly_analysis['Total'],
+                go.Bar(x=hourly_analysis['hour'], y=hourly_analysis['Total'], error_y=error_bars('Total_Margin'),
                       name='Total Activity', marker_color='#4ecdc4'),
                 row=1, col=1
             )
@@ -816,14 +4862,14 @@ def create_dashboard():
             # Rate comparison
             fig_advanced.add_trace(
                 go.Scatter(x=hourly_analysis['hour'], y=hourly_analysis['Success_Rate'],
-                          mode='lines+markers', name='Success Rate',
+                          error_y=error_bars('Success_Margin'), mode='lines+markers', name='Success Rate',
                           line=dict(color='#2ecc71', width=3)),
                 row=2, col=1
             )
             
             fig_advanced.add_trace(
                 go.Scatter(x=hourly_analysis['hour'], y=hourly_analysis['Error_Rate'],
-                          mode='lines+markers', name='Error Rate',
+                          error_y=error_bars('Error_Margin'), mode='lines+markers', name='Error Rate',
                           line=dict(color='#e74c3c', width=3)),
                 row=2, col=1
             )
@@ -838,7 +4884,7 @@ def create_dashboard():
             st.plotly_chart(fig_advanced, use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
-        with tab3:
+        with tab3, metrics_registry.timer('skylus_tab_render_seconds', tab='user_intelligence'):
             st.markdown("### 👥 **User Intelligence Center**")
             
             col1, col2 = st.columns(2)
@@ -846,18 +4892,17 @@ def create_dashboard():
             with col1:
                 # Top Users Analysis
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                user_activity = df.groupby('user').agg({
-                    'level': 'count',
-                    'success': 'sum',
-                    'error': 'sum'
-                }).reset_index()
-                user_activity.columns = ['User', 'Total_Actions', 'Successful', 'Errors']
-                user_activity['Success_Rate'] = (user_activity['Successful'] / user_activity['Total_Actions'] * 100).round(1)
+                user_activity = pd.DataFrame({
+                    'Total_Actions': group_counts(view, 'user'),
+                    'Successful': group_sums(view, 'success', 'user'),
+                    'Errors': group_sums(view, 'error', 'user'),
+                }).rename_axis('User').reset_index()
+                user_activity['Success_Rate'] = (user_activity['Successful'] / user_activity['Total_Actions'].clip(lower=1) * 100).round(1)
                 user_activity = user_activity.sort_values('Total_Actions', ascending=False).head(15)
                 
                 fig_users = px.bar(user_activity, x='User', y='Total_Actions',
                                   color='Success_Rate',
-                                  title="🏆 Top Active Users Performance",
+                                  title=f"🏆 Top Active Users Performance{estimated}",
                                   template="plotly_dark",
                                   color_continuous_scale="Viridis")
                 fig_users.update_layout(xaxis={'tickangle': 45})
@@ -866,12 +4911,12 @@ def create_dashboard():
                 
                 # User Activity Patterns
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                user_hourly = df.groupby(['user', 'hour']).size().reset_index()
-                user_hourly.columns = ['User', 'Hour', 'Activity']
                 
-                # Select top 5 users for pattern analysis
+                # Select top 5 users for pattern analysis, folding their hour rollups by hour of day
                 top_users = user_activity.head(5)['User'].tolist()
-                user_hourly_top = user_hourly[user_hourly['User'].isin(top_users)]
+                user_hourly = st.session_state.log_reader.rollups.timeline('hour', 'user', keys=top_users)
+                user_hourly_top = user_hourly.groupby(['key', user_hourly['bucket'].dt.hour])['events'].sum().reset_index()
+                user_hourly_top.columns = ['User', 'Hour', 'Activity']
                 
                 fig_user_patterns = px.line(user_hourly_top, x='Hour', y='Activity', 
                                            color='User',
@@ -883,30 +4928,31 @@ def create_dashboard():
             with col2:
                 # Technology Stack Analysis
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                browser_os = df.groupby(['browser', 'os']).size().reset_index()
+                browser_os = group_counts(view, ['browser', 'os']).reset_index()
                 browser_os.columns = ['Browser', 'OS', 'Count']
                 
                 fig_tech = px.sunburst(browser_os, path=['Browser', 'OS'], values='Count',
-                                      title="💻 Technology Stack Distribution",
+                                      title=f"💻 Technology Stack Distribution{estimated}",
                                       template="plotly_dark")
                 st.plotly_chart(fig_tech, use_container_width=True)
                 st.markdown('</div>', unsafe_allow_html=True)
                 
                 # Session Analysis
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                session_stats = df.groupby('session_id').agg({
-                    'level': 'count',
-                    'timestamp': ['min', 'max']
-                }).reset_index()
-                session_stats.columns = ['Session', 'Actions', 'Start', 'End']
-                session_stats['Duration'] = (session_stats['End'] - session_stats['Start']).dt.total_seconds() / 60
-                session_stats = session_stats[session_stats['Duration'] > 0].head(20)
+                session_stats = st.session_state.log_reader.sessions.table()
+                session_stats = session_stats[session_stats['duration_minutes'] > 0].nlargest(200, 'actions')
+                session_stats = session_stats.rename(columns={
+                    'user': 'User', 'ip': 'IP', 'start': 'Start', 'actions': 'Actions', 'errors': 'Errors',
+                    'duration_minutes': 'Duration', 'services': 'Services'})
                 
                 fig_sessions = px.scatter(session_stats, x='Actions', y='Duration',
-                                         size='Actions', hover_data=['Session'],
+                                         size='Actions', color='Errors',
+                                         hover_data=['User', 'IP', 'Start', 'Services'],
                                          title="⏱️ Session Analysis (Duration vs Activity)",
                                          template="plotly_dark")
                 st.plotly_chart(fig_sessions, use_container_width=True)
+                st.caption(f"🧭 {stats['technical']['unique_sessions']:,} sessions split on "
+                           f"{st.session_state.log_reader.sessions.gap.total_seconds() / 60:g} min of inactivity per user and IP")
                 st.markdown('</div>', unsafe_allow_html=True)
             
             # Geographic Analysis (IP-based)
@@ -935,29 +4981,92 @@ def create_dashboard():
                 use_container_width=True
             )
         
-        with tab4:
+        with tab4, metrics_registry.timer('skylus_tab_render_seconds', tab='security_errors'):
             st.markdown("### ⚠️ **Security & Error Analysis Center**")
             
+            # Streaming anomaly detection (per-service volume, error rate and response time)
+            detector = st.session_state.log_reader.anomalies
+            if detector.enabled:
+                st.markdown("#### 🛰️ **Anomaly Detection**")
+                anomalies = detector.table()
+                if detector.late_rows:
+                    st.caption(f"⏪ {detector.late_rows:,} late rows for already scored windows were left out")
+                if len(anomalies) > 0:
+                    if get_config_value(st.session_state.log_reader.config, 'log_processing.alert_on_anomalies', True):
+                        st.warning(f"🚨 {len(anomalies)} anomalous {detector.bucket.total_seconds() / 60:g}-minute "
+                                   f"windows flagged (z ≥ {detector.threshold:g} against the service baseline)")
+                    anomalies['time_to_detect_min'] = (anomalies.pop('time_to_detect').dt.total_seconds() / 60).round(1)
+                    ttd_minutes = anomalies['time_to_detect_min']
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("🚨 Anomalies", f"{len(anomalies):,}")
+                    col2.metric("⏱️ Median Time-to-Detect", f"{ttd_minutes.median():.1f} min")
+                    col3.metric("📈 Peak Z-Score", f"{anomalies['z_score'].max():.1f}")
+                    
+                    fig_anomalies = px.scatter(anomalies, x='bucket', y='service', color='metric',
+                                               size='z_score', hover_data=['value', 'baseline', 'time_to_detect_min'],
+                                               category_orders={'metric': AnomalyDetector.METRICS},
+                                               title="🛰️ Detected Spikes by Service",
+                                               template="plotly_dark")
+                    st.plotly_chart(fig_anomalies, use_container_width=True)
+                    st.dataframe(anomalies, use_container_width=True)
+                else:
+                    st.success("✅ No anomalous spikes in volume, error rate or response time")
+            
+            # Failed-login bursts per IP and per user, flagged during ingestion
+            brute_force = st.session_state.log_reader.brute_force
+            st.markdown("#### 🔐 **Brute-Force & Failed-Login Bursts**")
+            bursts = brute_force.table()
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("🔑 Failed Logins", f"{brute_force.failed_logins:,}")
+            col2.metric("💥 Burst Incidents", f"{brute_force.incident_count:,}")
+            col3.metric("🌐 IPs Flagged", f"{bursts.loc[bursts['kind'] == 'ip', 'key'].nunique():,}")
+            col4.metric("👤 Users Flagged", f"{bursts.loc[bursts['kind'] == 'user', 'key'].nunique():,}")
+            if len(bursts) > 0:
+                fig_bursts = px.scatter(bursts, x='first_failure', y='key', color='kind', size='failures',
+                                        hover_data=['last_failure', 'duration_seconds'],
+                                        title=f"💥 Latest {len(bursts):,} bursts of ≥{brute_force.max_failures} failed logins within "
+                                              f"{brute_force.window.total_seconds():g}s",
+                                        template="plotly_dark")
+                st.plotly_chart(fig_bursts, use_container_width=True)
+                st.caption(f"📋 Largest {min(len(bursts), 50):,} of the latest {len(bursts):,} incidents "
+                           f"({brute_force.incident_count:,} detected in total)")
+                st.dataframe(bursts.head(50), use_container_width=True)
+            else:
+                st.success(f"✅ No bursts of {brute_force.max_failures}+ failed logins within "
+                           f"{brute_force.window.total_seconds():g}s")
+            
+            # Charts count errors from the view; the drilldown, subnets and incident list need every error row
             error_df = df[df['error'] == True]
+            error_view = error_df if view is df else view[view['error'] == True]
             
             if len(error_df) > 0:
+                # Top-K rankings come from the Space-Saving summaries, over the whole load or recent windows
+                log_reader = st.session_state.log_reader
+                ranking_windows = {"Whole dataset": None, "Last hour": 1, "Last 24 hours": 24, "Last 7 days": 168}
+                ranking_window = st.selectbox("⏱️ Ranking Window", list(ranking_windows), key='ranking_window')
+                ranking_start = None
+                if ranking_windows[ranking_window]:
+                    ranking_start = (df['timestamp'].max() - pd.Timedelta(hours=ranking_windows[ranking_window]))
+                    ranking_start = ranking_start.floor(log_reader.heavy_hitters.window)
+                
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     # Error Distribution
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    error_service = error_df['service'].value_counts().reset_index()
+                    error_service = group_counts(error_view, 'service').sort_values(ascending=False, kind='stable').reset_index()
                     error_service.columns = ['Service', 'Error_Count']
                     
                     fig_error_service = px.funnel(error_service, x='Error_Count', y='Service',
-                                                 title="🚨 Error Distribution by Service",
+                                                 title=f"🚨 Error Distribution by Service{estimated}",
                                                  template="plotly_dark")
                     st.plotly_chart(fig_error_service, use_container_width=True)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
                     # Error Timeline
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    error_timeline = error_df.groupby('date').size().reset_index()
+                    error_timeline = st.session_state.log_reader.rollups.timeline('day')[['bucket', 'errors']]
+                    error_timeline['bucket'] = error_timeline['bucket'].dt.date
                     error_timeline.columns = ['Date', 'Error_Count']
                     
                     fig_error_timeline = px.area(error_timeline, x='Date', y='Error_Count',
@@ -970,12 +5079,13 @@ def create_dashboard():
                 with col2:
                     # Security Incidents
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    error_users = error_df['user'].value_counts().head(10).reset_index()
-                    error_users.columns = ['User', 'Error_Count']
+                    error_users = log_reader.top_table('error_user', 10, exact_topk, ranking_start)
+                    error_users.columns = ['User', 'Error_Count', 'Max_Overcount']
                     
                     fig_error_users = px.bar(error_users, x='User', y='Error_Count',
                                            title="👤 Users with Most Errors",
                                            template="plotly_dark",
+                                           hover_data=['Max_Overcount'],
                                            color='Error_Count',
                                            color_continuous_scale="Reds")
                     fig_error_users.update_layout(xaxis={'tickangle': 45})
@@ -984,11 +5094,12 @@ def create_dashboard():
                     
                     # Suspicious IP Activity
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    suspicious_ips = error_df['ip'].value_counts().head(8).reset_index()
-                    suspicious_ips.columns = ['IP', 'Error_Count']
+                    suspicious_ips = log_reader.top_table('error_ip', 8, exact_topk, ranking_start)
+                    suspicious_ips.columns = ['IP', 'Error_Count', 'Max_Overcount']
                     
                     fig_suspicious = px.scatter(suspicious_ips, x='IP', y='Error_Count',
                                               size='Error_Count',
+                                              error_y_minus='Max_Overcount',
                                               title="🔍 Suspicious IP Activity",
                                               template="plotly_dark")
                     fig_suspicious.update_layout(xaxis={'tickangle': 45})
@@ -998,18 +5109,85 @@ def create_dashboard():
                 # Error Message Analysis
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
                 st.markdown("#### 📝 **Critical Error Messages**")
-                error_messages = error_df['message'].value_counts().head(15).reset_index()
-                error_messages.columns = ['Error_Message', 'Count']
+                error_messages = log_reader.top_table('error_template', 15, exact_topk, ranking_start)
+                error_messages.columns = ['Template_ID', 'Count', 'Max_Overcount']
+                error_messages['Error_Message'] = error_messages['Template_ID'].map(log_reader.templates.template)
                 
                 fig_error_msg = px.bar(error_messages, y='Error_Message', x='Count',
                                       orientation='h',
-                                      title="🔍 Most Common Error Messages",
+                                      error_x_minus='Max_Overcount',
+                                      hover_data=['Template_ID'],
+                                      title="🔍 Most Common Error Templates",
                                       template="plotly_dark")
                 st.plotly_chart(fig_error_msg, use_container_width=True)
+                if exact_topk:
+                    st.caption("🏆 Exact rankings from a full scan of the error rows")
+                else:
+                    st.caption(f"🎯 Space-Saving top-K ({log_reader.heavy_hitters.capacity} counters per stream) · "
+                               f"counts may overstate by at most the error bar")
                 st.markdown('</div>', unsafe_allow_html=True)
                 
+                # Error templates over time and root-cause drilldown, all on the int template_id column
+                if len(error_messages) > 0:
+                    col1, col2 = st.columns(2)
+                    top_templates = error_messages['Template_ID'].head(5).to_numpy()
+                    
+                    with col1:
+                        st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+                        template_errors = error_view[error_view['template_id'].isin(top_templates)]
+                        template_timeline = group_counts(template_errors, ['date', 'template_id']).reset_index(name='Error_Count')
+                        template_timeline['Template'] = template_timeline['template_id'].map(log_reader.templates.template)
+                        
+                        fig_template_timeline = px.area(template_timeline, x='date', y='Error_Count', color='Template',
+                                                        title=f"🧩 Top Error Templates Over Time{estimated}",
+                                                        template="plotly_dark")
+                        fig_template_timeline.update_layout(legend={'orientation': 'h', 'y': -0.3})
+                        st.plotly_chart(fig_template_timeline, use_container_width=True)
+                        st.markdown('</div>', unsafe_allow_html=True)
+                    
+                    with col2:
+                        st.markdown("#### 🔬 **Root-Cause Drilldown**")
+                        root_template = st.selectbox("Error template", error_messages['Template_ID'].tolist(),
+                                                     format_func=log_reader.templates.template, key='root_cause_template')
+                        root_errors = error_df[error_df['template_id'] == root_template]
+                        st.caption(f"{len(root_errors):,} errors · first seen {root_errors['timestamp'].min()} · "
+                                   f"last seen {root_errors['timestamp'].max()}" + (" · exact" if approximate else ""))
+                        root_breakdown = pd.concat([
+                            root_errors[dimension].value_counts().head(3).rename_axis('Value').reset_index(name='Errors').assign(Dimension=label)
+                            for dimension, label in [('service', '🔧 Service'), ('action', '⚡ Action'),
+                                                     ('tenant_id', '🏢 Tenant'), ('ip', '🌐 IP')]
+                        ], ignore_index=True)
+                        st.dataframe(root_breakdown[['Dimension', 'Value', 'Errors']], use_container_width=True, hide_index=True)
+                        st.dataframe(root_errors[['timestamp', 'service', 'message']].head(5), use_container_width=True, hide_index=True)
+                
+                # Subnet aggregation on packed IPv4 addresses
+                st.markdown("#### 🌐 **Subnet Analysis**")
+                col1, col2 = st.columns([1, 3])
+                with col1:
+                    subnet_prefix = st.radio("Subnet Size", [8, 16, 24], index=2, horizontal=True,
+                                             format_func=lambda prefix: f"/{prefix}", key='subnet_prefix')
+                    allowed_networks = parse_networks(' '.join(get_config_value(log_reader.config, 'security.allowed_ip_ranges', [])))
+                    outside_events = int((~network_mask(df, allowed_networks)).sum())
+                    st.metric("🛡️ Events Outside Allowed Ranges", f"{outside_events:,}")
+                subnets = pd.DataFrame({
+                    'Events': log_reader.ip_index.subnet_counts(subnet_prefix),
+                    'Errors': ipv4_subnet_counts(error_df['ip_num'], subnet_prefix),
+                }).fillna(0).rename_axis('Subnet').reset_index()
+                subnets['Error_Rate'] = subnets['Errors'] / subnets['Events'].clip(lower=1) * 100
+                subnets = subnets.nlargest(15, 'Errors')
+                with col2:
+                    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+                    fig_subnets = px.bar(subnets, x='Subnet', y='Errors', color='Error_Rate',
+                                         hover_data=['Events'],
+                                         title=f"🌐 Subnets with Most Errors (/{subnet_prefix}){' (exact)' if approximate else ''}",
+                                         template="plotly_dark",
+                                         color_continuous_scale="Reds")
+                    fig_subnets.update_layout(xaxis={'tickangle': 45})
+                    st.plotly_chart(fig_subnets, use_container_width=True)
+                    st.markdown('</div>', unsafe_allow_html=True)
+                
                 # Recent Critical Errors
-                st.markdown("#### 🚨 **Recent Critical Incidents**")
+                st.markdown(f"#### 🚨 **Recent Critical Incidents**{' (exact)' if approximate else ''}")
                 recent_errors = error_df[['timestamp', 'user', 'service', 'action', 'message', 'ip']].sort_values('timestamp', ascending=False).head(20)
                 st.dataframe(recent_errors, use_container_width=True)
                 
@@ -1017,26 +5195,34 @@ def create_dashboard():
                 st.success("🎉 **EXCELLENT SECURITY POSTURE** - No errors detected!")
                 st.balloons()
         
-        with tab5:
+        with tab5, metrics_registry.timer('skylus_tab_render_seconds', tab='service_performance'):
             st.markdown("### 🔧 **Service Performance Center**")
             
             # Service Performance Overview
-            service_metrics = []
-            for service in stats['services']['distribution'].keys():
-                service_df = df[df['service'] == service]
-                
-                metrics = {
-                    'Service': service,
-                    'Total_Logs': len(service_df),
-                    'Success_Rate': (service_df['success'].sum() / len(service_df)) * 100 if len(service_df) > 0 else 0,
-                    'Error_Rate': (service_df['error'].sum() / len(service_df)) * 100 if len(service_df) > 0 else 0,
-                    'Unique_Users': service_df['user'].nunique(),
-                    'Peak_Hour': service_df.groupby('hour').size().idxmax() if len(service_df) > 0 else 0,
-                    'Avg_Daily': len(service_df) / max(1, stats['duration_days']) if stats['duration_days'] > 0 else len(service_df)
-                }
-                service_metrics.append(metrics)
+            log_reader = st.session_state.log_reader
+            # One grouped pass over the view per measure instead of a filtered copy of df per service
+            services = list(stats['services']['distribution'].keys())
+            service_counts = group_counts(view, 'service').reindex(services, fill_value=0)
+            service_success = group_sums(view, 'success', 'service').reindex(services, fill_value=0)
+            service_errors = group_sums(view, 'error', 'service').reindex(services, fill_value=0)
+            service_hours = group_counts(view, ['service', 'hour'])
+            service_actions = group_counts(view, ['service', 'action'])
+            if exact_distinct:
+                service_users = df.groupby('service', observed=True)['user'].nunique().reindex(services, fill_value=0)
+            else:
+                service_users = pd.Series({service: log_reader.distinct.estimate('user', services=[service])
+                                           for service in services}, dtype='int64')
+            service_peaks = service_hours.groupby(level='service', observed=True).idxmax().map(lambda key: key[1])
             
-            service_metrics_df = pd.DataFrame(service_metrics)
+            service_metrics_df = pd.DataFrame({
+                'Service': services,
+                'Total_Logs': service_counts.to_numpy(),
+                'Success_Rate': (service_success / service_counts.clip(lower=1) * 100).to_numpy(),
+                'Error_Rate': (service_errors / service_counts.clip(lower=1) * 100).to_numpy(),
+                'Unique_Users': service_users.reindex(services, fill_value=0).to_numpy(),
+                'Peak_Hour': service_peaks.reindex(services, fill_value=0).to_numpy(),
+                'Avg_Daily': (service_counts / max(1, stats['duration_days']) if stats['duration_days'] > 0 else service_counts).to_numpy(),
+            })
             
             # Service Performance Dashboard
             col1, col2 = st.columns(2)
@@ -1058,7 +5244,7 @@ def create_dashboard():
                         )
                     ),
                     showlegend=True,
-                    title="🎯 Service Success Rate Radar",
+                    title=f"🎯 Service Success Rate Radar{estimated}",
                     template="plotly_dark"
                 )
                 st.plotly_chart(fig_service_perf, use_container_width=True)
@@ -1069,55 +5255,96 @@ def create_dashboard():
                 fig_service_load = px.scatter(service_metrics_df,
                                              x='Total_Logs', y='Unique_Users',
                                              size='Avg_Daily', color='Service',
-                                             title="📊 Service Load vs User Engagement",
+                                             title=f"📊 Service Load vs User Engagement{estimated}",
                                              template="plotly_dark")
                 st.plotly_chart(fig_service_load, use_container_width=True)
                 st.markdown('</div>', unsafe_allow_html=True)
             
+            # Response Time & SLA, served from the per-service/action latency sketches
+            latency = log_reader.latency
+            st.markdown("#### ⏱️ **Response Time & SLA Tracking**")
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                latency_service = st.selectbox("Service", ["All"] + sorted(stats['services']['distribution'].keys()),
+                                               key='latency_service')
+                latency_resolution = st.radio("Resolution", ["day", "hour"], horizontal=True, key='latency_resolution')
+            latency_services = None if latency_service == "All" else [latency_service]
+            latency_counts = latency.sketch(services=latency_services)
+            
+            if latency_counts.sum() > 0:
+                latency_quantiles = latency.quantiles(latency_counts)
+                with col1:
+                    for q, label in [(0.5, "p50"), (0.95, "p95"), (0.99, "p99")]:
+                        st.metric(f"{label} Response", f"{latency_quantiles[q]:,.0f} ms",
+                                  delta=f"{latency_quantiles[q] - latency.sla_ms:+,.0f} ms vs SLA",
+                                  delta_color="inverse")
+                    st.metric("🚨 SLA Breaches", f"{latency.sla_breach_rate(latency_counts) * 100:.1f}%")
+                
+                with col2:
+                    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+                    latency_timeline = latency.timeline(latency_resolution, services=latency_services)
+                    fig_latency = px.line(latency_timeline, x='bucket', y=['p50_ms', 'p95_ms', 'p99_ms'],
+                                          title=f"⏱️ Response Time Percentiles ({latency_service})",
+                                          template="plotly_dark")
+                    fig_latency.add_hline(y=latency.sla_ms, line_dash="dash", line_color="#e74c3c",
+                                          annotation_text=f"SLA {latency.sla_ms:,.0f} ms")
+                    st.plotly_chart(fig_latency, use_container_width=True)
+                    st.markdown('</div>', unsafe_allow_html=True)
+                
+                latency_summary = latency.summary('service' if latency_services is None else 'action', services=latency_services)
+                st.dataframe(
+                    latency_summary.style.format({
+                        'requests': '{:,}', 'p50_ms': '{:,.0f}', 'p95_ms': '{:,.0f}', 'p99_ms': '{:,.0f}',
+                        'sla_breach_pct': '{:.1f}%'
+                    }).background_gradient(subset=['sla_breach_pct'], cmap='Reds'),
+                    use_container_width=True
+                )
+                st.caption(f"📐 DDSketch percentiles within ±{(latency.gamma - 1) / (latency.gamma + 1) * 100:.0f}% · "
+                           f"SLA threshold from monitoring.thresholds.response_time_ms")
+            else:
+                st.info("ℹ️ No response times (`<n>ms`) found in the log messages")
+            
             # Individual Service Analysis
-            for service in stats['services']['distribution'].keys():
+            for row in service_metrics_df.itertuples(index=False):
+                service = row.Service
                 with st.expander(f"🔍 **{service} Service Deep Dive** ({stats['services']['distribution'][service]:,} logs)"):
-                    service_df = df[df['service'] == service]
-                    
                     col1, col2, col3, col4 = st.columns(4)
                     
                     with col1:
-                        success_rate = (service_df['success'].sum() / len(service_df)) * 100 if len(service_df) > 0 else 0
-                        st.metric(f"{service} Success", f"{success_rate:.1f}%")
+                        st.metric(f"{service} Success", f"{approx_prefix}{row.Success_Rate:.1f}%")
                     
                     with col2:
-                        unique_users = service_df['user'].nunique()
-                        st.metric(f"Active Users", f"{unique_users}")
+                        st.metric(f"Active Users", f"{distinct_prefix}{row.Unique_Users:,}")
                     
                     with col3:
-                        peak_hour = service_df.groupby('hour').size().idxmax() if len(service_df) > 0 else 0
-                        st.metric(f"Peak Hour", f"{peak_hour}:00")
+                        st.metric(f"Peak Hour", f"{row.Peak_Hour}:00")
                     
                     with col4:
-                        total_actions = len(service_df)
-                        st.metric(f"Total Actions", f"{total_actions:,}")
+                        st.metric(f"Total Actions", f"{approx_prefix}{row.Total_Logs:,}")
                     
                     # Service-specific visualizations
                     col1, col2 = st.columns(2)
                     
                     with col1:
                         # Top actions
-                        top_actions = service_df['action'].value_counts().head(10).reset_index()
+                        top_actions = service_actions[service_actions.index.get_level_values('service') == service]
+                        top_actions = top_actions.droplevel('service').sort_values(ascending=False, kind='stable').head(10).reset_index()
                         top_actions.columns = ['Action', 'Count']
                         
                         if len(top_actions) > 0:
                             fig_actions = px.pie(top_actions, values='Count', names='Action',
-                                               title=f"🎯 {service} - Top Actions",
+                                               title=f"🎯 {service} - Top Actions{estimated}",
                                                template="plotly_dark")
                             st.plotly_chart(fig_actions, use_container_width=True)
                     
                     with col2:
                         # Hourly distribution
-                        hourly_dist = service_df.groupby('hour').size().reset_index()
+                        hourly_dist = service_hours[service_hours.index.get_level_values('service') == service]
+                        hourly_dist = hourly_dist.droplevel('service').reset_index()
                         hourly_dist.columns = ['Hour', 'Count']
                         
                         fig_hourly = px.area(hourly_dist, x='Hour', y='Count',
-                                           title=f"⏰ {service} - Hourly Distribution",
+                                           title=f"⏰ {service} - Hourly Distribution{estimated}",
                                            template="plotly_dark")
                         st.plotly_chart(fig_hourly, use_container_width=True)
             
@@ -1132,9 +5359,43 @@ def create_dashboard():
                 use_container_width=True
             )
         
-        with tab6:
+        with tab6, metrics_registry.timer('skylus_tab_render_seconds', tab='data_explorer'):
             st.markdown("### 🔍 **Advanced Data Explorer**")
             
+            # Trace lookup through the uuid / session_id hash index
+            with st.expander("🧵 **Trace Lookup**", expanded=bool(st.session_state.get('trace_query'))):
+                trace_query = st.text_input("Request ID", key='trace_query',
+                                            placeholder="full uuid, or its first 8 characters for the whole session",
+                                            help="Every line for this request across files and services, in time order")
+                if trace_query.strip():
+                    trace_started = time.perf_counter()
+                    trace_rows = st.session_state.log_reader.trace(trace_query)
+                    trace_ms = (time.perf_counter() - trace_started) * 1000
+                    if len(trace_rows) > 0:
+                        col1, col2, col3, col4 = st.columns(4)
+                        col1.metric("📄 Lines", f"{len(trace_rows):,}")
+                        col2.metric("🔧 Services", trace_rows['service'].nunique())
+                        col3.metric("📁 Files", trace_rows['filename'].nunique())
+                        col4.metric("⏱️ Span", f"{(trace_rows['timestamp'].max() - trace_rows['timestamp'].min()).total_seconds():,.3f}s")
+                        st.dataframe(trace_rows[['timestamp', 'filename', 'service', 'level', 'user', 'action', 'message', 'uuid']],
+                                     use_container_width=True, hide_index=True)
+                    else:
+                        st.warning(f"⚠️ No lines found for `{trace_query.strip()}`")
+                    st.caption(f"⚡ Index lookup in {trace_ms:.1f} ms over {len(df):,} records")
+            
+            search_query = st.text_input(
+                "🔎 Search Messages",
+                placeholder='quota exceeded, "LOGIN failed", CREATE_VM*, error NOT timeout',
+                help="Full-text search over message, action and raw line: words, \"exact phrases\", prefix*, AND/OR/NOT"
+            )
+            
+            # Parquet archive reads prune date/tenant partitions before opening any file
+            archive = get_partitioned_archive()
+            data_source = st.radio("🗄️ Data Source", ["Current load", "Parquet archive"], horizontal=True,
+                                   key='explorer_source', disabled=archive is None,
+                                   help="The archive holds every ingested load, partitioned by date and tenant")
+            use_archive = archive is not None and data_source == "Parquet archive"
+            
             # Advanced Filters
             col1, col2, col3, col4 = st.columns(4)
             
@@ -1155,26 +5416,49 @@ def create_dashboard():
             with col4:
                 date_range = st.date_input("📅 Date Range", 
                                          value=[df['date'].min(), df['date'].max()],
-                                         min_value=df['date'].min(),
-                                         max_value=df['date'].max())
+                                         min_value=None if use_archive else df['date'].min(),
+                                         max_value=None if use_archive else df['date'].max())
             
             # Additional filters
-            col1, col2, col3 = st.columns(3)
+            col1, col2, col3, col4 = st.columns(4)
             
             with col1:
                 show_errors_only = st.checkbox("⚠️ Errors Only")
                 show_success_only = st.checkbox("✅ Success Only")
             
             with col2:
-                ip_filter = st.selectbox("🌐 IP Address", 
-                                       options=['All'] + list(df['ip'].unique()[:20]))
+                ip_query = st.text_input("🌐 IP / CIDR", placeholder="10.1.0.0/16, 192.168.1.7",
+                                         help="Addresses or CIDR blocks, comma separated, as in security.allowed_ip_ranges")
+                outside_allowed = st.checkbox("🛡️ Outside Allowed Ranges")
             
             with col3:
                 action_filter = st.multiselect("🎯 Actions",
                                              options=df['action'].unique()[:20])
             
-            # Apply filters
-            filtered_df = df.copy()
+            with col4:
+                # Every tenant is offered (type to search): the archive's from its partition names
+                tenant_options = archive.tenants() if use_archive else sorted(df['tenant_id'].dropna().unique())
+                tenant_filter = st.multiselect("🏢 Tenants", options=tenant_options)
+            
+            # Apply filters (the full-text index narrows rows before any column is scanned)
+            explorer_total = len(df)
+            if use_archive:
+                archive_started = time.time()
+                archive_df, archive_info = archive.read(date_range[0] if len(date_range) == 2 else None,
+                                                        date_range[1] if len(date_range) == 2 else None,
+                                                        tenant_filter, service_filter)
+                filtered_df = archive_df if archive_df is not None else df.iloc[0:0]
+                explorer_total = len(filtered_df)
+                st.caption(f"📦 Read {archive_info['files']:,} files from {archive_info['partitions']:,} date/tenant "
+                           f"partitions in {(time.time() - archive_started) * 1000:.0f} ms"
+                           + (" · full-text search covers the current load only" if search_query.strip() else ""))
+            elif search_query.strip():
+                search_started = time.time()
+                matches = st.session_state.log_reader.search_index.search(search_query.strip())
+                filtered_df = df[df.index.isin(matches)]
+                st.caption(f"🔎 {len(matches):,} full-text matches in {(time.time() - search_started) * 1000:.0f} ms")
+            else:
+                filtered_df = df.copy()
             
             if service_filter:
                 filtered_df = filtered_df[filtered_df['service'].isin(service_filter)]
@@ -1191,13 +5475,49 @@ def create_dashboard():
                 filtered_df = filtered_df[filtered_df['error'] == True]
             if show_success_only:
                 filtered_df = filtered_df[filtered_df['success'] == True]
-            if ip_filter != 'All':
-                filtered_df = filtered_df[filtered_df['ip'] == ip_filter]
+            try:
+                ip_networks = parse_networks(ip_query) if ip_query.strip() else []
+            except ValueError as e:
+                st.error(f"❌ Invalid IP / CIDR: {str(e)}")
+                ip_networks = []
+            if ip_networks:
+                # Current load: bisect the sorted IP index; archive rows: uint32 range compares
+                if use_archive:
+                    filtered_df = filtered_df[network_mask(filtered_df, ip_networks)]
+                else:
+                    filtered_df = filtered_df[filtered_df.index.isin(st.session_state.log_reader.ip_index.lookup(ip_networks, df))]
+            if outside_allowed:
+                allowed_networks = parse_networks(' '.join(get_config_value(
+                    st.session_state.log_reader.config, 'security.allowed_ip_ranges', [])))
+                filtered_df = filtered_df[~network_mask(filtered_df, allowed_networks)]
             if action_filter:
                 filtered_df = filtered_df[filtered_df['action'].isin(action_filter)]
+            if tenant_filter:
+                filtered_df = filtered_df[filtered_df['tenant_id'].isin(tenant_filter)]
             
             # Results summary
-            st.info(f"📊 **Showing {len(filtered_df):,} of {len(df):,} records** ({(len(filtered_df)/len(df)*100):.1f}%)")
+            st.info(f"📊 **Showing {len(filtered_df):,} of {explorer_total:,} records** "
+                    f"({(len(filtered_df) / max(1, explorer_total) * 100):.1f}%)")
+            
+            # Distinct counts merge HLL sketches when only the date range and services are filtered
+            distinct_reader = st.session_state.log_reader
+            sketch_answerable = not (use_archive or search_query.strip() or user_filter or show_errors_only
+                                     or show_success_only or ip_networks or outside_allowed or action_filter
+                                     or set(level_filter) != set(df['level'].unique()))
+            unique_users = None
+            if not exact_distinct and sketch_answerable:
+                sketch_start, sketch_end = (date_range[0], date_range[1]) if len(date_range) == 2 else (None, None)
+                sketch_services = None if set(service_filter) == set(df['service'].unique()) else service_filter
+                # None when services and tenants are both filtered (no sketch covers that combination)
+                unique_users = distinct_reader.distinct.estimate('user', sketch_start, sketch_end, sketch_services, tenant_filter)
+                unique_ips = distinct_reader.distinct.estimate('ip', sketch_start, sketch_end, sketch_services, tenant_filter)
+            if unique_users is not None:
+                st.caption(f"👥 ≈{unique_users:,} users · 🌐 ≈{unique_ips:,} IPs "
+                           f"(HyperLogLog, ±{2 * DistinctCounter.RELATIVE_ERROR * 100:.1f}% at 95%)")
+            else:
+                unique_users = filtered_df['user'].nunique()
+                unique_ips = filtered_df['ip'].nunique()
+                st.caption(f"👥 {unique_users:,} users · 🌐 {unique_ips:,} IPs (exact)")
             
             # Display options
             col1, col2 = st.columns(2)
@@ -1240,8 +5560,8 @@ FILTER SUMMARY:
 QUICK STATS:
 - Success Rate: {(filtered_df['success'].sum() / len(filtered_df) * 100):.1f}%
 - Error Rate: {(filtered_df['error'].sum() / len(filtered_df) * 100):.1f}%
-- Unique Users: {filtered_df['user'].nunique()}
-- Unique IPs: {filtered_df['ip'].nunique()}
+- Unique Users: {unique_users}
+- Unique IPs: {unique_ips}
                     """
                     st.download_button(
                         label="📄 Download Report",
@@ -1273,7 +5593,7 @@ QUICK STATS:
             else:
                 st.warning("⚠️ No data matches current filters or no columns selected")
         
-        with tab7:
+        with tab7, metrics_registry.timer('skylus_tab_render_seconds', tab='custom_visualizations'):
             st.markdown("### 📊 **Custom Visualization Studio**")
             
             # Chart configuration
@@ -1320,148 +5640,16 @@ QUICK STATS:
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
                 
                 try:
-                    # Prepare data based on selections
-                    if y_column == "count":
-                        if aggregate_function == "count":
-                            plot_data = df.groupby(x_column).size().reset_index()
-                            plot_data.columns = [x_column, 'count']
-                        else:
-                            plot_data = df.groupby(x_column).agg({
-                                'level': aggregate_function
-                            }).reset_index()
-                            plot_data.columns = [x_column, 'count']
-                    else:
-                        plot_data = df.copy()
-                    
-                    # Create visualization based on chart type
-                    if chart_type == "Bar Chart":
-                        if y_column == "count":
-                            fig = px.bar(plot_data, x=x_column, y='count',
-                                       color=color_column if color_column != "None" else None,
-                                       title=f"📊 {chart_type}: {x_column} vs {y_column}",
-                                       template="plotly_dark")
-                        else:
-                            fig = px.bar(plot_data.head(50), x=x_column, y=y_column,
-                                       color=color_column if color_column != "None" else None,
-                                       title=f"📊 {chart_type}: {x_column} vs {y_column}",
-                                       template="plotly_dark")
-                    
-                    elif chart_type == "Line Chart":
-                        if y_column == "count":
-                            fig = px.line(plot_data, x=x_column, y='count',
-                                        color=color_column if color_column != "None" else None,
-                                        title=f"📈 {chart_type}: {x_column} vs {y_column}",
-                                        template="plotly_dark")
-                        else:
-                            time_data = df.groupby([x_column, 'hour']).size().reset_index()
-                            time_data.columns = [x_column, 'hour', 'count']
-                            fig = px.line(time_data, x='hour', y='count',
-                                        color=x_column,
-                                        title=f"📈 {chart_type}: Hourly {x_column} Activity",
-                                        template="plotly_dark")
-                    
-                    elif chart_type == "Scatter Plot":
-                        scatter_data = df.groupby(x_column).agg({
-                            'success': 'sum',
-                            'error': 'sum',
-                            'level': 'count'
-                        }).reset_index()
-                        scatter_data.columns = [x_column, 'Success', 'Errors', 'Total']
-                        
-                        fig = px.scatter(scatter_data, x='Success', y='Errors',
-                                       size='Total', hover_data=[x_column],
-                                       title=f"⚡ {chart_type}: Success vs Errors by {x_column}",
-                                       template="plotly_dark")
-                    
-                    elif chart_type == "Pie Chart":
-                        fig = px.pie(plot_data.head(10), values='count', names=x_column,
-                                   title=f"🥧 {chart_type}: {x_column} Distribution",
-                                   template="plotly_dark")
-                    
-                    elif chart_type == "Heatmap":
-                        if x_column != "hour":
-                            heatmap_data = df.groupby([x_column, 'hour']).size().unstack(fill_value=0)
-                        else:
-                            heatmap_data = df.groupby(['service', 'hour']).size().unstack(fill_value=0)
-                        
-                        fig = px.imshow(heatmap_data, title=f"🔥 {chart_type}: {x_column} Activity",
-                                      template="plotly_dark", color_continuous_scale="Viridis")
-                    
-                    elif chart_type == "3D Scatter":
-                        sample_data = df.sample(min(1000, len(df)))
-                        fig = px.scatter_3d(sample_data, x='hour', y='day_of_week', z=x_column,
-                                          color=color_column if color_column != "None" else None,
-                                          title=f"🌐 {chart_type}: Multi-dimensional Analysis",
-                                          template="plotly_dark")
-                    
-                    elif chart_type == "Sunburst":
-                        if color_column != "None":
-                            sunburst_data = df.groupby([x_column, color_column]).size().reset_index()
-                            sunburst_data.columns = [x_column, color_column, 'count']
-                            fig = px.sunburst(sunburst_data, path=[x_column, color_column], values='count',
-                                            title=f"☀️ {chart_type}: {x_column} Hierarchy",
-                                            template="plotly_dark")
-                        else:
-                            fig = px.sunburst(plot_data.head(20), path=[x_column], values='count',
-                                            title=f"☀️ {chart_type}: {x_column} Distribution",
-                                            template="plotly_dark")
-                    
-                    elif chart_type == "Treemap":
-                        fig = px.treemap(plot_data.head(20), path=[x_column], values='count',
-                                       title=f"🌳 {chart_type}: {x_column} Hierarchy",
-                                       template="plotly_dark")
-                    
-                    elif chart_type == "Violin Plot":
-                        fig = px.violin(df.head(1000), x=x_column, y='hour',
-                                      title=f"🎻 {chart_type}: {x_column} Distribution",
-                                      template="plotly_dark")
-                    
-                    elif chart_type == "Radar Chart":
-                        radar_data = plot_data.head(8)
-                        fig = go.Figure()
-                        fig.add_trace(go.Scatterpolar(
-                            r=radar_data['count'].values,
-                            theta=radar_data[x_column].values,
-                            fill='toself',
-                            name=f"{x_column} Activity"
-                        ))
-                        fig.update_layout(
-                            polar=dict(radialaxis=dict(visible=True)),
-                            showlegend=True,
-                            title=f"🎯 {chart_type}: {x_column} Performance",
-                            template="plotly_dark"
-                        )
-                    
-                    elif chart_type == "Waterfall":
-                        waterfall_data = plot_data.head(8)
-                        fig = go.Figure(go.Waterfall(
-                            name="Activity Flow",
-                            orientation="v",
-                            measure=["relative"] * len(waterfall_data),
-                            x=waterfall_data[x_column].values,
-                            textposition="outside",
-                            text=[str(v) for v in waterfall_data['count'].values],
-                            y=waterfall_data['count'].values,
-                        ))
-                        fig.update_layout(
-                            title=f"💧 {chart_type}: {x_column} Flow",
-                            template="plotly_dark"
-                        )
-                    
-                    elif chart_type == "Funnel":
-                        fig = px.funnel(plot_data.head(10), x='count', y=x_column,
-                                      title=f"⏳ {chart_type}: {x_column} Conversion",
-                                      template="plotly_dark")
-                    
-                    # Enhanced styling
-                    fig.update_layout(
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white', size=12),
-                        title_font_size=18,
-                        showlegend=True,
-                        height=600
-                    )
+                    # Identical charts requested by several users at once are computed only once
+                    (fig, plot_data), waited, shared, source = cached_query(
+                        'custom_chart', 'report_cache', st.session_state.log_reader,
+                        (chart_type, x_column, y_column, color_column, aggregate_function, sample_rate),
+                        lambda: build_custom_chart(view, chart_type, x_column, y_column, color_column,
+                                                   aggregate_function, reader.sampler.preview(df, 1000)))
+                    st.caption(describe_query_wait(waited, shared, source))
+                    if approximate:
+                        st.caption(f"⚡ Counts estimated from the {sample_rate:.0%} stratified sample - "
+                                   f"switch the query mode to Exact for exact counts")
                     
                     st.plotly_chart(fig, use_container_width=True)
                     
@@ -1502,12 +5690,12 @@ QUICK STATS:
             
             with template_col1:
                 if st.button("🕐 **Time Analysis**"):
-                    fig_time = create_advanced_charts(df, "Heatmap", "hour", "service", title="⏰ 24/7 Activity Heatmap")
+                    fig_time = create_advanced_charts(view, "Heatmap", "hour", "service", title="⏰ 24/7 Activity Heatmap")
                     st.plotly_chart(fig_time, use_container_width=True)
             
             with template_col2:
                 if st.button("👥 **User Behavior**"):
-                    fig_users = create_advanced_charts(df, "3D Scatter", "user", "service", "success", "🧠 User Behavior 3D Analysis")
+                    fig_users = create_advanced_charts(reader.sampler.preview(df, 5000), "3D Scatter", "user", "service", "success", "🧠 User Behavior 3D Analysis")
                     st.plotly_chart(fig_users, use_container_width=True)
             
             with template_col3:
@@ -1532,6 +5720,56 @@ QUICK STATS:
                     )
                     st.plotly_chart(fig_health, use_container_width=True)
     
+        with tab8, metrics_registry.timer('skylus_tab_render_seconds', tab='sql_console'):
+            st.markdown("### 🧮 **SQL Query Console**")
+            sql_engine = st.session_state.log_reader.sql_engine
+            st.caption(f"Engine: **{sql_engine.engine_name}** · Table: `logs` · "
+                       f"Timeout: {sql_engine.timeout_seconds:.0f}s · Max rows: {sql_engine.max_records:,}")
+            
+            sql_query = st.text_area(
+                "📝 Query",
+                value="SELECT service, action, COUNT(*) AS events,\n"
+                      "       SUM(CASE WHEN error THEN 1 ELSE 0 END) AS errors\n"
+                      "FROM logs\nGROUP BY service, action\nORDER BY events DESC",
+                height=150
+            )
+            
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                page_size = st.selectbox("📄 Rows per Page", [50, 100, 500, 1000], index=1)
+            
+            # Restart paging whenever the query or page size changes
+            query_key = (sql_query, page_size)
+            if st.session_state.get('sql_query_key') != query_key:
+                st.session_state.sql_query_key = query_key
+                st.session_state.sql_page = 0
+            
+            col1, col2, col3 = st.columns([1, 1, 4])
+            with col1:
+                if st.button("⬅️ Previous", disabled=st.session_state.sql_page == 0):
+                    st.session_state.sql_page -= 1
+            with col2:
+                if st.button("Next ➡️"):
+                    st.session_state.sql_page += 1
+            
+            try:
+                query_started = time.time()
+                page = st.session_state.sql_page
+                page_df, waited, shared, source = cached_query(
+                    'sql', 'analytics_cache', st.session_state.log_reader, (sql_engine.engine_name, sql_query, page, page_size),
+                    lambda: sql_engine.run_page(sql_query, page, page_size))
+                first_row = page * page_size
+                st.caption(f"Rows {first_row + 1:,}–{first_row + len(page_df):,} · "
+                           f"page {st.session_state.sql_page + 1} · {(time.time() - query_started) * 1000:.0f} ms · "
+                           + describe_query_wait(waited, shared, source))
+                st.dataframe(page_df, use_container_width=True, height=400)
+                if len(page_df) < page_size:
+                    st.info("📄 End of results")
+            except TimeoutError as e:
+                st.error(f"⏱️ {str(e)}")
+            except Exception as e:
+                st.error(f"❌ Query failed: {str(e)}")
+    
     else:
         # Professional Welcome Screen
         st.markdown("""
@@ -1624,6 +5862,133 @@ QUICK STATS:
             <p style="font-size: 1.1em;">Upload your logs or connect to your data source to begin your analytics journey!</p>
         </div>
         """, unsafe_allow_html=True)
+    
+    # Re-run the full dashboard on the configured interval while following the live stream
+    if st.session_state.get('live_attached') and st.session_state.get('realtime_updates'):
+        df = st.session_state.log_reader.df
+        st.session_state.live_rows_rendered = 0 if df is None else len(df)
+        interval = get_config_value(load_platform_config(), 'analytics.auto_refresh_interval_seconds', 30)
+        st.fragment(refresh_live_dashboard, run_every=interval)()
+
+def refresh_live_dashboard():
+    """Timer fragment: re-run the whole app once the live dataset has grown since it was rendered"""
+    df = st.session_state.log_reader.df
+    if df is not None and len(df) != st.session_state.get('live_rows_rendered'):
+        st.rerun()
+
+def replay_anomalies(reader):
+    """Replay the loaded dataset through a fresh detector in ingestion-sized batches"""
+    detector = AnomalyDetector(reader.config)
+    started = time.perf_counter()
+    for offset in range(0, len(reader.df), reader.chunk_lines):
+        detector.update(reader.df.iloc[offset:offset + reader.chunk_lines])
+    detector.flush()
+    return detector.table(), time.perf_counter() - started
+
+def benchmark_receiver(line_count, protocol, config):
+    """Loopback throughput of the receiver plus bulk parser and ingestion engines, in lines/sec"""
+    reader = SkylLogReader(headless=True)
+    receiver = LogReceiver(lambda lines: reader.append_lines(lines, 'benchmark', persist=False), config,
+                           host='127.0.0.1', tcp_port=0, udp_port=0, forward_port=0).start()
+    lines = synthetic_log_lines(line_count)
+    started = time.perf_counter()
+    send_lines(lines, port=receiver.ports[protocol], protocol=protocol)
+    # UDP has no flow control and the kernel may discard datagrams before they are counted,
+    # so stop waiting once nothing has arrived for a couple of seconds
+    seen, idle_since = -1, time.perf_counter()
+    while receiver.stats['ingested'] + receiver.stats['dropped'] < line_count:
+        if receiver.stats['lines'] != seen:
+            seen, idle_since = receiver.stats['lines'], time.perf_counter()
+        elif time.perf_counter() - idle_since > 2 and receiver.stats['ingested'] >= receiver.stats['lines'] - receiver.stats['dropped']:
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    receiver.stop()
+    return receiver.stats, elapsed
+
+def run_headless(argv):
+    """Command-line entry point for running analytics without Streamlit"""
+    parser = argparse.ArgumentParser(description="Skylus Analytics Platform (headless mode)")
+    commands = parser.add_subparsers(dest='command')
+    anomalies_parser = commands.add_parser('anomalies', help="Replay a log folder through the anomaly detector")
+    anomalies_parser.add_argument('folder', nargs='?', default='./logs', help="Folder with log files")
+    commands.add_parser('receive', help="Run the TCP/UDP/Fluentd forward receiver and print ingestion stats")
+    bench_parser = commands.add_parser('bench-receiver', help="Loopback throughput benchmark of the receiver")
+    bench_parser.add_argument('--lines', type=int, default=200000, help="Lines to send")
+    bench_parser.add_argument('--protocol', choices=['tcp', 'udp', 'forward'], default='tcp')
+    snapshot_parser = commands.add_parser('snapshot', help="Analyze a log folder and save it as a snapshot bundle")
+    snapshot_parser.add_argument('folder', help="Folder with log files")
+    snapshot_parser.add_argument('bundle', help="Snapshot bundle directory to write")
+    restore_parser = commands.add_parser('restore', help="Restore a snapshot bundle and report how long it took")
+    restore_parser.add_argument('bundle', help="Snapshot bundle directory")
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        print("\nTo open the dashboard, run: streamlit run main.py")
+        return 0
+    config = load_platform_config()
+    
+    if args.command == 'receive':
+        reader = SkylLogReader(headless=True)
+        receiver = LogReceiver(live_sink(reader), config).start()
+        get_metrics().add_collector(receiver.metrics)
+        exporter = get_metrics_exporter()
+        if exporter is not None:
+            print(f"Prometheus metrics on port {exporter.server_address[1]} at /metrics")
+        print(f"Listening on {receiver.host}: " + ', '.join(f"{name} {port}" for name, port in receiver.ports.items()))
+        try:
+            while True:
+                time.sleep(5)
+                print(f"{receiver.stats['ingested']:,} rows ingested · {receiver.stats['dropped']:,} dropped · "
+                      f"{reader.spilled_rows:,} spilled · last batch lag {receiver.stats['last_lag_ms'] or 0:.0f} ms"
+                      + (f" · {receiver.stats['failed_batches']:,} failed batches, last error: {receiver.error!r}"
+                         if receiver.stats['failed_batches'] else ''))
+        except KeyboardInterrupt:
+            receiver.stop()
+        return 0
+    
+    if args.command == 'bench-receiver':
+        if args.protocol == 'forward' and msgpack is None:
+            print("The forward protocol needs msgpack (pip install msgpack)", file=sys.stderr)
+            return 1
+        stats, elapsed = benchmark_receiver(args.lines, args.protocol, config)
+        print(f"{args.protocol}: {stats['ingested']:,}/{args.lines:,} lines ingested in {elapsed:.2f}s "
+              f"({stats['ingested'] / max(elapsed, 1e-9):,.0f} lines/s) · {stats['batches']} batches · "
+              f"{stats['dropped']:,} dropped · {args.lines - stats['lines']:,} lost in transit · "
+              f"last batch lag {stats['last_lag_ms'] or 0:.0f} ms")
+        return 0
+    
+    if args.command == 'restore':
+        started = time.perf_counter()
+        reader, manifest, _ = read_snapshot(args.bundle, headless=True)
+        print(f"Restored {len(reader.df):,} rows from {args.bundle} in {(time.perf_counter() - started) * 1000:,.0f} ms "
+              f"(saved {manifest['created']}, compression {manifest['compression']})")
+        return 0
+    
+    reader = SkylLogReader(headless=True)
+    if not reader.process_logs(reader.load_logs_from_folder(args.folder)):
+        print(f"No logs found in {args.folder}", file=sys.stderr)
+        return 1
+    
+    if args.command == 'anomalies':
+        anomalies, elapsed = replay_anomalies(reader)
+        print(f"Replayed {len(reader.df):,} events in {elapsed:.2f}s "
+              f"({len(reader.df) / max(elapsed, 1e-9):,.0f} events/s)")
+        if len(anomalies) == 0:
+            print("No anomalies detected")
+            return 0
+        ttd = anomalies['time_to_detect'].dt.total_seconds() / 60
+        print(f"{len(anomalies)} anomalies · time-to-detect median {ttd.median():.1f} min, max {ttd.max():.1f} min")
+        print(anomalies.to_string(index=False))
+    
+    if args.command == 'snapshot':
+        started = time.perf_counter()
+        manifest = write_snapshot(reader, args.bundle, reader.get_advanced_stats(),
+                                  compression=get_config_value(config, 'performance.snapshot_compression', 'none'))
+        print(f"Saved {manifest['rows']:,} rows to {args.bundle} in {time.perf_counter() - started:.2f}s")
+    return 0
 
 if __name__ == "__main__":
+    if get_script_run_ctx() is None:
+        sys.exit(run_headless(sys.argv[1:]))
     create_dashboard()
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""Tests of online anomaly scoring, late buckets and the headless entry point"""
+
+import pandas as pd
+
+import main
+
+CONFIG = {'log_processing': {'anomaly_ewma_alpha': 0.2, 'anomaly_z_threshold': 3.5,
+                             'anomaly_warmup_buckets': 6, 'anomaly_bucket_minutes': 60}}
+START = pd.Timestamp('2024-03-04')
+
+
+def hour_rows(hour, count, service='AUTH', errors=0):
+    """count rows one minute apart from five minutes past the hour"""
+    return pd.DataFrame({
+        'timestamp': START + pd.Timedelta(hours=hour) + pd.to_timedelta(5 + pd.RangeIndex(count) % 50, unit='min'),
+        'service': service,
+        'error': [i < errors for i in range(count)],
+        'response_time': 100.0,
+    })
+
+
+def steady(hours, count=10):
+    return pd.concat([hour_rows(hour, count) for hour in range(hours)], ignore_index=True)
+
+
+def test_buckets_are_scored_when_a_later_bucket_arrives():
+    detector = main.AnomalyDetector(CONFIG)
+    detector.update(steady(3))
+    assert detector._closed == START + pd.Timedelta(hours=1)
+    assert detector._series[('AUTH', 'volume')]['level_n'] == 2
+
+    detector.update(hour_rows(3, 10))
+    assert detector._closed == START + pd.Timedelta(hours=2)
+    assert detector._series[('AUTH', 'volume')]['level_n'] == 3
+    assert detector.anomalies == [] and detector.late_rows == 0
+
+
+def test_volume_spike_is_flagged_with_its_time_to_detect():
+    detector = main.AnomalyDetector(CONFIG)
+    detector.update(steady(8))
+    detector.update(hour_rows(8, 40))
+    detector.update(hour_rows(9, 10))
+
+    table = detector.table()
+    assert table[['service', 'metric']].values.tolist() == [['AUTH', 'volume']]
+    spike = table.iloc[0]
+    assert spike['bucket'] == START + pd.Timedelta(hours=8)
+    assert spike['value'] == 40 and spike['baseline'] == 10
+    # Baseline variance is zero, so the spread is the metric's floor of 1.0
+    assert spike['z_score'] == 30
+    assert spike['time_to_detect'] == pd.Timedelta(hours=1, minutes=5)
+
+
+def test_late_rows_are_counted_and_never_rescored():
+    detector = main.AnomalyDetector(CONFIG)
+    detector.update(steady(8))
+    state = detector._series[('AUTH', 'volume')]
+    level, level_n = state['level'], state['level_n']
+
+    # A replayed batch for scored hours plus rows for the open hour
+    detector.update(pd.concat([hour_rows(2, 200), hour_rows(5, 7), hour_rows(7, 3)], ignore_index=True))
+    assert detector.late_rows == 207
+    assert state['level'] == level and state['level_n'] == level_n
+    assert detector._open['volume'].tolist() == [13]
+
+    detector.update(hour_rows(6, 500))
+    assert detector.late_rows == 707 and detector.anomalies == []
+
+
+def test_flush_scores_the_open_bucket_once():
+    detector = main.AnomalyDetector(CONFIG)
+    detector.update(steady(8))
+    detector.update(hour_rows(8, 60, errors=30))
+    assert detector.anomalies == []
+
+    detector.flush()
+    table = detector.table()
+    assert sorted(table['metric']) == ['error_rate', 'volume']
+    assert (table['detected_at'] == START + pd.Timedelta(hours=9)).all()
+    assert detector._open is None and detector._closed == START + pd.Timedelta(hours=8)
+
+    detector.flush()
+    detector.update(hour_rows(8, 5))
+    assert len(detector.anomalies) == 2 and detector.late_rows == 5
+
+
+def test_services_keep_separate_baselines():
+    detector = main.AnomalyDetector(CONFIG)
+    frames = [pd.concat([hour_rows(hour, 10), hour_rows(hour, 200, service='STORAGE')]) for hour in range(8)]
+    detector.update(pd.concat(frames, ignore_index=True))
+    detector.update(pd.concat([hour_rows(8, 200), hour_rows(8, 200, service='STORAGE')], ignore_index=True))
+    detector.flush()
+    assert detector.table()[['service', 'metric']].values.tolist() == [['AUTH', 'volume']]
+
+
+def test_headless_without_a_command_prints_usage(capsys):
+    assert main.run_headless([]) == 0
+    output = capsys.readouterr().out
+    assert output.startswith('usage:') and 'streamlit run main.py' in output
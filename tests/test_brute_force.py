@@ -0,0 +1,109 @@
+"""Tests of failed-login burst detection against a row-by-row reference"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+WINDOW = pd.Timedelta(seconds=300)
+MAX_FAILURES = 5
+COLUMNS = ['kind', 'key', 'first_failure', 'last_failure', 'failures']
+
+
+def detector(**settings):
+    config = {'brute_force_max_failures': MAX_FAILURES, 'brute_force_window_seconds': WINDOW.total_seconds()}
+    config.update({f'brute_force_{key}': value for key, value in settings.items()})
+    return main.BruteForceDetector({'security': config})
+
+
+def make_frame(seed, size=4000):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-07-01') + pd.to_timedelta(rng.integers(0, 2 * 3600, size=size), unit='s'),
+        'action': rng.choice(['LOGIN', 'LOGIN', 'UPLOAD_FILE'], size=size),
+        'ip': [f'10.0.0.{i}' for i in rng.integers(0, 50, size=size)],
+        'user': [f'user{i}' for i in rng.integers(0, 40, size=size)],
+        'error': rng.random(size) < 0.5,
+    })
+    # A steady attack from one address against one account, one attempt every 10 seconds
+    attack = pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-07-01 00:30') + pd.to_timedelta(np.arange(40) * 10, unit='s'),
+        'action': 'LOGIN', 'ip': '10.9.9.9', 'user': 'admin', 'error': True,
+    })
+    return pd.concat([frame, attack], ignore_index=True).sort_values('timestamp', kind='stable', ignore_index=True)
+
+
+def reference_incidents(frame):
+    failures = frame[frame['error'] & (frame['action'] == 'LOGIN')].sort_values('timestamp', kind='stable')
+    incidents = []
+    for kind in ['ip', 'user']:
+        for key, times in failures.groupby(kind)['timestamp']:
+            times, current = times.tolist(), None
+            for i, time in enumerate(times):
+                if current is not None and time - times[i - 1] <= WINDOW:
+                    current['last_failure'], current['failures'] = time, current['failures'] + 1
+                    continue
+                current = None
+                if i >= MAX_FAILURES - 1 and time - times[i - MAX_FAILURES + 1] <= WINDOW:
+                    current = {'kind': kind, 'key': key, 'first_failure': times[i - MAX_FAILURES + 1],
+                               'last_failure': time, 'failures': MAX_FAILURES}
+                    incidents.append(current)
+    return pd.DataFrame(incidents, columns=COLUMNS)
+
+
+def ordered(table):
+    table = table[COLUMNS].astype({'first_failure': 'datetime64[us]', 'last_failure': 'datetime64[us]'})
+    return table.sort_values(['kind', 'key', 'first_failure']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('batch_size', [5000, 500, 37])
+def test_incidents_match_the_reference_across_batches(batch_size):
+    frame = make_frame(0)
+    bursts = detector()
+    for start in range(0, len(frame), batch_size):
+        bursts.update(frame.iloc[start:start + batch_size])
+
+    expected = reference_incidents(frame)
+    assert ordered(bursts.table()).equals(ordered(expected))
+    assert bursts.incident_count == len(expected)
+    assert bursts.failed_logins == (frame['error'] & (frame['action'] == 'LOGIN')).sum()
+
+
+def test_later_failures_extend_the_open_incident():
+    bursts = detector()
+    times = pd.Timestamp('2024-07-01 00:30') + pd.to_timedelta(np.arange(40) * 10, unit='s')
+    rows = pd.DataFrame({'timestamp': times, 'action': 'LOGIN', 'ip': '10.9.9.9', 'user': 'admin', 'error': True})
+    for start in range(0, 40, 7):
+        bursts.update(rows.iloc[start:start + 7])
+    # One failure more than the window later opens a fresh incident only once a new burst completes
+    late = rows.iloc[:MAX_FAILURES].assign(
+        timestamp=times[-1] + WINDOW + pd.to_timedelta(np.arange(1, MAX_FAILURES + 1), unit='s'))
+    bursts.update(late.iloc[:MAX_FAILURES - 1])
+    assert bursts.incident_count == 2
+
+    table = bursts.table()
+    ip = table[table['kind'] == 'ip'].iloc[0]
+    assert ip['first_failure'] == times[0] and ip['last_failure'] == times[-1] and ip['failures'] == 40
+    bursts.update(late.iloc[MAX_FAILURES - 1:])
+    assert bursts.incident_count == 4
+    assert sorted(bursts.table()['failures']) == [MAX_FAILURES, MAX_FAILURES, 40, 40]
+
+
+def test_only_the_latest_incidents_are_kept():
+    frame = make_frame(1)
+    bursts = detector(max_incidents=3)
+    bursts.update(frame)
+    expected = reference_incidents(frame)
+    assert bursts.incident_count == len(expected) > 3
+    assert len(bursts.table()) == 3
+
+
+def test_idle_keys_are_evicted_first():
+    bursts = detector(max_tracked_keys=2)
+    rows = pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-07-01') + pd.to_timedelta([0, 1, 2, 3], unit='s'),
+        'action': 'LOGIN', 'ip': ['a', 'b', 'c', 'a'], 'user': 'u', 'error': True,
+    })
+    bursts.update(rows)
+    assert list(bursts._tracked['ip']) == ['c', 'a'] and bursts.evicted_keys == 1
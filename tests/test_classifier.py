@@ -0,0 +1,62 @@
+"""Tests of keyword classification of the success and error flags"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+MESSAGES = ['login succeeded', 'Upload SUCCESS', 'ſuccess', 'Task FAILED', 'quota Exceeded on volume',
+            'disk ERROR', 'retrying after error', 'all good', '', 'Straße error']
+
+
+def rows_for(messages, dtype=object, level='INFO', service='STORAGE'):
+    return pd.DataFrame({'level': level, 'action': 'UPLOAD_FILE', 'service': service,
+                         'message': pd.Series(messages, dtype=dtype)})
+
+
+@pytest.mark.parametrize('dtype', [object, 'string[pyarrow]'])
+def test_default_rules_match_lowercase_substrings(dtype):
+    classifier = main.KeywordClassifier({})
+    rows = rows_for(MESSAGES, dtype)
+    flags = classifier.classify(rows)
+    lowered = [message.lower() for message in MESSAGES]
+
+    assert flags['success'].tolist() == [('succeeded' in m or 'success' in m) for m in lowered]
+    assert flags['error'].tolist() == [any(k in m for k in ['error', 'failed', 'quota exceeded']) for m in lowered]
+    assert flags['success'].tolist()[2] is False  # U+017F only matches 's' under re.IGNORECASE
+
+
+def test_rules_and_service_overrides_in_order():
+    config = {'log_processing': {'classification': {
+        'rules': {'error': [{'level': ['ERROR']}, {'action': ['DELETE_VM'], 'value': False},
+                            {'message': ['Error', 'FAILED']}]},
+        'service_overrides': {'STORAGE': {'error': [{'message': ['retrying'], 'value': False}]}},
+    }}}
+    classifier = main.KeywordClassifier(config)
+    rows = pd.DataFrame({
+        'level': ['INFO', 'ERROR', 'INFO', 'INFO', 'INFO', 'ERROR'],
+        'action': ['UPLOAD_FILE', 'UPLOAD_FILE', 'DELETE_VM', 'UPLOAD_FILE', 'UPLOAD_FILE', 'UPLOAD_FILE'],
+        'service': ['AUTH', 'AUTH', 'AUTH', 'STORAGE', 'AUTH', 'STORAGE'],
+        'message': ['an error', 'fine', 'vm failed', 'retrying after error', 'retrying after error', 'retrying'],
+    })
+
+    assert classifier.classify(rows)['error'].tolist() == [True, True, False, False, True, False]
+
+
+@pytest.mark.parametrize('dtype', [object, 'string[pyarrow]'])
+def test_classification_matches_a_row_by_row_reference(dtype):
+    classifier = main.KeywordClassifier({})
+    rng = np.random.default_rng(7)
+    words = ['Success', 'succeeded', 'FAILED', 'error', 'Quota', 'exceeded', 'ok', 'done', 'İ', 'ß']
+    messages = [' '.join(rng.choice(words, size=rng.integers(1, 5))) for _ in range(500)]
+    levels = rng.choice(['INFO', 'ERROR', 'WARN'], size=len(messages))
+    rows = rows_for(messages, dtype).assign(level=levels)
+    flags = classifier.classify(rows)
+
+    lowered = [message.lower() for message in messages]
+    success = [('succeeded' in m or 'success' in m) for m in lowered]
+    error = [level == 'ERROR' or any(k in m for k in ['error', 'failed', 'quota exceeded'])
+             for level, m in zip(levels, lowered)]
+    assert flags['success'].tolist() == success
+    assert flags['error'].tolist() == error
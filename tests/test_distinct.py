@@ -0,0 +1,73 @@
+"""Tests of HyperLogLog distinct-count estimates against exact counts"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+BOUND = 3 * main.DistinctCounter.RELATIVE_ERROR  # three standard errors
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(11)
+    size = 60_000
+    services = rng.choice(['AUTH', 'STORAGE', 'NETWORK'], size=size, p=[0.6, 0.3, 0.1])
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-02-01') + pd.to_timedelta(rng.integers(0, 5 * 86400, size=size), unit='s'),
+        'service': services,
+        'tenant_id': rng.choice(['t1', 't2', 't3'], size=size),
+        'action': 'LOGIN',
+        'user': [f'user{i}' for i in rng.integers(0, 20_000, size=size)],
+        'ip': [f'10.{i >> 16}.{(i >> 8) & 255}.{i & 255}' for i in rng.integers(0, 40_000, size=size)],
+        'session_id': [f'{i:08x}' for i in rng.integers(0, 50, size=size)],
+        'success': True,
+        'error': False,
+    })
+
+
+@pytest.fixture(scope='module')
+def counter(frame):
+    rollups = main.RollupStore()
+    for start in range(0, len(frame), 10_000):
+        rollups.ingest(frame.iloc[start:start + 10_000])
+    return main.DistinctCounter(rollups)
+
+
+def assert_close(estimate, exact):
+    assert abs(estimate - exact) <= max(1, BOUND * exact), (estimate, exact)
+
+
+@pytest.mark.parametrize('field', ['user', 'ip', 'session_id'])
+def test_whole_load_estimates(frame, counter, field):
+    assert_close(counter.estimate(field), frame[field].nunique())
+
+
+def test_small_cardinalities_use_linear_counting(frame, counter):
+    # 50 sessions in 1024 registers: linear counting is all but exact
+    assert abs(counter.estimate('session_id') - 50) <= 2
+
+
+def test_service_and_tenant_filters(frame, counter):
+    for service in ['AUTH', 'NETWORK']:
+        assert_close(counter.estimate('user', services=[service]), frame.loc[frame['service'] == service, 'user'].nunique())
+    rows = frame[frame['tenant_id'].isin(['t1', 't3'])]
+    assert_close(counter.estimate('ip', tenants=['t1', 't3']), rows['ip'].nunique())
+    assert counter.estimate('user', services=['AUTH'], tenants=['t1']) is None
+
+
+def test_day_and_hour_ranges(frame, counter):
+    days = frame[(frame['timestamp'] >= '2024-02-02') & (frame['timestamp'] < '2024-02-04')]
+    assert_close(counter.estimate('user', start=pd.Timestamp('2024-02-02').date(),
+                                  end=pd.Timestamp('2024-02-03').date()), days['user'].nunique())
+    start, end = datetime(2024, 2, 3, 6), datetime(2024, 2, 3, 17)
+    hours = frame[(frame['timestamp'] >= start) & (frame['timestamp'] < datetime(2024, 2, 3, 18))]
+    assert_close(counter.estimate('user', start=start, end=end), hours['user'].nunique())
+    assert counter.estimate('user', start=datetime(2030, 1, 1, 0), end=datetime(2030, 1, 2, 0)) == 0
+
+
+def test_error_bound_is_twice_the_standard_error(counter):
+    assert counter.error_bound(10_000) == pytest.approx(2 * 10_000 * 1.04 / 32)
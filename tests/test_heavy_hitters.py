@@ -0,0 +1,93 @@
+"""Tests of Space-Saving summaries and windowed heavy hitters against exact counts"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+def zipf_batches(seed, batches=40, size=2000, items=5000):
+    rng = np.random.default_rng(seed)
+    return [pd.Series(np.minimum(rng.zipf(1.3, size=size), items)).map('item{}'.format) for _ in range(batches)]
+
+
+def check_bounds(summary, exact):
+    """Space-Saving guarantees for every monitored and unmonitored item"""
+    counts = summary.counts
+    truth = exact.reindex(counts.index, fill_value=0)
+    assert (counts >= truth).all() and (counts - summary.errors <= truth).all()
+    assert (exact.drop(counts.index, errors='ignore') <= summary.floor).all()
+    assert summary.floor <= summary.total / summary.capacity
+    assert summary.total == exact.sum()
+
+
+def test_summary_bounds_hold_across_batches():
+    summary = main.SpaceSaving(100)
+    batches = zipf_batches(0)
+    for batch in batches:
+        summary.update(batch.value_counts())
+    exact = pd.concat(batches).value_counts()
+
+    check_bounds(summary, exact)
+    assert len(summary.counts) == 100
+    # Every item above the floor is monitored, so the true top items are all reported
+    frequent = exact[exact > summary.floor].index
+    assert set(frequent) <= set(summary.counts.index)
+    assert set(summary.top(5)['item']) == set(exact.head(5).index)
+
+
+def test_merged_summaries_keep_the_bounds():
+    left, right = main.SpaceSaving(80), main.SpaceSaving(80)
+    batches = zipf_batches(1) + zipf_batches(2)
+    for i, batch in enumerate(batches):
+        (left if i % 2 else right).update(batch.value_counts())
+    left.merge(right)
+    check_bounds(left, pd.concat(batches).value_counts())
+
+
+def test_small_streams_are_exact():
+    summary = main.SpaceSaving(50)
+    batch = pd.Series(['a'] * 5 + ['b'] * 3 + ['c'])
+    summary.update(batch.value_counts())
+    summary.update(pd.Series(['c', 'c', 'd']).value_counts())
+    top = summary.top(10)
+    assert top['item'].tolist() == ['a', 'b', 'c', 'd'] and top['count'].tolist() == [5, 3, 3, 1]
+    assert top['error'].tolist() == [0, 0, 0, 0] and summary.floor == 0
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(3)
+    size = 20_000
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-05-01') + pd.to_timedelta(np.sort(rng.integers(0, 12 * 3600, size=size)), unit='s'),
+        'user': [f'user{i}' for i in np.minimum(rng.zipf(1.5, size=size), 300)],
+        'ip': [f'10.0.0.{i}' for i in rng.integers(0, 40, size=size)],
+        'action': rng.choice(['LOGIN', 'UPLOAD_FILE', 'CREATE_VM'], size=size),
+        'message': rng.choice(['ok', 'denied', 'timeout'], size=size),
+        'template_id': rng.integers(0, 3, size=size),
+        'error': rng.random(size) < 0.2,
+    })
+
+
+def test_windows_answer_time_ranges(frame):
+    config = {'analytics': {'heavy_hitter_capacity': 1000, 'heavy_hitter_window_minutes': 60,
+                            'heavy_hitter_windows': 8}}
+    hitters = main.HeavyHitters(config)
+    for start in range(0, len(frame), 3000):
+        hitters.update(frame.iloc[start:start + 3000])
+
+    overall = hitters.top('user', k=10)
+    exact = frame['user'].value_counts()
+    assert dict(zip(overall['item'], overall['count'])) == exact.head(10).to_dict()
+
+    start, end = pd.Timestamp('2024-05-01 06:00'), pd.Timestamp('2024-05-01 08:59')
+    # Ranges resolve to whole windows: 06:00 up to the end of the 08:00 window
+    rows = frame[(frame['timestamp'] >= start) & (frame['timestamp'] < '2024-05-01 09:00') & frame['error']]
+    top = hitters.top('error_ip', k=40, start=start, end=end)
+    assert dict(zip(top['item'], top['count'])) == rows['ip'].value_counts().to_dict()
+
+    # Only the newest 8 hourly windows are kept
+    assert list(hitters.windows) == list(pd.date_range('2024-05-01 04:00', periods=8, freq='h'))
+    assert hitters.top('user', start=pd.Timestamp('2024-05-01 01:00'), end=pd.Timestamp('2024-05-01 02:00')).empty
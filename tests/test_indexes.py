@@ -0,0 +1,187 @@
+"""Tests of load ordering, the sorted-run indexes and duplicate-line detection against full sorts and scans"""
+
+import ipaddress
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+def timestamps_in_parts(rng, part_lengths, shuffled_parts=(), nat_share=0.0):
+    """Timestamps that advance part by part, with some parts shuffled and some values missing"""
+    values = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(sum(part_lengths)) * 997, unit='ms')
+    values = values.to_numpy().copy()
+    start = 0
+    for i, length in enumerate(part_lengths):
+        if i in shuffled_parts:
+            rng.shuffle(values[start:start + length])
+        start += length
+    timestamps = pd.Series(values)
+    timestamps[rng.random(len(timestamps)) < nat_share] = pd.NaT
+    return timestamps
+
+
+def expected_order(timestamps):
+    return timestamps.sort_values(kind='stable', na_position='last').index.to_numpy()
+
+
+def test_sorted_run_order_leaves_in_order_parts_alone():
+    timestamps = timestamps_in_parts(np.random.default_rng(0), [100, 50, 0, 75])
+    order, stats = main.sorted_run_order(timestamps, [100, 50, 0, 75])
+
+    assert order is None
+    assert stats['runs'] == 1 and stats['sorted_parts'] == 4 and stats['in_order_ratio'] == 1.0
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sorted_run_order_matches_stable_sort(seed):
+    rng = np.random.default_rng(seed)
+    lengths = list(rng.integers(0, 400, size=12))
+    timestamps = timestamps_in_parts(rng, lengths, shuffled_parts={1, 4, 9}, nat_share=0.05)
+    # Files read concurrently: the parts of different files interleave in time
+    parts = np.split(np.arange(len(timestamps)), np.cumsum(lengths)[:-1])
+    rng.shuffle(parts)
+    timestamps = timestamps.take(np.concatenate(parts)).reset_index(drop=True)
+    # Repeated values must keep their input order
+    timestamps[rng.random(len(timestamps)) < 0.1] = timestamps.iloc[0]
+
+    order, _ = main.sorted_run_order(timestamps, [len(part) for part in parts])
+    assert np.array_equal(order, expected_order(timestamps))
+
+
+def test_sorted_runs_range_matches_scan():
+    rng = np.random.default_rng(1)
+    runs = main.SortedRuns()
+    keys = []
+    for _ in range(300):
+        batch_keys = rng.integers(0, 10_000, size=int(rng.integers(1, 50)))
+        total = sum(map(len, keys))
+        runs.add(batch_keys, np.arange(total, total + len(batch_keys)))
+        keys.append(batch_keys)
+    keys = np.concatenate(keys)
+    labels = np.arange(len(keys))
+
+    assert len(runs.runs) <= 2 * np.log2(len(keys))
+    sizes = [len(run_keys) for run_keys, _ in runs.runs]
+    assert all(older > main.SortedRuns.TIER * newer for older, newer in zip(sizes, sizes[1:]))
+    for low, high in [(0, 10_000), (500, 500), (1234, 4321), (9_999, 20_000), (-5, -1)]:
+        expected = labels[(keys >= low) & (keys <= high)]
+        assert np.array_equal(np.sort(runs.range(low, high)), expected)
+    runs.compact()
+    assert len(runs.runs) == 1 and np.array_equal(np.sort(runs.range(1234, 4321)),
+                                                  labels[(keys >= 1234) & (keys <= 4321)])
+
+
+def test_empty_runs_return_no_labels():
+    assert len(main.SortedRuns().range(0, 10)) == 0
+
+
+def test_request_id_lookup_matches_scan():
+    rng = np.random.default_rng(3)
+    uuids = [f'{i:08x}-{j:04x}-4000-8000-{k:012x}' for i, j, k in rng.integers(0, 1 << 16, size=(3000, 3))]
+    frame = pd.DataFrame({'uuid': uuids})
+    frame.loc[::7, 'uuid'] = frame.loc[::7, 'uuid'].str.upper()
+    frame.loc[5, 'uuid'] = None
+    frame['session_id'] = frame['uuid'].str[:8]
+    # Row labels of a real load: offset per batch, not a plain range
+    frame.index = np.arange(len(frame)) * 3 + 100
+
+    index = main.RequestIdIndex()
+    for start in range(0, len(frame), 250):
+        index.add(frame.iloc[start:start + 250])
+
+    for label in frame.index[[0, 7, 1234, 2999]]:
+        uuid = frame.loc[label, 'uuid']
+        expected = frame.index[frame['uuid'].str.lower() == uuid.lower()]
+        assert np.array_equal(np.sort(index.lookup('uuid', uuid.swapcase())), expected)
+        session = frame.loc[label, 'session_id']
+        expected = frame.index[frame['session_id'].str.lower() == session.lower()]
+        assert np.array_equal(np.sort(index.lookup('session_id', session)), expected)
+    assert len(index.lookup('uuid', 'ffffffff-ffff-4fff-8fff-ffffffffffff')) == 0
+    assert index.lookup('uuid', '').tolist() == [frame.index[5]]
+
+
+def ip_frame():
+    rng = np.random.default_rng(5)
+    ips = [f'10.{a}.{b}.{c}' for a, b, c in rng.integers(0, 4, size=(2000, 3))]
+    ips += ['255.255.255.255', '0.0.0.1', '0.0.0.0', '192.0.2.77', '10.1.2.3', '::1', '2001:db8::5',
+            '2001:db8:1::9', 'unknown', '']
+    frame = pd.DataFrame({'ip': rng.permutation(ips)}, index=np.arange(len(ips)) * 2 + 11)
+    frame['ip_num'] = main.ipv4_to_uint32(frame['ip'])
+    return frame
+
+
+def ip_index(frame):
+    index = main.IpIndex()
+    for start in range(0, len(frame), 128):
+        index.add(frame.iloc[start:start + 128])
+    return index
+
+
+def test_ip_lookup_matches_the_ipaddress_module():
+    frame = ip_frame()
+    index = ip_index(frame)
+    for text in ['0.0.0.0/0', '10.1.2.3/32', '255.255.255.255/32', '0.0.0.0/32', '10.2.0.0/16, 2001:db8::/32',
+                 '::/0', '::1', '192.168.0.0/16', '10.3.3.0/24 10.0.0.0/31']:
+        networks = main.parse_networks(text)
+        expected = frame.index[[main.ip_in_networks(ip, networks) for ip in frame['ip']]]
+        assert np.array_equal(index.lookup(networks, frame), expected), text
+        assert np.array_equal(frame.index[main.network_mask(frame, networks)], expected), text
+
+
+def test_subnet_counts_match_the_ipaddress_module():
+    frame = ip_frame()
+    index = ip_index(frame)
+    ipv4 = frame.loc[frame['ip_num'] != 0, 'ip']
+    for prefix in [0, 8, 23, 24, 31, 32]:
+        expected = ipv4.map(lambda ip: str(ipaddress.ip_network(f'{ip}/{prefix}', strict=False))).value_counts()
+        assert index.subnet_counts(prefix).to_dict() == expected.to_dict()
+        assert main.ipv4_subnet_counts(frame['ip_num'], prefix).to_dict() == expected.to_dict()
+    assert main.IpIndex().subnet_counts(24).empty
+
+
+def test_line_deduplicator_matches_set():
+    rng = np.random.default_rng(2)
+    dedup = main.LineDeduplicator()
+    seen = set()
+    for _ in range(200):
+        hashes = rng.integers(0, 5_000, size=int(rng.integers(1, 100))).astype(np.uint64)
+        expected = []
+        for value in hashes.tolist():
+            expected.append(value not in seen)
+            seen.add(value)
+        assert dedup.first_seen(hashes).tolist() == expected
+    assert len(dedup._runs) <= 2 * np.log2(len(seen))
+
+
+def test_line_hashes_depend_only_on_the_line():
+    lines = pd.Series(['a|b|c', 'a|b|c', 'a|b|d'])
+    hashes = main.line_hashes(lines)
+    assert hashes.dtype == np.uint64 and hashes[0] == hashes[1] != hashes[2]
+
+
+def test_bloom_filter_has_no_false_negatives_and_grows(tmp_path):
+    bloom = main.ScalableBloomFilter(str(tmp_path / 'lines.npz'), capacity=1000, error_rate=0.01)
+    first = np.arange(5000, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+
+    assert bloom.add(np.concatenate([first, first[:10]])).tolist() == [True] * 5000 + [False] * 10
+    assert not bloom.add(first).any()
+    assert bloom.stats()['lines'] == 5000 and bloom.stats()['stages'] == 3
+
+    others = np.arange(5000, 25000, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    false_positives = 1 - bloom.add(others).mean()
+    assert false_positives < 0.01
+
+
+def test_bloom_filter_save_and_reload(tmp_path):
+    path = str(tmp_path / 'dedup' / 'lines.npz')
+    bloom = main.ScalableBloomFilter(path, capacity=100, error_rate=0.001)
+    hashes = main.line_hashes(pd.Series(main.synthetic_log_lines(300)))
+    bloom.add(hashes)
+    bloom.save()
+
+    reloaded = main.ScalableBloomFilter(path, capacity=100, error_rate=0.001)
+    assert reloaded.stats() == bloom.stats()
+    assert not reloaded.add(hashes).any()
@@ -0,0 +1,119 @@
+"""Tests of the response-time sketches against exact bin counts and quantiles"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+ACCURACY = 0.01
+DAY = pd.Timestamp('2024-04-01')
+
+
+def sketches(retention_days=90):
+    return main.ResponseTimeSketches({'performance': {'latency_sketch_accuracy': ACCURACY},
+                                      'analytics': {'raw_logs_retention_days': retention_days}})
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(8)
+    size = 30_000
+    response_time = np.round(rng.lognormal(5, 1.5, size=size))
+    response_time[rng.random(size) < 0.1] = np.nan
+    return pd.DataFrame({
+        'timestamp': DAY + pd.to_timedelta(rng.integers(0, 8 * 86400, size=size), unit='s'),
+        'service': rng.choice(['AUTH', 'STORAGE'], size=size),
+        'action': rng.choice(['LOGIN', 'UPLOAD_FILE', 'CREATE_VM'], size=size),
+        'response_time': response_time,
+    })
+
+
+@pytest.fixture(scope='module')
+def store(frame):
+    store = sketches()
+    # Batches arrive out of order and overlap the same cells
+    for start in np.random.default_rng(9).permutation(np.arange(0, len(frame), 2500)):
+        store.update(frame.iloc[start:start + 2500])
+    return store
+
+
+def expected_counts(store, frame, start=None, end=None, services=None):
+    rows = frame[frame['response_time'].notna()]
+    if start is not None:
+        rows = rows[rows['timestamp'] >= start]
+    if end is not None:
+        rows = rows[rows['timestamp'] < end]
+    if services:
+        rows = rows[rows['service'].isin(services)]
+    return np.bincount(store.bin_index(rows['response_time'].to_numpy()), minlength=store.bins)
+
+
+def hour(day, hour_of_day, minute=0):
+    return DAY + pd.Timedelta(days=day, hours=hour_of_day, minutes=minute)
+
+
+@pytest.mark.parametrize('start, end', [
+    (None, None),
+    (hour(1, 5, 30), hour(4, 17, 10)),    # partial days at both ends
+    (hour(2, 2), hour(2, 2, 59)),         # a single hour
+    (hour(2, 22), hour(3, 3)),            # across midnight without a whole day
+    (hour(1, 0), hour(2, 23)),            # whole days only
+    (None, hour(2, 12)),
+    (hour(5, 13), None),
+])
+def test_range_counts_equal_the_rows_in_the_covered_hours(frame, store, start, end):
+    # A range covers whole hours, from the start's hour through the end's hour
+    lo = start.floor('h') if start is not None else None
+    hi = end.floor('h') + pd.Timedelta(hours=1) if end is not None else None
+    assert np.array_equal(store.sketch(start, end), expected_counts(store, frame, lo, hi))
+
+
+def test_service_filters(frame, store):
+    counts = store.sketch(hour(1, 3), hour(6, 20), services=['STORAGE'])
+    assert np.array_equal(counts, expected_counts(store, frame, hour(1, 3), hour(6, 21), services=['STORAGE']))
+
+
+def test_quantiles_are_within_the_relative_accuracy(frame, store):
+    values = np.sort(np.maximum(frame['response_time'].dropna().to_numpy(), 1.0))
+    estimates = store.quantiles(store.sketch())
+    for q, estimate in estimates.items():
+        exact = values[int(np.ceil(q * len(values))) - 1]
+        assert abs(estimate - exact) <= ACCURACY * exact * (1 + 1e-9), (q, estimate, exact)
+    assert np.isnan(store.quantiles(np.zeros(store.bins, dtype=np.int64))[0.5])
+
+
+def test_sla_breach_rate_counts_bins_above_the_threshold(frame, store):
+    counts = store.sketch()
+    values = frame['response_time'].dropna()
+    # The threshold sits between bin values, so only values within the accuracy of it can differ
+    rate = store.sla_breach_rate(counts)
+    assert (values > store.sla_ms * (1 + ACCURACY)).mean() <= rate <= (values > store.sla_ms * (1 - ACCURACY)).mean()
+
+
+def test_daily_timeline(frame, store):
+    timeline = store.timeline('day').set_index('bucket')
+    assert timeline.index.tolist() == list(pd.date_range(DAY, periods=8, freq='D'))
+    rows = frame.dropna(subset=['response_time'])
+    for day, values in rows.groupby(rows['timestamp'].dt.floor('D'))['response_time']:
+        values = np.sort(np.maximum(values.to_numpy(), 1.0))
+        exact = values[int(np.ceil(0.5 * len(values))) - 1]
+        assert abs(timeline.loc[day, 'p50_ms'] - exact) <= ACCURACY * exact * (1 + 1e-9)
+
+
+def test_hour_cells_past_retention_are_dropped_and_ranges_round_to_days(frame):
+    store = sketches(retention_days=3)
+    for start in range(0, len(frame), 5000):
+        store.update(frame.iloc[start:start + 5000])
+
+    # The newest hour is on day 7, so hour cells before day 4 are gone
+    cutoff = hour(4, 0)
+    assert store._hours_from == cutoff
+    assert all(bucket >= cutoff for cells in store._hours.values() for bucket in cells)
+    assert store.timeline('hour')['bucket'].min() == cutoff
+
+    # Edges before the cutoff round out to whole days, later ones stay hourly
+    assert np.array_equal(store.sketch(hour(2, 10), hour(3, 5)), expected_counts(store, frame, hour(2, 0), hour(4, 0)))
+    assert np.array_equal(store.sketch(hour(2, 10), hour(5, 5)), expected_counts(store, frame, hour(2, 0), hour(5, 6)))
+    assert np.array_equal(store.sketch(hour(4, 10), hour(5, 5)), expected_counts(store, frame, hour(4, 10), hour(5, 6)))
+    assert np.array_equal(store.sketch(), expected_counts(store, frame))
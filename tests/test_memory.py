@@ -0,0 +1,136 @@
+"""Tests of the memory governor's relief escalation against fake datasets, streams and caches"""
+
+import time
+
+import pytest
+
+import main
+
+MB = 1024 ** 2
+
+
+class FakeCache:
+    """The clear_memory/stats subset of ResultCache"""
+
+    def __init__(self, size):
+        self.size = size
+
+    def clear_memory(self):
+        released, self.size = self.size, 0
+        return released
+
+    def stats(self):
+        return {'bytes': self.size}
+
+
+class FakeReader:
+    """A loaded dataset or streamed reader holding memory_bytes; spilling halves it"""
+
+    sample_stride = 1
+
+    def __init__(self, size):
+        self.memory_bytes = size
+        self.spilled = 0
+
+    def spill_oldest(self, fraction):
+        self.memory_bytes -= int(self.memory_bytes * fraction)
+        self.spilled += 100
+        return 100
+
+
+@pytest.fixture
+def world(monkeypatch):
+    """Governor with a 100 MB budget (soft limit 80 MB) measuring its own footprint"""
+    registry = main.SharedDatasetRegistry(session_timeout_seconds=3600)
+    metrics = main.MetricsRegistry()
+    cache = FakeCache(0)
+    monkeypatch.setattr(main, 'psutil', None)
+    monkeypatch.setattr(main, 'get_dataset_registry', lambda: registry)
+    monkeypatch.setattr(main, 'get_metrics', lambda: metrics)
+    monkeypatch.setattr(main, 'get_result_cache', lambda: cache)
+    governor = main.MemoryGovernor(budget_bytes=100 * MB, soft_ratio=0.8)
+    return governor, registry, cache, metrics
+
+
+def attach(registry, name, size, last_seen):
+    registry.attach(name, name, lambda: FakeReader(size))
+    # Ordered by last_seen, all well inside the session timeout
+    registry._sessions[name]['last_seen'] = time.time() - 100 + last_seen
+
+
+def test_nothing_is_released_under_the_soft_limit(world):
+    governor, registry, cache, _ = world
+    cache.size = 30 * MB
+    attach(registry, 'a', 40 * MB, last_seen=1)
+
+    assert not governor.over_soft_limit()
+    assert governor.relieve() == []
+    assert cache.size == 30 * MB and registry.stats()['datasets'] == 1
+
+
+def test_clearing_the_result_cache_comes_first(world):
+    governor, registry, cache, _ = world
+    cache.size = 30 * MB
+    attach(registry, 'a', 60 * MB, last_seen=1)
+
+    assert governor.over_soft_limit() and not governor.over_hard_limit()
+    assert governor.relieve() == ['cleared 30 MB of cached results']
+    assert registry.stats()['datasets'] == 1
+    assert governor.usage() == 60 * MB
+
+
+def test_least_recent_datasets_go_next_sparing_the_protected_one(world):
+    governor, registry, cache, _ = world
+    cache.size = 5 * MB
+    attach(registry, 'oldest', 10 * MB, last_seen=1)
+    attach(registry, 'mine', 30 * MB, last_seen=2)
+    attach(registry, 'older', 20 * MB, last_seen=3)
+    attach(registry, 'newest', 35 * MB, last_seen=4)
+
+    # 100 MB used: 20 MB over the soft limit takes the cache and two datasets, skipping 'mine'
+    actions = governor.relieve(protect='mine')
+    assert actions == ['cleared 5 MB of cached results', 'released a shared dataset of 10 MB',
+                       'released a shared dataset of 20 MB']
+    assert sorted(registry._entries) == ['mine', 'newest']
+    assert registry.touch('oldest') is None and registry.touch('mine') is not None
+    assert not governor.over_soft_limit()
+
+
+def test_streams_are_spilled_when_nothing_else_is_left(world):
+    governor, registry, cache, metrics = world
+    cache.size = 4 * MB
+    attach(registry, 'mine', 10 * MB, last_seen=1)
+    stream = FakeReader(80 * MB)
+    governor.register_stream(stream)
+
+    actions = governor.relieve(protect='mine')
+    assert actions == ['cleared 4 MB of cached results', 'moved the oldest 100 streamed rows to the Parquet archive']
+    assert stream.memory_bytes == 40 * MB and registry.stats()['datasets'] == 1
+    relief = metrics.snapshot()['skylus_memory_relief_total']
+    assert dict(relief) == {(('action', 'cache'),): 1, (('action', 'spill'),): 1}
+    assert governor.status()['recent_actions'] == actions
+
+
+def test_streams_are_left_alone_once_enough_is_released(world):
+    governor, registry, cache, _ = world
+    attach(registry, 'a', 30 * MB, last_seen=1)
+    stream = FakeReader(60 * MB)
+    governor.register_stream(stream)
+
+    assert governor.relieve() == ['released a shared dataset of 30 MB']
+    assert stream.spilled == 0
+
+
+def test_relief_rounds_are_spaced_by_the_cooldown(world, monkeypatch):
+    governor, registry, cache, _ = world
+    stream = FakeReader(200 * MB)
+    governor.register_stream(stream)
+    now = [1000.0]
+    monkeypatch.setattr(main.time, 'time', lambda: now[0])
+
+    assert len(governor.relieve()) == 1
+    # Still over the limit, but the first round has not had time to show in RSS
+    assert governor.relieve() == []
+    now[0] += governor.COOLDOWN_SECONDS
+    assert len(governor.relieve()) == 1
+    assert stream.spilled == 200
@@ -0,0 +1,82 @@
+"""Tests of the Prometheus text exposition rendered by the metrics registry"""
+
+import re
+
+import main
+
+SAMPLE = re.compile(r'^([a-z_]+)(\{(?:[a-z_]+="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+
+def samples(text):
+    """(name, labels text, value) of every sample line, checking the line grammar on the way"""
+    rows = []
+    for line in text.splitlines():
+        if line.startswith('#'):
+            assert re.match(r'^# (HELP [a-z_]+ .+|TYPE [a-z_]+ (counter|gauge|histogram))$', line), line
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        rows.append((match.group(1), match.group(2) or '', match.group(3)))
+    return rows
+
+
+def test_every_metric_is_declared_once():
+    text = main.MetricsRegistry().render()
+    assert text.endswith('\n')
+    for name, (kind, help_text, _) in main.METRIC_DEFINITIONS.items():
+        assert text.count(f'# HELP {name} ') == 1 and f'# HELP {name} {help_text}\n' in text
+        assert f'# TYPE {name} {kind}\n' in text
+    assert samples(text) == []
+
+
+def test_counters_gauges_and_label_escaping():
+    registry = main.MetricsRegistry()
+    registry.inc('skylus_rows_ingested_total', 5, path='load')
+    registry.inc('skylus_rows_ingested_total', 7, path='load')
+    registry.inc('skylus_lines_parsed_total', 3)
+    registry.inc('skylus_duplicate_lines_total', 2, scope='a "quoted"\\path\nnext')
+    registry.set('skylus_dataset_memory_bytes', 1.5e9)
+    registry.set('skylus_shared_datasets', float('nan'))
+    registry.set('skylus_active_sessions', float('-inf'))
+    registry.set('skylus_memory_budget_bytes', 0.1)
+    rows = samples(registry.render())
+
+    assert ('skylus_rows_ingested_total', '{path="load"}', '12') in rows
+    assert ('skylus_lines_parsed_total', '', '3') in rows
+    assert ('skylus_duplicate_lines_total', '{scope="a \\"quoted\\"\\\\path\\nnext"}', '2') in rows
+    assert ('skylus_dataset_memory_bytes', '', '1500000000.0') in rows
+    assert ('skylus_shared_datasets', '', 'NaN') in rows
+    assert ('skylus_active_sessions', '', '-Inf') in rows
+    assert ('skylus_memory_budget_bytes', '', '0.1') in rows
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = main.MetricsRegistry()
+    buckets = main.METRIC_DEFINITIONS['skylus_tab_render_seconds'][2]
+    values = [0.001, 0.005, 0.0051, 0.3, 0.3, 11.0, 99.0]
+    for value in values:
+        registry.observe('skylus_tab_render_seconds', value, tab='security')
+    rows = [row for row in samples(registry.render()) if row[0].startswith('skylus_tab_render_seconds')]
+
+    expected = [sum(value <= bound for value in values) for bound in buckets] + [len(values)]
+    bucket_rows = [row for row in rows if row[0].endswith('_bucket')]
+    assert [row[1] for row in bucket_rows] == [f'{{tab="security",le="{bound}"}}' for bound in list(buckets) + ['+Inf']]
+    assert [int(row[2]) for row in bucket_rows] == expected
+    assert ('skylus_tab_render_seconds_sum', '{tab="security"}', repr(sum(values))) in rows
+    assert ('skylus_tab_render_seconds_count', '{tab="security"}', '7') in rows
+
+
+def test_collectors_and_derived_hit_ratios():
+    registry = main.MetricsRegistry()
+    registry.inc('skylus_cache_requests_total', 3, cache='template', result='hit')
+    registry.inc('skylus_cache_requests_total', 1, cache='template', result='miss')
+    registry.inc('skylus_cache_requests_total', 2, cache='dataset', result='miss')
+    sessions = [4]
+    registry.add_collector(lambda: {'skylus_active_sessions': {(): sessions[0]}})
+    rows = samples(registry.render())
+
+    assert ('skylus_cache_hit_ratio', '{cache="template"}', '0.75') in rows
+    assert ('skylus_cache_hit_ratio', '{cache="dataset"}', '0.0') in rows
+    assert ('skylus_active_sessions', '', '4') in rows
+    sessions[0] = 9
+    assert ('skylus_active_sessions', '', '9') in samples(registry.render())
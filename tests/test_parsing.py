@@ -0,0 +1,80 @@
+"""Tests of the chunked parser and the incremental line decoder"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+LINES = [
+    '2024-01-01 10:15:30,250|INFO|6f1c2a9e-0000-4000-8000-000000000001|AUTH|alice|tenant1|10.0.0.7|'
+    'Mozilla/5.0 (Windows NT 10.0) Chrome/120|LOGIN|LOGIN succeeded in 120ms',
+    'not a log line',
+    '2024-01-01 00:00:00,000|INFO|only|four|fields',
+    '2024-13-45 99:00:00,000|WARN|u-1|STORAGE|bob|t2|::1||UPLOAD_FILE|upload failed, no timing',
+    '2024-01-02 23:59:59,999|ERROR|abcdef12-3456|COMPUTE|carol|t3|192.168.1.20|'
+    'python-requests/2.31|CREATE_VM|quota exceeded|with a pipe',
+]
+
+
+@pytest.fixture
+def reader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the reader creates ./logs next to where it runs
+    return main.SkylLogReader(headless=True)
+
+
+def test_chunk_parser_extracts_fields(reader):
+    chunk = reader.parse_log_chunk(LINES, 'app.log')
+
+    assert len(chunk) == 3 and chunk.index.tolist() == [0, 1, 2]
+    assert chunk['raw_line'].tolist() == [LINES[0], LINES[3], LINES[4]]
+    assert chunk['timestamp'].iloc[0] == pd.Timestamp('2024-01-01 10:15:30.250')
+    assert pd.isna(chunk['timestamp'].iloc[1]) and chunk['date'].iloc[1] is None
+    assert chunk['hour'].tolist()[0] == 10
+    assert chunk['day_of_week'].where(chunk['timestamp'].notna(), '').tolist() == ['Monday', '', 'Tuesday']
+    assert chunk['service'].tolist() == ['AUTH', 'STORAGE', 'COMPUTE']
+    assert chunk['user_agent'].tolist()[1] == ''
+    assert chunk['message'].tolist()[2] == 'quota exceeded|with a pipe'
+    assert chunk['browser'].tolist() == ['Chrome', 'Other', 'API Client']
+    assert chunk['os'].tolist() == ['Windows', 'Other', 'API']
+    assert np.array_equal(chunk['response_time'].to_numpy(dtype=float), [120, np.nan, np.nan], equal_nan=True)
+    assert chunk['success'].tolist() == [True, False, False]
+    assert chunk['error'].tolist() == [False, True, True]
+    assert chunk['session_id'].tolist() == ['6f1c2a9e', 'u-1', 'abcdef12']
+    assert chunk['ip_num'].tolist() == [0x0A000007, 0, 0xC0A80114]
+
+
+def test_chunk_parser_returns_none_when_nothing_matches(reader):
+    assert reader.parse_log_chunk(['garbage', ''], 'app.log') is None
+
+
+@pytest.mark.parametrize('block_bytes', [1, 2, 3, 5, 7, 64])
+def test_line_decoder_keeps_characters_split_across_blocks(reader, monkeypatch, block_bytes):
+    monkeypatch.setattr(main, 'READ_BLOCK_BYTES', block_bytes)
+    reader.chunk_lines = 2
+    text = 'héllo wörld ✓\n   \n日本語のログ 🚀\r\n\nñandú\nlast line without newline'
+    chunks = list(reader.read_line_chunks(io.BytesIO(text.encode('utf-8'))))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert [line for chunk in chunks for line in chunk] == [
+        'héllo wörld ✓', '日本語のログ 🚀', 'ñandú', 'last line without newline']
+
+
+def test_line_decoder_drops_invalid_bytes(reader, monkeypatch):
+    monkeypatch.setattr(main, 'READ_BLOCK_BYTES', 2)
+    stream = io.BytesIO(b'ok \xff line\n\xe2\x9c\x93 done\n')
+    assert [line for chunk in reader.read_line_chunks(stream) for line in chunk] == ['ok  line', '✓ done']
+
+
+def test_large_sources_parse_chunk_by_chunk(reader, monkeypatch):
+    monkeypatch.setattr(main, 'READ_BLOCK_BYTES', 4096)
+    reader.chunk_lines = 1000
+    lines = main.synthetic_log_lines(4500)
+    data = ('\n'.join(lines) + '\n').encode('utf-8')
+    frames, line_count, parsed_count, memory_bytes = reader.parse_source('big.log', lambda: io.BytesIO(data))
+
+    assert [len(frame) for frame in frames] == [1000, 1000, 1000, 1000, 500]
+    assert line_count == parsed_count == 4500 and memory_bytes > 0
+    assert pd.concat(frames)['raw_line'].tolist() == lines
@@ -0,0 +1,105 @@
+"""Loopback tests of LogReceiver framing over TCP, UDP and the Fluentd forward protocol"""
+
+import gzip
+import socket
+import time
+
+import pytest
+
+import main
+
+msgpack = pytest.importorskip("msgpack")
+
+CONFIG = {'log_processing': {'receiver': {'flush_interval_ms': 20}}}
+
+
+@pytest.fixture
+def receiver():
+    received = []
+    receiver = main.LogReceiver(lambda lines: received.extend(lines) or len(lines), CONFIG,
+                                host='127.0.0.1', tcp_port=0, udp_port=0, forward_port=0).start()
+    receiver.received = received
+    yield receiver
+    receiver.stop()
+
+
+def wait_for(receiver, count, timeout=5):
+    deadline = time.time() + timeout
+    while receiver.stats['ingested'] + receiver.stats['dropped'] < count and time.time() < deadline:
+        time.sleep(0.01)
+    return receiver.received
+
+
+def test_tcp_joins_lines_split_across_reads(receiver):
+    with socket.create_connection(('127.0.0.1', receiver.ports['tcp'])) as sock:
+        sock.sendall(b'first line\nsecond ')
+        time.sleep(0.05)
+        sock.sendall(b'line\n\n  third line  ')
+    assert wait_for(receiver, 3) == ['first line', 'second line', 'third line']
+
+
+def test_tcp_send_lines_round_trip(receiver):
+    lines = main.synthetic_log_lines(2500)
+    main.send_lines(lines, port=receiver.ports['tcp'], protocol='tcp', batch_lines=700)
+    assert wait_for(receiver, len(lines)) == lines
+
+
+def test_udp_datagram_carries_several_lines(receiver):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(b'one\ntwo\n', ('127.0.0.1', receiver.ports['udp']))
+        sock.sendto('três\n'.encode('utf-8'), ('127.0.0.1', receiver.ports['udp']))
+    assert sorted(wait_for(receiver, 3)) == ['one', 'três', 'two']
+
+
+def test_udp_send_lines_packs_datagrams(receiver):
+    lines = main.synthetic_log_lines(300)
+    main.send_lines(lines, port=receiver.ports['udp'], protocol='udp')
+    assert sorted(wait_for(receiver, len(lines))) == sorted(lines)
+
+
+def test_forward_packed_forward_is_acknowledged(receiver):
+    lines = main.synthetic_log_lines(1200)
+    main.send_lines(lines, port=receiver.ports['forward'], protocol='forward', batch_lines=500)
+    assert wait_for(receiver, len(lines)) == lines
+
+
+def test_forward_message_forward_and_gzip_modes(receiver):
+    now = int(time.time())
+    packed = b''.join(msgpack.packb([now, {'message': f'packed {i}'}]) for i in range(2))
+    messages = [
+        ['app', now, {'message': 'message mode'}],
+        ['app', [[now, {'log': 'forward mode'}], [now, {'other': 'no line'}]], {'chunk': 'c1'}],
+        ['app', gzip.compress(packed), {'compressed': 'gzip', 'chunk': 'c2'}],
+    ]
+    with socket.create_connection(('127.0.0.1', receiver.ports['forward'])) as sock:
+        stream = b''.join(msgpack.packb(message) for message in messages)
+        # Split mid-message so the unpacker has to resume across reads
+        sock.sendall(stream[:7])
+        time.sleep(0.05)
+        sock.sendall(stream[7:])
+        acks = msgpack.Unpacker(raw=False)
+        replies = []
+        while len(replies) < 2:
+            acks.feed(sock.recv(4096))
+            replies.extend(acks)
+    assert replies == [{'ack': 'c1'}, {'ack': 'c2'}]
+    assert wait_for(receiver, 4) == ['message mode', 'forward mode', 'packed 0', 'packed 1']
+
+
+def test_sink_failure_counts_batch_as_dropped(capsys):
+    def failing_sink(lines):
+        raise RuntimeError('sink down')
+    receiver = main.LogReceiver(failing_sink, CONFIG, host='127.0.0.1', tcp_port=0, udp_port=None,
+                                forward_port=None).start()
+    receiver.received = []
+    try:
+        main.send_lines(['a', 'b', 'c'], port=receiver.ports['tcp'], protocol='tcp')
+        wait_for(receiver, 3)
+    finally:
+        receiver.stop()
+    assert receiver.stats['dropped'] == 3
+    assert receiver.stats['ingested'] == 0
+    assert isinstance(receiver.error, RuntimeError)
+    assert receiver.stats['failed_batches'] == 1
+    assert receiver.metrics()['skylus_receiver_failed_batches_total'] == {(): 1}
+    assert capsys.readouterr().err == ''
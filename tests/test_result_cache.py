@@ -0,0 +1,161 @@
+"""Tests of ResultCache's memory and Redis tiers against an in-process fake Redis"""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import main
+
+
+class FakeRedis:
+    """The get/set/pttl/exists/delete subset of redis-py the result cache uses, with expiry"""
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at)
+        self.fail = False
+
+    def _live(self, key):
+        if self.fail:
+            raise ConnectionError("redis unavailable")
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and self._live(key) is not None:
+            return None
+        self._live(key)
+        self.data[key] = (value.encode() if isinstance(value, str) else value,
+                          time.time() + px / 1000 if px else None)
+        return True
+
+    def pttl(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+
+    def exists(self, key):
+        return int(self._live(key) is not None)
+
+    def delete(self, key):
+        self._live(key)
+        return int(self.data.pop(key, None) is not None)
+
+
+def make_cache(redis_client=None, **options):
+    return main.ResultCache({'stats': 60, 'short': 0.2}, redis_client=redis_client, **options)
+
+
+def test_memory_tier_serves_repeats():
+    cache = make_cache()
+    calls = []
+    compute = lambda: calls.append(1) or {'rows': 3}
+
+    assert cache.get_or_compute('stats', ('k', 1), compute) == ({'rows': 3}, 'computed')
+    assert cache.get_or_compute('stats', ('k', 1), compute) == ({'rows': 3}, 'memory')
+    assert cache.get_or_compute('stats', ('k', 2), compute)[1] == 'computed'
+    assert len(calls) == 2
+
+
+def test_redis_tier_is_shared_between_replicas():
+    redis = FakeRedis()
+    first, second = make_cache(redis), make_cache(redis)
+    frame = pd.DataFrame({'service': ['AUTH', 'STORAGE'], 'count': [3, 4]})
+
+    assert first.get_or_compute('stats', 'key', lambda: frame)[1] == 'computed'
+    value, source = second.get_or_compute('stats', 'key', lambda: pytest.fail("recomputed"))
+    assert source == 'redis' and value.equals(frame)
+    assert second.get_or_compute('stats', 'key', lambda: pytest.fail("recomputed"))[1] == 'memory'
+
+    first.clear_memory()
+    assert first.get_or_compute('stats', 'key', lambda: pytest.fail("recomputed"))[1] == 'redis'
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_values_round_trip_through_redis(compress):
+    redis = FakeRedis()
+    value = {'frame': pd.DataFrame({'a': [1.5, None]}), 'nested': [1, (2, 3)], 'text': 'ünïcode'}
+    make_cache(redis, compress=compress).put('stats', 'key', value)
+    restored, source = make_cache(redis).get_or_compute('stats', 'key', lambda: pytest.fail("recomputed"))
+
+    assert source == 'redis'
+    assert restored['frame'].equals(value['frame']) and restored['nested'] == value['nested']
+    assert restored['text'] == value['text']
+
+
+def test_entries_expire_with_their_namespace_ttl():
+    redis = FakeRedis()
+    cache = make_cache(redis)
+    cache.get_or_compute('short', 'key', lambda: 1)
+    assert cache.get_or_compute('short', 'key', lambda: 2) == (1, 'memory')
+    time.sleep(0.3)
+    assert cache.get_or_compute('short', 'key', lambda: 2) == (2, 'computed')
+
+
+def test_memory_tier_stays_within_max_bytes():
+    cache = make_cache(max_bytes=4000, compress=False)
+    for i in range(20):
+        cache.get_or_compute('stats', i, lambda: b'x' * 500)
+    stats = cache.stats()
+    assert stats['bytes'] <= 4000 and 0 < stats['entries'] < 20
+    assert cache.get_or_compute('stats', 19, lambda: None)[1] == 'memory'
+    assert cache.get_or_compute('stats', 0, lambda: b'y')[1] == 'computed'
+
+
+def test_concurrent_misses_compute_once():
+    cache = make_cache(FakeRedis())
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('stats', 'key', compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ['computed'] + ['memory'] * 7
+
+
+def test_waits_for_the_replica_holding_the_lock(monkeypatch):
+    monkeypatch.setattr(main.ResultCache, 'POLL_SECONDS', 0.01)
+    redis = FakeRedis()
+    other, cache = make_cache(redis), make_cache(redis)
+    cache_key = other._cache_key('stats', 'key')
+    token = other._acquire_remote(cache_key)
+    assert token is not None and cache._acquire_remote(cache_key) is None
+
+    def finish():
+        time.sleep(0.1)
+        other._store('stats', cache_key, 'from the other replica')
+        other._release_remote(cache_key, token)
+
+    threading.Thread(target=finish).start()
+    assert cache.get_or_compute('stats', 'key', lambda: pytest.fail("recomputed")) == ('from the other replica', 'redis')
+    assert not redis.exists(cache_key + ':lock')
+
+
+def test_redis_errors_fall_back_to_computing():
+    redis = FakeRedis()
+    cache = make_cache(redis)
+    redis.fail = True
+    assert cache.get_or_compute('stats', 'key', lambda: 'value') == ('value', 'computed')
+    assert cache.get_or_compute('stats', 'key', lambda: 'other') == ('value', 'memory')
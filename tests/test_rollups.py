@@ -0,0 +1,130 @@
+"""Tests of the minute/hour/day rollup store and its HyperLogLog sketch cells"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+SERVICES = ['AUTH', 'STORAGE', 'NETWORK']
+
+
+def make_frame(rng, size, start='2024-01-01', days=3, users=200):
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 86400, size=size), unit='s')
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'service': rng.choice(SERVICES, size=size),
+        'user': [f'user{i}' for i in rng.integers(0, users, size=size)],
+        'tenant_id': rng.choice(['t1', 't2'], size=size),
+        'action': rng.choice(['LOGIN', 'UPLOAD_FILE'], size=size),
+        'ip': [f'10.0.{i // 250}.{i % 250}' for i in rng.integers(0, 5000, size=size)],
+        'session_id': [f'{i:08x}' for i in rng.integers(0, 3000, size=size)],
+        'success': rng.random(size) < 0.7,
+        'error': rng.random(size) < 0.1,
+    })
+
+
+def expected_counts(frame, resolution, dimension):
+    seconds = main.RollupStore.RESOLUTIONS[resolution]
+    bucket = frame['timestamp'].dt.floor(f'{seconds}s')
+    key = '*' if dimension == 'all' else frame[dimension]
+    grouped = frame.assign(bucket=bucket, key=key).groupby(['bucket', 'key'])
+    return grouped.agg(events=('success', 'size'), success=('success', 'sum'), errors=('error', 'sum'))
+
+
+def reference_registers(values):
+    registers = np.zeros(1 << main.HLL_PRECISION, dtype=np.uint8)
+    reg, rank = main.hll_registers(pd.Series(values))
+    np.maximum.at(registers, reg, rank.astype(np.uint8))
+    return registers
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return make_frame(np.random.default_rng(4), 6000)
+
+
+@pytest.fixture(scope='module')
+def store(frame):
+    store = main.RollupStore()
+    for start in range(0, len(frame), 700):
+        store.ingest(frame.iloc[start:start + 700])
+    return store
+
+
+@pytest.mark.parametrize('resolution', ['minute', 'hour', 'day'])
+@pytest.mark.parametrize('dimension', ['all', 'service', 'user'])
+def test_counts_merge_across_batches(frame, store, resolution, dimension):
+    timeline = store.timeline(resolution, dimension).set_index(['bucket', 'key']).sort_index()
+
+    expected = expected_counts(frame, resolution, dimension).sort_index()
+    assert timeline.index.equals(expected.index)
+    assert (timeline.to_numpy() == expected.to_numpy()).all()
+
+
+def test_sketch_cells_equal_registers_of_their_rows(frame, store):
+    day = pd.Timestamp('2024-01-02')
+    rows = frame[frame['timestamp'].dt.floor('D') == day]
+
+    merged = store.distinct_registers('user', 'day', 'service', start=day, end=day)
+    for service in SERVICES:
+        assert np.array_equal(merged[service], reference_registers(rows.loc[rows['service'] == service, 'user']))
+    hourly = store.distinct_registers('ip', 'hour', start=day, end=day + pd.Timedelta(hours=23))
+    assert np.array_equal(hourly['*'], reference_registers(rows['ip']))
+
+
+def test_cells_switch_from_sparse_to_dense_blobs():
+    store = main.RollupStore()
+    frame = make_frame(np.random.default_rng(5), 20, days=1)
+    store.ingest(frame.assign(timestamp=pd.Timestamp('2024-01-01 05:00')))
+    blob = lambda: store._conn.execute(
+        "SELECT registers FROM rollup_sketches WHERE resolution = 'hour' AND dimension = 'all' AND field = 'ip'"
+    ).fetchone()[0]
+    assert blob()[:1] == b's'
+
+    crowd = make_frame(np.random.default_rng(6), 5000, days=1).assign(
+        timestamp=pd.Timestamp('2024-01-01 05:30'), ip=[f'172.16.{i // 250}.{i % 250}' for i in range(5000)])
+    store.ingest(crowd)
+    assert blob()[:1] != b's'
+    assert np.array_equal(main.hll_decode(blob()), reference_registers(pd.concat([frame['ip'], crowd['ip']])))
+
+
+def test_register_blobs_round_trip():
+    registers = reference_registers([f'v{i}' for i in range(40)])
+    assert main.hll_encode(registers)[:1] == b's'
+    assert np.array_equal(main.hll_decode(main.hll_encode(registers)), registers)
+    dense = reference_registers([f'v{i}' for i in range(5000)])
+    assert main.hll_encode(dense)[:1] != b's'
+    assert np.array_equal(main.hll_decode(main.hll_encode(dense)), dense)
+
+
+def test_retention_measures_age_from_the_newest_bucket():
+    old = make_frame(np.random.default_rng(7), 3000, start='2023-10-01', days=100)
+    store = main.RollupStore()
+    store.ingest(old)
+    store.enforce_retention(raw_days=10, aggregated_days=30)
+    newest = old['timestamp'].max().floor('min')
+
+    for resolution, days in [('minute', 10), ('hour', 10), ('day', 30)]:
+        buckets = old['timestamp'].dt.floor(f'{main.RollupStore.RESOLUTIONS[resolution]}s')
+        expected = sorted(set(buckets[buckets >= newest - pd.Timedelta(days=days)]))
+        assert sorted(store.timeline(resolution)['bucket'].unique()) == expected
+        if resolution != 'minute':
+            sketch_buckets = {pd.Timestamp(row[0], unit='s') for row in store._conn.execute(
+                'SELECT DISTINCT bucket FROM rollup_sketches WHERE resolution = ?', (resolution,))}
+            assert sorted(sketch_buckets) == expected
+
+
+def test_ingest_sources_is_all_or_nothing(frame):
+    store = main.RollupStore()
+
+    def failing(signatures):
+        raise RuntimeError("parse failed")
+
+    with pytest.raises(RuntimeError):
+        store.ingest_sources(['a', 'b'], failing)
+    assert store.timeline('day').empty
+
+    assert store.ingest_sources(['a', 'b'], lambda new: frame) == {'a', 'b'}
+    assert store.ingest_sources(['b', 'c'], lambda new: frame.iloc[:10]) == {'c'}
+    assert store.timeline('day')['events'].sum() == len(frame) + 10
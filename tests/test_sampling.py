@@ -0,0 +1,96 @@
+"""Tests of the stratified sampler and its Horvitz-Thompson estimates"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+CONFIG = {'analytics': {'approximate': {'sample_rates': [0.01, 0.1], 'min_rows_per_stratum': 30}}}
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(3)
+    size = 200_000
+    services = rng.choice(['AUTH', 'STORAGE', 'NETWORK', 'COMPUTE'], size=size, p=[0.4, 0.3, 0.2, 0.1])
+    levels = rng.choice(['INFO', 'WARN', 'ERROR'], size=size, p=[0.9, 0.08, 0.02])
+    frame = pd.DataFrame({
+        'service': services,
+        'level': levels,
+        'date': (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 7, size=size), unit='D')).date,
+        'response_time': rng.gamma(2.0, 150.0, size=size) + np.where(services == 'STORAGE', 200.0, 0.0),
+    })
+    # A stratum smaller than min_rows_per_stratum must come out exact
+    rare = pd.DataFrame({'service': 'BILLING', 'level': 'ERROR', 'date': frame['date'].iloc[0],
+                         'response_time': np.arange(12, dtype=float)})
+    return pd.concat([frame, rare], ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def sampler(frame):
+    sampler = main.StratifiedSampler(CONFIG)
+    for start in range(0, len(frame), 7000):
+        sampler.update(frame.iloc[start:start + 7000])
+    return sampler
+
+
+@pytest.mark.parametrize('rate', [0.01, 0.1])
+def test_sample_size_follows_rate(frame, sampler, rate):
+    sample = sampler.sample(frame, rate)
+    # The i-th row of a stratum is kept with probability max(rate, min_rows / i)
+    expected = sum(np.maximum(rate, np.minimum(1.0, 30 / np.arange(1, size + 1))).sum()
+                   for size in frame.groupby(main.StratifiedSampler.STRATA).size())
+    assert len(sample) == pytest.approx(expected, rel=0.05)
+    assert (sample[main.SAMPLE_WEIGHT] >= 1).all() and (sample[main.SAMPLE_WEIGHT] <= 1 / rate + 1e-9).all()
+
+
+@pytest.mark.parametrize('rate', [0.01, 0.1])
+def test_count_estimates_cover_true_counts(frame, sampler, rate):
+    sample = sampler.sample(frame, rate)
+    truth = frame.groupby(['service', 'level']).size()
+    estimate, half_width = main.estimate_counts(sample, ['service', 'level'])
+
+    assert estimate.sum() == pytest.approx(len(frame), rel=0.02)
+    covered = (estimate - truth).abs() <= half_width
+    assert covered.mean() >= 0.8
+    assert (estimate - truth).abs().max() <= 4 * half_width.max()
+    assert main.group_counts(sample, 'service').sum() == pytest.approx(len(frame), rel=0.02)
+
+
+def test_small_strata_are_exact(frame, sampler):
+    sample = sampler.sample(frame, 0.01)
+    rare = sample[sample['service'] == 'BILLING']
+    assert len(rare) == 12 and (rare[main.SAMPLE_WEIGHT] == 1).all()
+    assert main.group_counts(sample, 'service')['BILLING'] == 12
+
+
+def test_mean_estimates_cover_true_means(frame, sampler):
+    sample = sampler.sample(frame, 0.1)
+    mean, half_width = main.estimate_mean(sample, 'response_time')
+    assert abs(mean - frame['response_time'].mean()) <= 2 * half_width
+
+    means, half_widths = main.estimate_mean(sample, 'response_time', by='service')
+    truth = frame.groupby('service')['response_time'].mean()
+    assert ((means - truth).abs() <= 2 * half_widths + 1e-9).all()
+
+
+def test_full_data_counts_are_plain_sizes(frame):
+    assert main.group_counts(frame, 'level').equals(frame.groupby('level').size())
+    slow = frame['response_time'] > 500
+    assert main.group_sums(frame.assign(slow=slow), 'slow', 'level').equals(slow.groupby(frame['level']).sum())
+
+
+def test_sum_estimates_follow_true_sums(frame, sampler):
+    sample = sampler.sample(frame, 0.1).assign(slow=lambda rows: rows['response_time'] > 500)
+    truth = (frame['response_time'] > 500).groupby([frame['service'], frame['level']]).sum()
+    estimate = main.group_sums(sample, 'slow', ['service', 'level'])
+    assert estimate.sum() == pytest.approx(truth.sum(), rel=0.03)
+    assert estimate[('BILLING', 'ERROR')] == truth[('BILLING', 'ERROR')]
+
+
+def test_samples_are_reproducible(frame, sampler):
+    again = main.StratifiedSampler(CONFIG)
+    again.update(frame)
+    assert again.sample(frame, 0.01).index.sort_values().equals(sampler.sample(frame, 0.01).index.sort_values())
+    assert sampler.preview(frame, 50).index.equals(sampler.preview(frame, 50).index)
@@ -0,0 +1,153 @@
+"""Tests of query admission: single-flight sharing, queueing, timeouts and cancellation"""
+
+import threading
+import time
+
+import pytest
+
+import main
+
+
+def wait_until(condition, seconds=5):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.005)
+
+
+class Blocking:
+    """Query body that blocks until released and counts its calls"""
+
+    def __init__(self, result='done'):
+        self.result = result
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return self.result
+
+
+def in_threads(count, target):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, target())) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def waiters(scheduler, kind, key):
+    with scheduler._lock:
+        flight = scheduler._inflight.get((kind, key))
+        return flight['waiters'] if flight else 0
+
+
+def test_identical_requests_share_one_execution():
+    scheduler = main.QueryScheduler(max_workers=2, timeout_seconds=5)
+    query = Blocking(result=[1, 2, 3])
+    threads, results = in_threads(5, lambda: scheduler.run('chart', 'same', query))
+    wait_until(lambda: waiters(scheduler, 'chart', 'same') == 5)
+    query.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert query.calls == 1
+    assert all(result[0] is results[0][0] for result in results)
+    assert sorted(result[2] for result in results) == [False, True, True, True, True]
+    wait_until(lambda: scheduler._inflight == {})
+
+
+def test_distinct_requests_queue_beyond_the_workers():
+    scheduler = main.QueryScheduler(max_workers=1, timeout_seconds=5)
+    first, second = Blocking('first'), Blocking('second')
+    threads, results = in_threads(1, lambda: scheduler.run('chart', 'a', first))
+    first.started.wait(5)
+    more, more_results = in_threads(1, lambda: scheduler.run('chart', 'b', second))
+    wait_until(lambda: waiters(scheduler, 'chart', 'b') == 1)
+
+    assert scheduler.metrics() == {'skylus_queries_running': {(): 1}, 'skylus_queries_queued': {(): 1}}
+    time.sleep(0.05)
+    first.release.set()
+    second.release.set()
+    for thread in threads + more:
+        thread.join()
+    assert results[0][0] == 'first' and more_results[0][0] == 'second'
+    # The second request waited in the queue for the first to finish
+    assert more_results[0][1] >= 0.04
+    wait_until(lambda: scheduler.metrics() == {'skylus_queries_running': {(): 0}, 'skylus_queries_queued': {(): 0}})
+
+
+def test_a_queued_request_nobody_waits_for_is_cancelled():
+    scheduler = main.QueryScheduler(max_workers=1, timeout_seconds=5)
+    busy, queued = Blocking(), Blocking()
+    threads, _ = in_threads(1, lambda: scheduler.run('chart', 'busy', busy))
+    busy.started.wait(5)
+
+    with pytest.raises(TimeoutError, match='Chart exceeded 0.05s timeout'):
+        scheduler.run('chart', 'queued', queued, timeout=0.05)
+    assert ('chart', 'queued') not in scheduler._inflight
+    busy.release.set()
+    threads[0].join()
+    time.sleep(0.05)
+    assert queued.calls == 0
+
+
+def test_a_timed_out_caller_leaves_the_request_to_the_others():
+    scheduler = main.QueryScheduler(max_workers=1, timeout_seconds=5)
+    busy, shared = Blocking(), Blocking('shared result')
+    threads, _ = in_threads(1, lambda: scheduler.run('chart', 'busy', busy))
+    busy.started.wait(5)
+    patient, patient_results = in_threads(1, lambda: scheduler.run('chart', 'shared', shared))
+    wait_until(lambda: waiters(scheduler, 'chart', 'shared') == 1)
+
+    with pytest.raises(TimeoutError):
+        scheduler.run('chart', 'shared', shared, timeout=0.05)
+    busy.release.set()
+    shared.release.set()
+    for thread in threads + patient:
+        thread.join()
+    assert shared.calls == 1 and patient_results[0][0] == 'shared result'
+
+
+def test_a_running_request_is_not_cancelled_on_timeout():
+    scheduler = main.QueryScheduler(max_workers=1, timeout_seconds=0.05)
+    slow = Blocking('late')
+    with pytest.raises(TimeoutError):
+        scheduler.run('sql', 'slow', slow)
+    assert slow.started.is_set()
+    # A new caller joins the request that is still running
+    threads, results = in_threads(1, lambda: scheduler.run('sql', 'slow', slow, timeout=5))
+    wait_until(lambda: waiters(scheduler, 'sql', 'slow') == 1)
+    slow.release.set()
+    threads[0].join()
+    assert results[0][0] == 'late' and results[0][2] and slow.calls == 1
+
+
+def test_errors_reach_every_waiter():
+    scheduler = main.QueryScheduler(max_workers=2, timeout_seconds=5)
+    release = threading.Event()
+
+    def failing():
+        assert release.wait(5)
+        raise ValueError("bad query")
+
+    errors = []
+
+    def call():
+        try:
+            scheduler.run('sql', 'broken', failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: waiters(scheduler, 'sql', 'broken') == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ['bad query'] * 3
+    wait_until(lambda: scheduler._inflight == {})
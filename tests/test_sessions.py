@@ -0,0 +1,72 @@
+"""Tests of inactivity-gap sessionization against a row-by-row reference"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+GAP = pd.Timedelta(minutes=30)
+
+
+def make_frame(seed, size=6000, services=('AUTH', 'STORAGE', 'NETWORK')):
+    rng = np.random.default_rng(seed)
+    # Bursty activity: most gaps are short, some exceed the inactivity gap
+    gaps = np.where(rng.random(size) < 0.97, rng.integers(0, 120, size=size), rng.integers(1800, 20000, size=size))
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-06-01') + pd.to_timedelta(np.cumsum(gaps) // 4, unit='s'),
+        'user': [f'user{i}' for i in rng.integers(0, 15, size=size)],
+        'ip': [f'10.0.0.{i}' for i in rng.integers(0, 3, size=size)],
+        'service': rng.choice(list(services), size=size),
+        'error': rng.random(size) < 0.1,
+    })
+
+
+def reference_sessions(frame):
+    sessions = []
+    for (user, ip), rows in frame.sort_values('timestamp', kind='stable').groupby(['user', 'ip']):
+        current = None
+        for row in rows.itertuples():
+            if current is None or row.timestamp - current['end'] > GAP:
+                current = {'user': user, 'ip': ip, 'start': row.timestamp, 'end': row.timestamp,
+                           'actions': 0, 'errors': 0, 'services': set()}
+                sessions.append(current)
+            current['end'] = row.timestamp
+            current['actions'] += 1
+            current['errors'] += int(row.error)
+            current['services'].add(row.service)
+    return pd.DataFrame(sessions).sort_values(['user', 'ip', 'start']).reset_index(drop=True)
+
+
+def sessionize(frame, batch_size):
+    store = main.SessionStore({'analytics': {'session_inactivity_minutes': 30}})
+    for start in range(0, len(frame), batch_size):
+        store.update(frame.iloc[start:start + batch_size])
+    return store
+
+
+@pytest.mark.parametrize('batch_size', [6000, 500, 37])
+def test_batches_fold_into_the_same_sessions(batch_size):
+    frame = make_frame(0)
+    table = sessionize(frame, batch_size).table().sort_values(['user', 'ip', 'start']).reset_index(drop=True)
+    expected = reference_sessions(frame)
+
+    columns = ['user', 'ip', 'start', 'end', 'actions', 'errors']
+    assert table[columns].astype({'start': 'datetime64[ns]', 'end': 'datetime64[ns]'}).equals(
+        expected[columns].astype({'start': 'datetime64[ns]', 'end': 'datetime64[ns]'}))
+    assert table['services'].tolist() == [', '.join(sorted(services)) for services in expected['services']]
+    assert (table['duration_minutes'] == (expected['end'] - expected['start']).dt.total_seconds() / 60).all()
+
+
+def test_services_past_the_mask_width_share_the_other_bit():
+    services = [f'SVC{i:02d}' for i in range(70)]
+    frame = make_frame(1, size=3000, services=services)
+    store = sessionize(frame, 400)
+    table = store.table().sort_values(['user', 'ip', 'start']).reset_index(drop=True)
+    expected = reference_sessions(frame)
+
+    assert (store.sessions['service_mask'] >= 0).all()
+    assert len(set(store._services.values())) == 63
+    first_62 = {service for service, bit in store._services.items() if bit != main.SessionStore.OTHER_SERVICES_BIT}
+    labels = [', '.join(sorted(s & first_62) + (['other'] if s - first_62 else [])) for s in expected['services']]
+    assert table['services'].tolist() == [', '.join(sorted(label.split(', '))) for label in labels]
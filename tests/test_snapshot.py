@@ -0,0 +1,191 @@
+"""Round trips of analyzed datasets through snapshot bundles"""
+
+import ipaddress
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+def spread_lines(count, step=timedelta(seconds=53)):
+    """Synthetic lines one step apart, with a burst of failed logins from one address"""
+    start = datetime(2024, 3, 1)
+    lines = [(start + i * step).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3] + line[23:]
+             for i, line in enumerate(main.synthetic_log_lines(count))]
+    burst = start + count // 2 * step
+    lines += [f"{(burst + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]}|WARN|b{i:07x}-0000-4000-8000-"
+              f"000000000000|AUTH|mallory|tenant1|203.0.113.9|curl/8|LOGIN|LOGIN failed for mallory in 40ms"
+              for i in range(8)]
+    return lines
+
+
+@pytest.fixture
+def reader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the reader creates ./logs next to where it runs
+    reader = main.SkylLogReader(headless=True)
+    reader.df = reader.parse_log_chunk(spread_lines(4000), 'app.log')
+    reader.df['template_id'] = reader.templates.assign(reader.df['message'])
+    reader.index_frame(reader.df)
+    reader.anomalies.flush()
+    reader.file_stats = {'app.log': len(reader.df)}
+    reader.fingerprint = 'fingerprint'
+    return reader
+
+
+def engine_views(reader):
+    """What the dashboard reads from the engines a snapshot restores"""
+    return {
+        # Restored times stay Arrow-backed, so compare the rows a trace finds rather than dtypes
+        'trace': reader.trace(reader.df['session_id'].iloc[123])[['uuid', 'timestamp', 'message']],
+        'latency': reader.latency.summary('service'),
+        'latency_timeline': reader.latency.timeline('hour'),
+        'anomalies': reader.anomalies.table(),
+        'bursts': reader.brute_force.table(),
+        'sessions': reader.sessions.table(),
+        'top_users': reader.top_values('user', k=5),
+        'sample': reader.sampler.sample(reader.df, reader.sampler.rates[0]).index,
+        'templates': reader.templates.templates(),
+        'error_ips': reader.heavy_hitters.top('error_ip', k=20, start=pd.Timestamp('2024-03-02 06:00'),
+                                              end=pd.Timestamp('2024-03-02 12:00')),
+        'cidr': reader.ip_index.lookup([ipaddress.ip_network('10.0.0.0/8'), ipaddress.ip_network('::/0')], reader.df),
+        'subnets': reader.ip_index.subnet_counts(16),
+        'request': reader.request_index.lookup('uuid', reader.df['uuid'].iloc[77]),
+        'late_rows': reader.anomalies.late_rows,
+        'incident_count': reader.brute_force.incident_count,
+    }
+
+
+def engine_states(reader):
+    """Every restored engine's full state, as written to a bundle"""
+    arrays = {}
+    state = {name: main.encode_state(getattr(reader, name).get_state(), arrays) for name in main.SNAPSHOT_ENGINES}
+    return json.dumps(state, sort_keys=True), arrays
+
+
+def assert_same(left, right):
+    assert left.keys() == right.keys()
+    for name in left:
+        if isinstance(left[name], (pd.DataFrame, pd.Series, pd.Index)):
+            assert left[name].equals(right[name]), name
+        elif isinstance(left[name], np.ndarray):
+            assert np.array_equal(left[name], right[name]), name
+        else:
+            assert left[name] == right[name], name
+
+
+@pytest.mark.parametrize('compression', ['none', 'zstd'])
+def test_snapshot_round_trip(reader, tmp_path, compression):
+    stats = {'total_logs': len(reader.df), 'services': {'AUTH': 1}}
+    path = str(tmp_path / 'snapshots' / 'march')
+    manifest = main.write_snapshot(reader, path, stats=stats, compression=compression)
+    restored, restored_manifest, restored_stats = main.read_snapshot(path, headless=True)
+
+    assert restored_manifest == json.loads(json.dumps(manifest))
+    assert restored_stats == stats
+    assert restored.fingerprint == 'fingerprint' and restored.file_stats == {'app.log': len(reader.df)}
+    pd.testing.assert_frame_equal(restored.df, reader.df, check_dtype=False)
+    assert_same(engine_views(restored), engine_views(reader))
+    assert restored.count_distinct('user') == reader.count_distinct('user')
+    (text, arrays), (restored_text, restored_arrays) = engine_states(reader), engine_states(restored)
+    assert restored_text == text
+    assert all(np.array_equal(arrays[name], restored_arrays[name]) and arrays[name].dtype == restored_arrays[name].dtype
+               for name in arrays)
+
+
+def test_restored_engines_keep_ingesting(reader, tmp_path):
+    path = str(tmp_path / 'snapshot')
+    main.write_snapshot(reader, path)
+    restored, _, _ = main.read_snapshot(path, headless=True)
+
+    more = reader.parse_log_chunk(main.synthetic_log_lines(50, start=datetime(2024, 3, 5)), 'more.log')
+    for target in (reader, restored):
+        rows = more.set_axis(range(len(target.df), len(target.df) + len(more)))
+        rows['template_id'] = target.templates.assign(rows['message'])
+        target.index_frame(rows)
+    reader.anomalies.flush()
+    restored.anomalies.flush()
+    assert_same(engine_views(restored), engine_views(reader))
+    assert restored.latency.summary('action').equals(reader.latency.summary('action'))
+    assert restored.brute_force.failed_logins == reader.brute_force.failed_logins
+
+
+def test_snapshot_replaces_in_place_and_is_listed(reader, tmp_path):
+    root = tmp_path / 'snapshots'
+    main.write_snapshot(reader, str(root / 'daily'))
+    main.write_snapshot(reader, str(root / 'daily'), stats={'again': True})
+
+    assert [name for name, _ in main.list_snapshots(str(root))] == ['daily']
+    assert sorted(os.listdir(root)) == ['daily']
+    assert main.read_snapshot(str(root / 'daily'), headless=True)[2] == {'again': True}
+
+
+def test_other_snapshot_versions_are_refused(reader, tmp_path):
+    path = tmp_path / 'old'
+    main.write_snapshot(reader, str(path))
+    manifest = json.loads((path / 'manifest.json').read_text())
+    manifest['version'] = main.SNAPSHOT_VERSION - 1
+    (path / 'manifest.json').write_text(json.dumps(manifest))
+
+    with pytest.raises(ValueError, match='not supported'):
+        main.read_snapshot(str(path), headless=True)
+
+
+def test_dashboard_stats_keep_their_types(reader, tmp_path):
+    stats = reader.get_advanced_stats()
+    path = str(tmp_path / 'stats')
+    main.write_snapshot(reader, path, stats=stats)
+    restored = main.read_snapshot(path, headless=True)[2]
+
+    assert restored == stats
+    assert isinstance(restored['date_range']['start'], pd.Timestamp)
+    assert all(isinstance(day, date) for day in restored['temporal']['activity_by_date'])
+    assert all(isinstance(hour, int) for hour in restored['temporal']['hourly_pattern'])
+
+
+def test_state_codec_round_trips_plain_data_only():
+    value = {('AUTH', None): [1, 2.5, float('inf')], 3: {'when': pd.Timestamp('2024-03-01 10:00'), 'gap': pd.Timedelta(minutes=5)},
+             date(2024, 3, 1): pd.NaT, 'array': np.arange(4, dtype=np.uint32), None: (True, 'x')}
+    arrays = {}
+    encoded = json.loads(json.dumps(main.encode_state(value, arrays)))
+    decoded = main.decode_state(encoded, arrays)
+    assert decoded.pop('array').dtype == np.uint32 and value.pop('array') is not None
+    assert decoded.keys() == value.keys() and decoded[3] == value[3] and decoded[None] == value[None]
+    assert decoded[date(2024, 3, 1)] is pd.NaT
+
+    with pytest.raises(TypeError):
+        main.encode_state({'engine': main.SpaceSaving(3)}, {})
+    with pytest.raises(TypeError):
+        main.encode_state(np.array(['a', None], dtype=object), {})
+    with pytest.raises(ValueError, match='Unknown value tag'):
+        main.decode_state({'pickle': 'gASV'}, {})
+
+
+class Payload:
+    """Leaves a marker file behind if it is ever unpickled"""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return (open, (self.marker, 'w'))
+
+
+def test_restore_never_unpickles_bundle_contents(reader, tmp_path):
+    path = tmp_path / 'shared'
+    main.write_snapshot(reader, str(path))
+    marker = tmp_path / 'pwned'
+    # A tampered bundle: an object array in the archive, and a stray pickle next to it
+    with np.load(path / 'state.npz') as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    arrays['a0'] = np.array([Payload(str(marker))], dtype=object)
+    np.savez(path / 'state.npz', **arrays)
+    (path / 'state.pickle').write_bytes(__import__('pickle').dumps(Payload(str(marker))))
+
+    with pytest.raises(ValueError, match='allow_pickle'):
+        main.read_snapshot(str(path), headless=True)
+    assert not marker.exists()
@@ -0,0 +1,66 @@
+"""Tests of Drain-style template mining: wildcards, stable ids and the overflow template"""
+
+import pandas as pd
+
+import main
+
+
+def miner(**settings):
+    return main.TemplateMiner({'log_processing': {f'template_{key}': value for key, value in settings.items()}})
+
+
+def test_digit_tokens_and_differing_positions_become_wildcards():
+    templates = miner()
+    ids = templates.assign(pd.Series([
+        'user 123 logged in from 10.0.0.7',
+        'upload of report.pdf failed',
+        'upload of image.png failed',
+        'user 9 logged in from 10.1.2.3',
+        'quota exceeded',
+    ]))
+    assert ids.tolist() == [0, 1, 1, 0, 2]
+    assert templates.template(0) == 'user <*> logged in from <*>'
+    assert templates.template(1) == 'upload of <*> failed'
+    assert templates.templates().tolist() == ['user <*> logged in from <*>', 'upload of <*> failed', 'quota exceeded']
+
+
+def test_similarity_threshold_and_token_count_split_templates():
+    assert miner(similarity=0.5).assign(pd.Series(['a b c d', 'a b e f'])).tolist() == [0, 0]
+    assert miner(similarity=0.6).assign(pd.Series(['a b c d', 'a b e f'])).tolist() == [0, 1]
+    assert miner().assign(pd.Series(['a b c d', 'a b c d e'])).tolist() == [0, 1]
+
+
+def test_ids_stay_stable_after_cache_eviction():
+    templates = miner(cache_size=2)
+    messages = pd.Series([f'finished job {name}' for name in ['alpha', 'beta', 'gamma']] +
+                         [f'disk full on {name}' for name in ['sda', 'sdb']] + ['service restarted'])
+    first = templates.assign(messages)
+    assert first.tolist() == [0, 0, 0, 1, 1, 2]
+    assert len(templates._cache) == 2
+    assert templates.assign(messages[::-1]).tolist() == first[::-1].tolist()
+
+
+def test_assign_keeps_the_index_and_maps_missing_messages():
+    templates = miner()
+    ids = templates.assign(pd.Series(['ok', None, 'ok'], index=[7, 3, 5]))
+    assert ids.dtype == 'int32' and ids.index.tolist() == [7, 3, 5]
+    assert ids.tolist() == [0, 1, 0] and templates.template(1) == ''
+
+
+def test_crowded_tree_nodes_route_new_tokens_to_a_wildcard_child():
+    templates = miner(max_children=2)
+    ids = templates.assign(pd.Series(['alpha x y', 'beta x y', 'gamma x y', 'delta x y']))
+    assert ids.tolist() == [0, 1, 2, 2]
+    assert templates.template(2) == '<*> x y'
+    assert set(templates._root[3]) == {'alpha', 'beta', main.TemplateMiner.WILDCARD}
+
+
+def test_new_messages_share_the_overflow_template_at_the_cap():
+    templates = miner(max_templates=4)
+    ids = templates.assign(pd.Series(['start job a', 'stop now please', 'x', 'y z', 'disk full again and again', 'start job b']))
+    # Three regular templates plus the shared overflow one
+    assert ids.tolist() == [0, 1, 2, 3, 3, 0]
+    assert templates.template(3) == main.TemplateMiner.OVERFLOW
+    assert templates.template(0) == 'start job <*>'
+    assert len(templates.templates()) == 4
+    assert templates.assign(pd.Series(['another new one', 'stop now please'])).tolist() == [3, 1]